@@ -0,0 +1,28 @@
+"""Add index for marcacoes vagas
+
+Revision ID: 3a6f0c8e51d4
+Revises: 9c41d2b7e8a3
+Create Date: 2026-10-16 23:05:47.318220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a6f0c8e51d4'
+down_revision: Union[str, None] = '9c41d2b7e8a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_marcacoes_medico_fim', 'Marcacoes', ['medico_id', 'data_hora_fim'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_marcacoes_medico_fim', table_name='Marcacoes')
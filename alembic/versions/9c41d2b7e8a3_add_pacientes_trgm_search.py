@@ -0,0 +1,63 @@
+"""Add pacientes trigram search
+
+Revision ID: 9c41d2b7e8a3
+Revises: e7a942fffd10
+Create Date: 2026-10-16 10:02:47.553120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c41d2b7e8a3'
+down_revision: Union[str, None] = 'e7a942fffd10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# ----------------------------------------------------------------------
+# Helpers
+# ----------------------------------------------------------------------
+# unaccent() é STABLE e não pode ser usado diretamente num índice;
+# o wrapper fixa o dicionário e declara-se IMMUTABLE.
+CREATE_SEARCH = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+CREATE OR REPLACE FUNCTION f_unaccent(text)
+RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$;
+
+CREATE INDEX IF NOT EXISTS ix_paciente_nome_trgm
+    ON "Paciente" USING gin (f_unaccent(lower(nome)) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_paciente_nif_trgm
+    ON "Paciente" USING gin (nif gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_paciente_telefone_trgm
+    ON "Paciente" USING gin (telefone gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_paciente_numero_documento_trgm
+    ON "Paciente" USING gin (numero_documento gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_paciente_email_trgm
+    ON "Paciente" USING gin (email gin_trgm_ops);
+"""
+
+DROP_SEARCH = """
+DROP INDEX IF EXISTS ix_paciente_email_trgm;
+DROP INDEX IF EXISTS ix_paciente_numero_documento_trgm;
+DROP INDEX IF EXISTS ix_paciente_telefone_trgm;
+DROP INDEX IF EXISTS ix_paciente_nif_trgm;
+DROP INDEX IF EXISTS ix_paciente_nome_trgm;
+DROP FUNCTION IF EXISTS f_unaccent(text);
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(CREATE_SEARCH)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(DROP_SEARCH)
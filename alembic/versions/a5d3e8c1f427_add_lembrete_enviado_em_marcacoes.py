@@ -0,0 +1,40 @@
+"""Add lembrete_enviado_em to Marcacoes
+
+Revision ID: a5d3e8c1f427
+Revises: e2a94c7b1f38
+Create Date: 2026-10-17 09:41:27.503118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a5d3e8c1f427'
+down_revision: Union[str, None] = 'e2a94c7b1f38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('Marcacoes', sa.Column('lembrete_enviado_em', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(
+        'ix_marcacoes_lembrete_pendente',
+        'Marcacoes',
+        ['data_hora_inicio'],
+        unique=False,
+        postgresql_where=sa.text("estado = 'agendada' AND lembrete_enviado_em IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        'ix_marcacoes_lembrete_pendente',
+        table_name='Marcacoes',
+        postgresql_where=sa.text("estado = 'agendada' AND lembrete_enviado_em IS NULL"),
+    )
+    op.drop_column('Marcacoes', 'lembrete_enviado_em')
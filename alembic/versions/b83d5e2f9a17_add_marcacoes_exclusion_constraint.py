@@ -0,0 +1,41 @@
+"""Prevent overlapping marcacoes per medico
+
+Revision ID: b83d5e2f9a17
+Revises: 3a6f0c8e51d4
+Create Date: 2026-10-16 23:31:12.845093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b83d5e2f9a17'
+down_revision: Union[str, None] = '3a6f0c8e51d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # btree_gist permite usar `medico_id WITH =` num índice GiST
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    # Falha se já existirem marcações sobrepostas: têm de ser resolvidas
+    # (canceladas ou movidas) antes de aplicar esta migração.
+    op.execute(
+        """
+        ALTER TABLE "Marcacoes"
+        ADD CONSTRAINT ex_marcacoes_medico_sobreposicao
+        EXCLUDE USING gist (
+            medico_id WITH =,
+            tstzrange(data_hora_inicio, data_hora_fim, '[)') WITH &&
+        ) WHERE (estado <> 'cancelada')
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('ALTER TABLE "Marcacoes" DROP CONSTRAINT IF EXISTS ex_marcacoes_medico_sobreposicao')
@@ -0,0 +1,33 @@
+"""Add Mensagens (thread_id, created_at DESC) index
+
+Revision ID: b8e2f61d3a90
+Revises: a5d3e8c1f427
+Create Date: 2026-10-17 11:06:52.184733
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e2f61d3a90'
+down_revision: Union[str, None] = 'a5d3e8c1f427'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_mensagens_thread_created',
+        'Mensagens',
+        ['thread_id', sa.text('created_at DESC')],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_mensagens_thread_created', table_name='Mensagens')
@@ -0,0 +1,30 @@
+"""Add agenda range indexes
+
+Revision ID: c4e19a7d2b60
+Revises: b83d5e2f9a17
+Create Date: 2026-10-16 23:58:20.117634
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e19a7d2b60'
+down_revision: Union[str, None] = 'b83d5e2f9a17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_marcacoes_clinic_inicio', 'Marcacoes', ['clinic_id', 'data_hora_inicio'], unique=False)
+    op.create_index('ix_consultas_clinica_medico_inicio', 'Consultas', ['clinica_id', 'medico_id', 'data_inicio'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_consultas_clinica_medico_inicio', table_name='Consultas')
+    op.drop_index('ix_marcacoes_clinic_inicio', table_name='Marcacoes')
@@ -0,0 +1,40 @@
+"""Replace Mensagens thread index with (thread_id, created_at, id)
+
+Revision ID: c7f04a2b9e15
+Revises: b8e2f61d3a90
+Create Date: 2026-10-17 12:24:09.671052
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7f04a2b9e15'
+down_revision: Union[str, None] = 'b8e2f61d3a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_mensagens_thread_created_id',
+        'Mensagens',
+        ['thread_id', 'created_at', 'id'],
+        unique=False,
+    )
+    op.drop_index('ix_mensagens_thread_created', table_name='Mensagens')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(
+        'ix_mensagens_thread_created',
+        'Mensagens',
+        ['thread_id', sa.text('created_at DESC')],
+        unique=False,
+    )
+    op.drop_index('ix_mensagens_thread_created_id', table_name='Mensagens')
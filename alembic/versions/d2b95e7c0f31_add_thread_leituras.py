@@ -0,0 +1,38 @@
+"""Add ThreadLeituras (read cursors)
+
+Revision ID: d2b95e7c0f31
+Revises: c7f04a2b9e15
+Create Date: 2026-10-17 14:02:37.915480
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2b95e7c0f31'
+down_revision: Union[str, None] = 'c7f04a2b9e15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'ThreadLeituras',
+        sa.Column('thread_id', sa.Integer(), nullable=False),
+        sa.Column('utilizador_id', sa.Integer(), nullable=False),
+        sa.Column('last_read_message_id', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['thread_id'], ['Threads.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['utilizador_id'], ['Utilizador.id'], ),
+        sa.ForeignKeyConstraint(['last_read_message_id'], ['Mensagens.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('thread_id', 'utilizador_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('ThreadLeituras')
@@ -0,0 +1,28 @@
+"""Add CaixaPayments session index
+
+Revision ID: d71b3f0a6c25
+Revises: c4e19a7d2b60
+Create Date: 2026-10-17 00:21:05.640918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd71b3f0a6c25'
+down_revision: Union[str, None] = 'c4e19a7d2b60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_caixapayments_session_id', 'CaixaPayments', ['session_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_caixapayments_session_id', table_name='CaixaPayments')
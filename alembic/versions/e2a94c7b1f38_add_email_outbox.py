@@ -0,0 +1,56 @@
+"""Add EmailOutbox table
+
+Revision ID: e2a94c7b1f38
+Revises: d71b3f0a6c25
+Create Date: 2026-10-17 01:12:44.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a94c7b1f38'
+down_revision: Union[str, None] = 'd71b3f0a6c25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'EmailOutbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('clinica_id', sa.Integer(), nullable=False),
+        sa.Column('tipo', sa.Enum('fatura', 'orcamento', 'lembrete', 'cancelamento', name='emailtipo'), nullable=False),
+        sa.Column('referencia_id', sa.Integer(), nullable=False),
+        sa.Column('email_para', sa.String(length=255), nullable=True),
+        sa.Column('estado', sa.Enum('pendente', 'enviado', 'falhado', name='emailestado'), nullable=False),
+        sa.Column('tentativas', sa.Integer(), nullable=False),
+        sa.Column('proxima_tentativa_em', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('ultimo_erro', sa.Text(), nullable=True),
+        sa.Column('criado_por', sa.Integer(), nullable=True),
+        sa.Column('criado_em', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('enviado_em', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['clinica_id'], ['Clinica.id'], ),
+        sa.ForeignKeyConstraint(['criado_por'], ['Utilizador.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_EmailOutbox_id'), 'EmailOutbox', ['id'], unique=False)
+    op.create_index('ix_emailoutbox_clinica_criado', 'EmailOutbox', ['clinica_id', 'criado_em'], unique=False)
+    op.create_index(
+        'ix_emailoutbox_pendentes', 'EmailOutbox', ['proxima_tentativa_em'], unique=False,
+        postgresql_where=sa.text("estado = 'pendente'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_emailoutbox_pendentes', table_name='EmailOutbox', postgresql_where=sa.text("estado = 'pendente'"))
+    op.drop_index('ix_emailoutbox_clinica_criado', table_name='EmailOutbox')
+    op.drop_index(op.f('ix_EmailOutbox_id'), table_name='EmailOutbox')
+    op.drop_table('EmailOutbox')
+    sa.Enum(name='emailestado').drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name='emailtipo').drop(op.get_bind(), checkfirst=True)
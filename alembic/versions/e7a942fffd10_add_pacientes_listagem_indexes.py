@@ -0,0 +1,34 @@
+"""Add indexes for pacientes listagem
+
+Revision ID: e7a942fffd10
+Revises: 5d2710e41314
+Create Date: 2026-10-16 09:12:31.104512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a942fffd10'
+down_revision: Union[str, None] = '5d2710e41314'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_paciente_clinica_nome', 'Paciente', ['clinica_id', 'nome', 'id'], unique=False)
+    op.create_index('ix_consultas_paciente_data_inicio', 'Consultas', ['paciente_id', 'data_inicio'], unique=False)
+    op.create_index('ix_planotratamento_paciente_estado', 'PlanoTratamento', ['paciente_id', 'estado'], unique=False)
+    op.create_index('ix_fichaclinica_paciente_id', 'FichaClinica', ['paciente_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_fichaclinica_paciente_id', table_name='FichaClinica')
+    op.drop_index('ix_planotratamento_paciente_estado', table_name='PlanoTratamento')
+    op.drop_index('ix_consultas_paciente_data_inicio', table_name='Consultas')
+    op.drop_index('ix_paciente_clinica_nome', table_name='Paciente')
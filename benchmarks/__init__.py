@@ -0,0 +1,28 @@
+"""
+Scripts de benchmark (não fazem parte da API).
+
+Executar a partir da raiz do projeto, por exemplo:
+    python -m benchmarks.pacientes_search
+"""
+
+
+def carregar_modelos() -> None:
+    """Importa todos os modelos para que os mappers SQLAlchemy fiquem configurados."""
+    from src.utilizadores import models as utilizadores_models  # noqa: F401
+    from src.perfis import models as perfis_models  # noqa: F401
+    from src.auditoria import models as auditoria_models  # noqa: F401
+    from src.clinica import models as clinica_models  # noqa: F401
+    from src.stock import models as stock_models  # noqa: F401
+    from src.pacientes import models as pacientes_models  # noqa: F401
+    from src.categoria import models as categoria_models  # noqa: F401
+    from src.entidades import models as entidades_models  # noqa: F401
+    from src.artigos import models as artigos_models  # noqa: F401
+    from src.precos import models as precos_models  # noqa: F401
+    from src.dentes import models as dentes_models  # noqa: F401
+    from src.orcamento import models as orcamento_models  # noqa: F401
+    from src.marcacoes import models as marcacoes_models  # noqa: F401
+    from src.consultas import models as consultas_models  # noqa: F401
+    from src.faturacao import models as faturacao_models  # noqa: F401
+    from src.caixa import models as caixa_models  # noqa: F401
+    from src.mensagens import models as mensagens_models  # noqa: F401
+    from src.email import models as email_models  # noqa: F401
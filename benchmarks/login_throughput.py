@@ -0,0 +1,154 @@
+"""
+Benchmark de throughput do login (POST /utilizadores/login).
+
+Cria (se não existir) um utilizador sintético e dispara logins
+concorrentes contra um servidor já a correr, mostrando logins/s e a
+latência p50/p95/p99. Para medir "por worker", arrancar o uvicorn com um
+único worker e comparar os dois modos de hashing:
+
+    # antes: bcrypt nas threads do worker
+    PASSWORD_HASH_WORKERS=0 uvicorn src.main:app --workers 1
+    # depois: bcrypt no pool de processos
+    PASSWORD_HASH_WORKERS=4 uvicorn src.main:app --workers 1
+
+    python -m benchmarks.login_throughput --url http://localhost:8000 --logins 200 --concorrencia 20
+    python -m benchmarks.login_throughput --limpar
+
+Enquanto decorre, pedidos leves (GET /docs) medem quanto o login atrasa o
+resto do worker.
+
+O custo do bcrypt vem de BCRYPT_ROUNDS (igual no servidor e aqui, via .env).
+Respostas 503 (fila de hashing cheia) são contadas à parte.
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from sqlalchemy import text
+
+from benchmarks import carregar_modelos
+from src.database import SessionLocal
+from src.utilizadores.hashing import pwd_context
+
+carregar_modelos()
+
+USERNAME_BENCH = "benchmark_login"
+PASSWORD_BENCH = "benchmark-login-pw"
+
+
+def preparar_utilizador(db) -> None:
+    existe = db.execute(
+        text('SELECT id FROM "Utilizador" WHERE username = :u'), {"u": USERNAME_BENCH}
+    ).scalar()
+    if existe is not None:
+        # Garante que um bloqueio de uma execução anterior não estraga a medição
+        db.execute(
+            text('UPDATE "Utilizador" SET bloqueado = false, tentativas_falhadas = 0, ativo = true WHERE id = :id'),
+            {"id": existe},
+        )
+    else:
+        db.execute(
+            text(
+                'INSERT INTO "Utilizador" (username, nome, email, telefone, password_hash, ativo, tentativas_falhadas, bloqueado) '
+                "VALUES (:u, 'Benchmark Login', :u || '@exemplo.pt', '+351000000000', :h, true, 0, false)"
+            ),
+            {"u": USERNAME_BENCH, "h": pwd_context.hash(PASSWORD_BENCH)},
+        )
+    db.commit()
+
+
+def _pct(valores: list[float], p: float) -> float:
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def medir(url: str, logins: int, concorrencia: int) -> None:
+    tempos: list[float] = []
+    ocupado = 0
+    erros = 0
+    lock = threading.Lock()
+
+    def um_login(client: httpx.Client):
+        nonlocal ocupado, erros
+        inicio = time.perf_counter()
+        r = client.post(
+            f"{url}/utilizadores/login",
+            data={"username": USERNAME_BENCH, "password": PASSWORD_BENCH},
+        )
+        duracao = (time.perf_counter() - inicio) * 1000
+        with lock:
+            if r.status_code == 200:
+                tempos.append(duracao)
+            elif r.status_code == 503:
+                ocupado += 1
+            else:
+                erros += 1
+
+    # Pedidos leves em paralelo: mostram se o worker continua a responder
+    leves: list[float] = []
+    parar = threading.Event()
+
+    def sonda():
+        with httpx.Client(timeout=30) as client:
+            while not parar.is_set():
+                inicio = time.perf_counter()
+                client.get(f"{url}/docs")
+                leves.append((time.perf_counter() - inicio) * 1000)
+                time.sleep(0.05)
+
+    with httpx.Client(timeout=60, limits=httpx.Limits(max_connections=concorrencia)) as client:
+        um_login(client)  # aquecimento (arranque do pool de hashing)
+        tempos.clear()
+
+        t_sonda = threading.Thread(target=sonda, daemon=True)
+        t_sonda.start()
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concorrencia) as ex:
+            for _ in range(logins):
+                ex.submit(um_login, client)
+        total = time.perf_counter() - inicio
+        parar.set()
+        t_sonda.join()
+
+    tempos.sort()
+    leves.sort()
+    print(f"logins ok: {len(tempos)}  503: {ocupado}  erros: {erros}")
+    print(f"duração:   {total:.2f} s")
+    print(f"logins/s:  {len(tempos) / total:.1f}")
+    if tempos:
+        print(f"login p50: {_pct(tempos, 0.50):.0f} ms  p95: {_pct(tempos, 0.95):.0f} ms  p99: {_pct(tempos, 0.99):.0f} ms")
+    if leves:
+        print(f"GET /docs durante o teste p50: {_pct(leves, 0.50):.1f} ms  p95: {_pct(leves, 0.95):.1f} ms")
+
+
+def limpar(db) -> None:
+    filtro = '(SELECT id FROM "Utilizador" WHERE username = :u)'
+    db.execute(text(f'DELETE FROM "Sessao" WHERE utilizador_id IN {filtro}'), {"u": USERNAME_BENCH})
+    db.execute(text(f'DELETE FROM "Auditoria" WHERE utilizador_id IN {filtro}'), {"u": USERNAME_BENCH})
+    db.execute(text('DELETE FROM "Utilizador" WHERE username = :u'), {"u": USERNAME_BENCH})
+    db.commit()
+    print("Utilizador sintético removido.")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concorrencia", type=int, default=20)
+    parser.add_argument("--limpar", action="store_true", help="remove o utilizador sintético e sai")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.limpar:
+            limpar(db)
+            return
+        preparar_utilizador(db)
+    finally:
+        db.close()
+    medir(args.url.rstrip("/"), args.logins, args.concorrencia)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Teste de concorrência das marcações (ToDo, item 11).
+
+Dispara N reservas em paralelo para o mesmo médico e o mesmo horário e
+verifica que exatamente uma é aceite. Quem garante isto é a constraint
+`ex_marcacoes_medico_sobreposicao` na base de dados, não um lock na
+aplicação.
+
+Modos:
+  db    insere diretamente com N sessões SQLAlchemy (sem passar pela
+        verificação de vagas do service): testa só a constraint.
+  http  faz N POST /marcacoes contra um servidor a correr: testa também
+        a tradução do erro para 409.
+
+Uso:
+    python -m benchmarks.marcacoes_concorrencia --modo db --pedidos 20 \\
+        --clinica 1 --medico 2 --paciente 1 --entidade 1
+    python -m benchmarks.marcacoes_concorrencia --modo http --url http://localhost:8000 \\
+        --utilizador admin --password ... --clinica 1 --medico 2 --paciente 1 --entidade 1
+
+Termina com código 1 se o número de reservas aceites for diferente de 1.
+"""
+import argparse
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+import httpx
+from sqlalchemy.exc import IntegrityError
+
+from benchmarks import carregar_modelos
+from src.core.config import settings
+from src.database import SessionLocal
+from src.marcacoes.models import Marcacao
+
+carregar_modelos()
+
+TITULO = "Teste de concorrência"
+
+
+def _horario_de_teste(dias: int) -> tuple[datetime, datetime]:
+    # 10:00-10:30 (hora local) daqui a `dias` dias, longe de marcações reais
+    dia = datetime.now(ZoneInfo(settings.TIMEZONE)).date() + timedelta(days=dias)
+    inicio = datetime.combine(dia, time(10, 0), ZoneInfo(settings.TIMEZONE))
+    return inicio, inicio + timedelta(minutes=30)
+
+
+def _limpar(inicio: datetime, medico_id: int) -> None:
+    db = SessionLocal()
+    try:
+        db.query(Marcacao).filter(
+            Marcacao.medico_id == medico_id,
+            Marcacao.data_hora_inicio == inicio,
+            Marcacao.titulo == TITULO,
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def correr_db(args, inicio: datetime, fim: datetime) -> list[str]:
+    barreira = threading.Barrier(args.pedidos)
+
+    def reservar(_):
+        db = SessionLocal()
+        try:
+            barreira.wait(timeout=30)   # todos arrancam ao mesmo tempo
+            db.add(Marcacao(
+                paciente_id=args.paciente,
+                medico_id=args.medico,
+                clinic_id=args.clinica,
+                agendada_por=args.medico,
+                entidade_id=args.entidade,
+                data_hora_inicio=inicio,
+                data_hora_fim=fim,
+                titulo=TITULO,
+            ))
+            db.commit()
+            return "aceite"
+        except IntegrityError:
+            db.rollback()
+            return "rejeitada"
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=args.pedidos) as ex:
+        return list(ex.map(reservar, range(args.pedidos)))
+
+
+def correr_http(args, inicio: datetime, fim: datetime) -> list[str]:
+    with httpx.Client(base_url=args.url.rstrip("/"), timeout=30) as client:
+        r = client.post("/utilizadores/login", data={"username": args.utilizador, "password": args.password})
+        r.raise_for_status()
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        payload = {
+            "paciente_id": args.paciente,
+            "medico_id": args.medico,
+            "clinic_id": args.clinica,
+            "entidade_id": args.entidade,
+            "data_hora_inicio": inicio.isoformat(),
+            "data_hora_fim": fim.isoformat(),
+            "titulo": TITULO,
+        }
+        barreira = threading.Barrier(args.pedidos)
+
+        def reservar(_):
+            barreira.wait(timeout=30)
+            r = client.post("/marcacoes", json=payload, headers=headers)
+            if r.status_code == 201:
+                return "aceite"
+            if r.status_code == 409:
+                return "rejeitada"
+            return f"erro {r.status_code}: {r.text[:100]}"
+
+        with ThreadPoolExecutor(max_workers=args.pedidos) as ex:
+            return list(ex.map(reservar, range(args.pedidos)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modo", choices=("db", "http"), default="db")
+    parser.add_argument("--pedidos", type=int, default=20)
+    parser.add_argument("--dias", type=int, default=60, help="daqui a quantos dias fica o horário de teste")
+    parser.add_argument("--clinica", type=int, required=True)
+    parser.add_argument("--medico", type=int, required=True)
+    parser.add_argument("--paciente", type=int, required=True)
+    parser.add_argument("--entidade", type=int, required=True)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--utilizador")
+    parser.add_argument("--password")
+    args = parser.parse_args()
+
+    inicio, fim = _horario_de_teste(args.dias)
+    _limpar(inicio, args.medico)
+    try:
+        if args.modo == "db":
+            resultados = correr_db(args, inicio, fim)
+        else:
+            resultados = correr_http(args, inicio, fim)
+    finally:
+        _limpar(inicio, args.medico)
+
+    aceites = resultados.count("aceite")
+    rejeitadas = resultados.count("rejeitada")
+    outros = [r for r in resultados if r not in ("aceite", "rejeitada")]
+    print(f"pedidos: {len(resultados)}  aceites: {aceites}  rejeitadas: {rejeitadas}  outros: {len(outros)}")
+    for r in outros[:5]:
+        print("  ", r)
+    if aceites != 1 or outros:
+        print("FALHOU: era esperada exatamente uma reserva aceite.")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
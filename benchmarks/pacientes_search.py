@@ -0,0 +1,171 @@
+"""
+Benchmark da pesquisa de pacientes (/pacientes/search).
+
+Cria uma clínica sintética com N pacientes (por omissão 200 000),
+executa pesquisas aleatórias através de `service.buscar_pacientes`
+e mostra a latência p50/p95/p99.
+
+Requer a base de dados configurada no `.env` e as migrações aplicadas
+(`alembic upgrade head`, extensões `pg_trgm` e `unaccent`).
+
+Uso:
+    python -m benchmarks.pacientes_search --pacientes 200000 --pesquisas 500
+    python -m benchmarks.pacientes_search --limpar
+"""
+import argparse
+import random
+import statistics
+import time
+
+from sqlalchemy import text
+
+from benchmarks import carregar_modelos
+from src.database import SessionLocal
+from src.pacientes import service
+
+carregar_modelos()
+
+CLINICA_BENCH = "Clínica Benchmark Pesquisa"
+
+NOMES = [
+    "João", "José", "António", "Francisco", "Manuel", "Maria", "Ana", "Inês",
+    "Beatriz", "Leonor", "Gonçalo", "Tomás", "Conceição", "Sónia", "Fátima",
+    "Raúl", "Rúben", "Margarida", "Luís", "Sebastião",
+]
+APELIDOS = [
+    "Silva", "Santos", "Ferreira", "Pereira", "Oliveira", "Costa", "Rodrigues",
+    "Martins", "Jesus", "Sousa", "Fernandes", "Gonçalves", "Gomes", "Lopes",
+    "Marques", "Alves", "Almeida", "Ribeiro", "Pinto", "Carvalho", "Simões",
+    "Brandão", "Conceição", "Magalhães", "Araújo",
+]
+
+
+def _obter_clinica(db) -> int:
+    clinica_id = db.execute(
+        text('SELECT id FROM "Clinica" WHERE nome = :nome'), {"nome": CLINICA_BENCH}
+    ).scalar()
+    if clinica_id is None:
+        clinica_id = db.execute(
+            text('INSERT INTO "Clinica" (nome) VALUES (:nome) RETURNING id'),
+            {"nome": CLINICA_BENCH},
+        ).scalar()
+        db.commit()
+    return clinica_id
+
+
+def popular(db, clinica_id: int, total: int) -> None:
+    existentes = db.execute(
+        text('SELECT count(*) FROM "Paciente" WHERE clinica_id = :c'), {"c": clinica_id}
+    ).scalar()
+    if existentes >= total:
+        print(f"Clínica {clinica_id} já tem {existentes} pacientes.")
+        return
+
+    print(f"A criar {total - existentes} pacientes sintéticos...")
+    db.execute(
+        text(
+            """
+            INSERT INTO "Paciente"
+                (clinica_id, nome, nif, telefone, numero_documento, email)
+            SELECT
+                :clinica_id,
+                (:nomes)[1 + (g * 7) % cardinality(:nomes)] || ' ' ||
+                (:apelidos)[1 + (g * 13) % cardinality(:apelidos)] || ' ' ||
+                (:apelidos)[1 + (g * 31) % cardinality(:apelidos)],
+                'B' || lpad(g::text, 9, '0'),
+                'B9' || lpad(g::text, 8, '0'),
+                'BCC' || lpad(g::text, 9, '0'),
+                'bench' || g || '@exemplo.pt'
+            FROM generate_series(:inicio, :fim) AS g
+            """
+        ),
+        {
+            "clinica_id": clinica_id,
+            "nomes": NOMES,
+            "apelidos": APELIDOS,
+            "inicio": existentes + 1,
+            "fim": total,
+        },
+    )
+    db.commit()
+    db.execute(text('ANALYZE "Paciente"'))
+    db.commit()
+
+
+def termos_aleatorios(n: int) -> list[str]:
+    termos = []
+    for _ in range(n):
+        tipo = random.random()
+        if tipo < 0.6:
+            nome = random.choice(NOMES + APELIDOS)
+            # autocomplete: prefixos parciais, por vezes sem acentos
+            termo = nome[: random.randint(3, len(nome))]
+            if random.random() < 0.5:
+                termo = service._normalizar_termo(termo)
+        elif tipo < 0.8:
+            termo = f"{random.choice(NOMES)} {random.choice(APELIDOS)[:4]}"
+        elif tipo < 0.9:
+            termo = str(random.randint(1000, 99999))
+        else:
+            termo = f"bench{random.randint(1, 9999)}@"
+        termos.append(termo)
+    return termos
+
+
+def medir(db, clinica_id: int, pesquisas: int) -> None:
+    termos = termos_aleatorios(pesquisas)
+    # aquecimento (cache de planos e páginas)
+    for termo in termos[:20]:
+        service.buscar_pacientes(db, termo, clinica_id)
+
+    tempos = []
+    for termo in termos:
+        inicio = time.perf_counter()
+        service.buscar_pacientes(db, termo, clinica_id)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+
+    tempos.sort()
+    def pct(p: float) -> float:
+        return tempos[min(len(tempos) - 1, int(len(tempos) * p))]
+
+    print(f"pesquisas: {len(tempos)}")
+    print(f"média: {statistics.mean(tempos):.2f} ms")
+    print(f"p50:   {pct(0.50):.2f} ms")
+    print(f"p95:   {pct(0.95):.2f} ms")
+    print(f"p99:   {pct(0.99):.2f} ms")
+
+
+def limpar(db) -> None:
+    db.execute(
+        text(
+            'DELETE FROM "Paciente" WHERE clinica_id IN '
+            '(SELECT id FROM "Clinica" WHERE nome = :nome)'
+        ),
+        {"nome": CLINICA_BENCH},
+    )
+    db.execute(text('DELETE FROM "Clinica" WHERE nome = :nome'), {"nome": CLINICA_BENCH})
+    db.commit()
+    print("Dados sintéticos removidos.")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pacientes", type=int, default=200_000)
+    parser.add_argument("--pesquisas", type=int, default=500)
+    parser.add_argument("--limpar", action="store_true", help="remove os dados sintéticos e sai")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.limpar:
+            limpar(db)
+            return
+        clinica_id = _obter_clinica(db)
+        popular(db, clinica_id, args.pacientes)
+        medir(db, clinica_id, args.pesquisas)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
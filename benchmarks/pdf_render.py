@@ -0,0 +1,102 @@
+"""
+Microbenchmark da conversão HTML → PDF (WeasyPrint), por documento.
+
+Compara, no próprio processo e com o mesmo HTML:
+
+  antes   HTML gravado num ficheiro temporário em `generated_pdfs/` e
+          `styles.css` lido e interpretado em cada documento (o que
+          `pdf.service.generate_pdf` fazia);
+  depois  `pdf.renderer._renderizar`: HTML a partir da string, CSS e
+          configuração de fontes preparados uma vez, logótipo em cache.
+
+Mostra a latência p50/p95 e o pico de memória alocada (tracemalloc) por
+documento. O HTML é o de uma fatura real (--fatura) ou de um orçamento
+(--orcamento), montado com o contexto do serviço de PDFs.
+
+Uso:
+    python -m benchmarks.pdf_render --fatura 12 --documentos 30
+    python -m benchmarks.pdf_render --orcamento 4 --documentos 30
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from weasyprint import CSS, HTML
+
+from benchmarks import carregar_modelos
+from src.database import SessionLocal
+from src.pdf import renderer, service
+
+carregar_modelos()
+
+
+def renderizar_antes(html: str) -> bytes:
+    with tempfile.NamedTemporaryFile(
+        suffix=".html", delete=False, dir=str(service.PDF_TMP_DIR)
+    ) as tmp_html:
+        tmp_html.write(html.encode("utf-8"))
+        html_path = tmp_html.name
+    try:
+        styles = [CSS(filename=str(renderer.ASSETS_DIR / "styles.css"))]
+        return HTML(filename=html_path, base_url=str(renderer.TEMPLATES_DIR)).write_pdf(
+            stylesheets=styles
+        )
+    finally:
+        os.unlink(html_path)
+
+
+def renderizar_depois(html: str) -> bytes:
+    return renderer._renderizar(html, ["styles.css"])
+
+
+def medir(nome: str, fn, html: str, documentos: int) -> None:
+    inicio = time.perf_counter()
+    fn(html)  # 1.º documento: inclui a preparação (fontes, CSS, imagens)
+    primeiro = (time.perf_counter() - inicio) * 1000
+
+    tempos: list[float] = []
+    picos: list[float] = []
+    for _ in range(documentos):
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        fn(html)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        picos.append(tracemalloc.get_traced_memory()[1] / 1024 / 1024)
+        tracemalloc.stop()
+
+    tempos.sort()
+    print(
+        f"{nome:7s} 1.º doc: {primeiro:6.0f} ms   "
+        f"p50: {statistics.median(tempos):6.0f} ms   "
+        f"p95: {tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))]:6.0f} ms   "
+        f"pico de memória: {statistics.median(picos):5.1f} MiB/doc"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument("--fatura", type=int)
+    grupo.add_argument("--orcamento", type=int)
+    parser.add_argument("--documentos", type=int, default=30)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.fatura is not None:
+            html = service.render_template("fatura.html", service.contexto_fatura(args.fatura, db))
+        else:
+            html = service.render_template("orcamento.html", service.contexto_orcamento(args.orcamento, db))
+    finally:
+        db.close()
+
+    print(f"HTML: {len(html) / 1024:.1f} KiB, {args.documentos} documentos por modo")
+    medir("antes", renderizar_antes, html, args.documentos)
+    medir("depois", renderizar_depois, html, args.documentos)
+
+
+if __name__ == "__main__":
+    main()
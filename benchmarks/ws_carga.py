@@ -0,0 +1,206 @@
+"""
+Teste de carga dos WebSockets das mensagens (/mensagens/ws/clinica/{id}).
+
+Cria (se não existir) um utilizador sintético membro da clínica, abre
+N sockets em simultâneo com o mesmo token e mantém-nos abertos, a
+responder aos pings do servidor. Depois envia mensagens para a thread da
+clínica (POST /mensagens) e mede quanto tempo cada uma demora a chegar a
+todos os sockets. Contra um único worker:
+
+    uvicorn src.main:app --workers 1
+    python -m benchmarks.ws_carga --url http://localhost:8000 --sockets 2000 --clinica 1
+    python -m benchmarks.ws_carga --limpar
+
+Com muitos sockets o próprio cliente precisa de ficheiros suficientes
+(`ulimit -n 8192`). Durante o teste, GET /mensagens/presenca mostra o
+utilizador online; no fim mede-se o tempo até deixar de estar.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+from sqlalchemy import text
+
+from benchmarks import carregar_modelos
+from src.database import SessionLocal
+from src.utilizadores.hashing import pwd_context
+
+carregar_modelos()
+
+USERNAME_BENCH = "benchmark_ws"
+PASSWORD_BENCH = "benchmark-ws-pw"
+
+
+def preparar_utilizador(db, clinica_id: int) -> None:
+    user_id = db.execute(
+        text('SELECT id FROM "Utilizador" WHERE username = :u'), {"u": USERNAME_BENCH}
+    ).scalar()
+    if user_id is not None:
+        db.execute(
+            text('UPDATE "Utilizador" SET bloqueado = false, tentativas_falhadas = 0, ativo = true WHERE id = :id'),
+            {"id": user_id},
+        )
+    else:
+        user_id = db.execute(
+            text(
+                'INSERT INTO "Utilizador" (username, nome, email, telefone, password_hash, ativo, tentativas_falhadas, bloqueado) '
+                "VALUES (:u, 'Benchmark WebSocket', :u || '@exemplo.pt', '+351000000024', :h, true, 0, false) "
+                "RETURNING id"
+            ),
+            {"u": USERNAME_BENCH, "h": pwd_context.hash(PASSWORD_BENCH)},
+        ).scalar()
+    membro = db.execute(
+        text('SELECT 1 FROM "UtilizadorClinica" WHERE utilizador_id = :id AND clinica_id = :c'),
+        {"id": user_id, "c": clinica_id},
+    ).scalar()
+    if membro is None:
+        db.execute(
+            text('INSERT INTO "UtilizadorClinica" (utilizador_id, clinica_id, ativo) VALUES (:id, :c, true)'),
+            {"id": user_id, "c": clinica_id},
+        )
+    db.commit()
+
+
+def _pct(valores: list[float], p: float) -> float:
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+class Socket:
+    """Um cliente: responde aos pings e regista quando chega cada mensagem."""
+
+    def __init__(self):
+        self.chegadas: dict[int, float] = {}
+        self.fechado_em: float | None = None
+
+    async def correr(self, ws_url: str, pronto: asyncio.Event, parar: asyncio.Event, ligados: list):
+        import websockets
+
+        inicio = time.perf_counter()
+        try:
+            async with websockets.connect(ws_url, ping_interval=None, max_queue=None, open_timeout=60) as ws:
+                ligados.append((time.perf_counter() - inicio) * 1000)
+                pronto.set()
+                leitor = asyncio.create_task(self._ler(ws))
+                await parar.wait()
+                leitor.cancel()
+        except Exception:
+            self.fechado_em = time.perf_counter()
+            pronto.set()
+
+    async def _ler(self, ws):
+        try:
+            async for bruto in ws:
+                frame = json.loads(bruto)
+                if frame.get("tipo") == "ping":
+                    await ws.send(json.dumps({"tipo": "pong"}))
+                elif "id" in frame:
+                    self.chegadas[frame["id"]] = time.perf_counter()
+        except Exception:
+            self.fechado_em = time.perf_counter()
+
+
+async def medir(url: str, n_sockets: int, clinica_id: int, mensagens: int, duracao: float) -> None:
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        r = await client.post("/utilizadores/login", data={"username": USERNAME_BENCH, "password": PASSWORD_BENCH})
+        r.raise_for_status()
+        token = r.json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        thread = (await client.get("/mensagens/clinic-thread", params={"clinica_id": clinica_id}, headers=headers)).json()
+
+        ws_url = url.replace("http", "ws", 1) + f"/mensagens/ws/clinica/{clinica_id}?token={token}"
+        parar = asyncio.Event()
+        ligados: list[float] = []
+        sockets = [Socket() for _ in range(n_sockets)]
+        prontos = [asyncio.Event() for _ in sockets]
+
+        inicio = time.perf_counter()
+        tarefas = [
+            asyncio.create_task(s.correr(ws_url, pronto, parar, ligados))
+            for s, pronto in zip(sockets, prontos)
+        ]
+        await asyncio.gather(*(p.wait() for p in prontos))
+        t_ligar = time.perf_counter() - inicio
+        ligados.sort()
+        print(f"sockets ligados: {len(ligados)}/{n_sockets} em {t_ligar:.2f} s")
+        if ligados:
+            print(f"ligação p50: {_pct(ligados, 0.50):.0f} ms  p95: {_pct(ligados, 0.95):.0f} ms  p99: {_pct(ligados, 0.99):.0f} ms")
+
+        presenca = (await client.get("/mensagens/presenca", params={"clinica_id": clinica_id}, headers=headers)).json()
+        print(f"presença: {len(presenca['online'])} utilizadores online")
+
+        # broadcast: tempo até a mensagem chegar ao último socket
+        abertos = [s for s in sockets if s.fechado_em is None]
+        latencias: list[float] = []
+        for i in range(mensagens):
+            enviado = time.perf_counter()
+            r = await client.post(
+                "/mensagens",
+                json={"clinica_id": clinica_id, "thread_id": thread["id"], "texto": f"carga {i}"},
+                headers=headers,
+            )
+            msg_id = r.json()["id"]
+            limite = time.perf_counter() + 30
+            while time.perf_counter() < limite and any(msg_id not in s.chegadas for s in abertos):
+                await asyncio.sleep(0.01)
+            chegadas = [s.chegadas[msg_id] for s in abertos if msg_id in s.chegadas]
+            if chegadas:
+                latencias.append((max(chegadas) - enviado) * 1000)
+            print(f"mensagem {i}: {len(chegadas)}/{len(abertos)} sockets, último em {(max(chegadas) - enviado) * 1000:.0f} ms"
+                  if chegadas else f"mensagem {i}: não chegou a nenhum socket")
+        if latencias:
+            latencias.sort()
+            print(f"broadcast completo p50: {_pct(latencias, 0.50):.0f} ms  máx: {latencias[-1]:.0f} ms")
+
+        # mantém os sockets abertos (heartbeats) e conta os que o servidor fechou
+        if duracao > 0:
+            await asyncio.sleep(duracao)
+            print(f"após {duracao:.0f} s: {sum(s.fechado_em is None for s in sockets)} sockets ainda abertos")
+
+        parar.set()
+        await asyncio.gather(*tarefas)
+        fim = time.perf_counter()
+        while time.perf_counter() - fim < 10:
+            presenca = (await client.get("/mensagens/presenca", params={"clinica_id": clinica_id}, headers=headers)).json()
+            if not presenca["online"]:
+                break
+            await asyncio.sleep(0.1)
+        print(f"presença vazia {time.perf_counter() - fim:.2f} s depois de fechar os sockets")
+
+
+def limpar(db) -> None:
+    filtro = '(SELECT id FROM "Utilizador" WHERE username = :u)'
+    db.execute(text(f'DELETE FROM "Sessao" WHERE utilizador_id IN {filtro}'), {"u": USERNAME_BENCH})
+    db.execute(text(f'DELETE FROM "Auditoria" WHERE utilizador_id IN {filtro}'), {"u": USERNAME_BENCH})
+    db.execute(text(f'DELETE FROM "Mensagens" WHERE remetente_id IN {filtro}'), {"u": USERNAME_BENCH})
+    db.execute(text(f'DELETE FROM "ThreadLeituras" WHERE utilizador_id IN {filtro}'), {"u": USERNAME_BENCH})
+    db.execute(text(f'DELETE FROM "UtilizadorClinica" WHERE utilizador_id IN {filtro}'), {"u": USERNAME_BENCH})
+    db.execute(text('DELETE FROM "Utilizador" WHERE username = :u'), {"u": USERNAME_BENCH})
+    db.commit()
+    print("Utilizador sintético removido.")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--sockets", type=int, default=2000)
+    parser.add_argument("--clinica", type=int, default=1)
+    parser.add_argument("--mensagens", type=int, default=5, help="broadcasts a medir")
+    parser.add_argument("--duracao", type=float, default=0, help="segundos a manter os sockets abertos no fim")
+    parser.add_argument("--limpar", action="store_true", help="remove o utilizador sintético e sai")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.limpar:
+            limpar(db)
+            return
+        preparar_utilizador(db, args.clinica)
+    finally:
+        db.close()
+    asyncio.run(medir(args.url.rstrip("/"), args.sockets, args.clinica, args.mensagens, args.duracao))
+
+
+if __name__ == "__main__":
+    main()
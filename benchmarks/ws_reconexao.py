@@ -0,0 +1,178 @@
+"""
+Benchmark de vagas de reconexão aos WebSockets das mensagens.
+
+Simula o que acontece depois de um deploy: todos os clientes perdem o
+socket e voltam a ligar-se ao mesmo tempo. Cria (se não existirem)
+`--utilizadores` utilizadores sintéticos membros da clínica, faz login de
+cada um e abre `--sockets` ligações em simultâneo (os tokens repartidos
+entre os utilizadores), fecha-as todas e repete durante `--rondas`.
+
+Um socket "observador", ligado antes da vaga, envia {"tipo": "ping"} a
+cada 20 ms: a latência do "pong" durante a vaga mostra quanto o handshake
+dos outros bloqueia o event loop do worker.
+
+    uvicorn src.main:app --workers 1
+    python -m benchmarks.ws_reconexao --url http://localhost:8000 --sockets 500 --rondas 3
+    python -m benchmarks.ws_reconexao --limpar
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+from sqlalchemy import text
+
+from benchmarks import carregar_modelos
+from src.database import SessionLocal
+from src.utilizadores.hashing import pwd_context
+
+carregar_modelos()
+
+PREFIXO_BENCH = "benchmark_ws_rc_"
+PASSWORD_BENCH = "benchmark-ws-rc-pw"
+
+
+def preparar_utilizadores(db, n: int, clinica_id: int) -> list[str]:
+    password_hash = pwd_context.hash(PASSWORD_BENCH)
+    usernames = []
+    for i in range(n):
+        username = f"{PREFIXO_BENCH}{i:04d}"
+        user_id = db.execute(
+            text('SELECT id FROM "Utilizador" WHERE username = :u'), {"u": username}
+        ).scalar()
+        if user_id is None:
+            user_id = db.execute(
+                text(
+                    'INSERT INTO "Utilizador" (username, nome, email, telefone, password_hash, ativo, tentativas_falhadas, bloqueado) '
+                    "VALUES (:u, 'Benchmark Reconexão', :u || '@exemplo.pt', :t, :h, true, 0, false) "
+                    "RETURNING id"
+                ),
+                {"u": username, "t": f"+3519{i:08d}", "h": password_hash},
+            ).scalar()
+            db.execute(
+                text('INSERT INTO "UtilizadorClinica" (utilizador_id, clinica_id, ativo) VALUES (:id, :c, true)'),
+                {"id": user_id, "c": clinica_id},
+            )
+        else:
+            db.execute(
+                text('UPDATE "Utilizador" SET bloqueado = false, tentativas_falhadas = 0, ativo = true WHERE id = :id'),
+                {"id": user_id},
+            )
+        usernames.append(username)
+    db.commit()
+    return usernames
+
+
+def _pct(valores: list[float], p: float) -> float:
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+async def _login(client: httpx.AsyncClient, username: str) -> str:
+    r = await client.post("/utilizadores/login", data={"username": username, "password": PASSWORD_BENCH})
+    r.raise_for_status()
+    return r.json()["access_token"]
+
+
+async def _observar(ws_url: str, latencias: list[float], parar: asyncio.Event) -> None:
+    import websockets
+
+    async with websockets.connect(ws_url, ping_interval=None) as ws:
+        while not parar.is_set():
+            inicio = time.perf_counter()
+            await ws.send(json.dumps({"tipo": "ping"}))
+            while json.loads(await ws.recv()).get("tipo") != "pong":
+                pass
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            await asyncio.sleep(0.02)
+
+
+async def _ligar(ws_url: str, tempos: list[float], erros: list[str], todos_ligados: asyncio.Event):
+    import websockets
+
+    inicio = time.perf_counter()
+    try:
+        async with websockets.connect(ws_url, ping_interval=None, open_timeout=60) as ws:
+            tempos.append((time.perf_counter() - inicio) * 1000)
+            await todos_ligados.wait()
+            await ws.close()
+    except Exception as exc:
+        erros.append(type(exc).__name__)
+
+
+async def medir(url: str, usernames: list[str], clinica_id: int, n_sockets: int, rondas: int) -> None:
+    ws_base = url.replace("http", "ws", 1) + f"/mensagens/ws/clinica/{clinica_id}?token="
+    async with httpx.AsyncClient(base_url=url, timeout=120) as client:
+        tokens = [await _login(client, u) for u in usernames]
+
+    latencias: list[float] = []
+    parar = asyncio.Event()
+    observador = asyncio.create_task(_observar(ws_base + tokens[0], latencias, parar))
+    await asyncio.sleep(0.5)
+    base = sorted(latencias)
+    if base:
+        print(f"pong em repouso p50: {_pct(base, 0.50):.1f} ms")
+
+    for ronda in range(1, rondas + 1):
+        tempos: list[float] = []
+        erros: list[str] = []
+        todos_ligados = asyncio.Event()
+        latencias.clear()
+        inicio = time.perf_counter()
+        tarefas = [
+            asyncio.create_task(_ligar(ws_base + tokens[i % len(tokens)], tempos, erros, todos_ligados))
+            for i in range(n_sockets)
+        ]
+        while len(tempos) + len(erros) < n_sockets:
+            await asyncio.sleep(0.01)
+        total = time.perf_counter() - inicio
+        todos_ligados.set()
+        await asyncio.gather(*tarefas)
+
+        tempos.sort()
+        pongs = sorted(latencias)
+        print(f"ronda {ronda}: {len(tempos)}/{n_sockets} ligados em {total:.2f} s, erros: {len(erros)}")
+        if tempos:
+            print(f"  handshake p50: {_pct(tempos, 0.50):.0f} ms  p95: {_pct(tempos, 0.95):.0f} ms  p99: {_pct(tempos, 0.99):.0f} ms")
+        if pongs:
+            print(f"  pong do observador durante a vaga p50: {_pct(pongs, 0.50):.1f} ms  máx: {pongs[-1]:.0f} ms")
+        await asyncio.sleep(1)  # deixa o servidor fechar as ligações antes da próxima vaga
+
+    parar.set()
+    await observador
+
+
+def limpar(db) -> None:
+    filtro = '(SELECT id FROM "Utilizador" WHERE username LIKE :p)'
+    params = {"p": PREFIXO_BENCH + "%"}
+    db.execute(text(f'DELETE FROM "Sessao" WHERE utilizador_id IN {filtro}'), params)
+    db.execute(text(f'DELETE FROM "Auditoria" WHERE utilizador_id IN {filtro}'), params)
+    db.execute(text(f'DELETE FROM "UtilizadorClinica" WHERE utilizador_id IN {filtro}'), params)
+    db.execute(text('DELETE FROM "Utilizador" WHERE username LIKE :p'), params)
+    db.commit()
+    print("Utilizadores sintéticos removidos.")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--sockets", type=int, default=500)
+    parser.add_argument("--utilizadores", type=int, default=50)
+    parser.add_argument("--clinica", type=int, default=1)
+    parser.add_argument("--rondas", type=int, default=3)
+    parser.add_argument("--limpar", action="store_true", help="remove os utilizadores sintéticos e sai")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.limpar:
+            limpar(db)
+            return
+        usernames = preparar_utilizadores(db, args.utilizadores, args.clinica)
+    finally:
+        db.close()
+    asyncio.run(medir(args.url.rstrip("/"), usernames, args.clinica, args.sockets, args.rondas))
+
+
+if __name__ == "__main__":
+    main()
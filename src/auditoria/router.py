@@ -1,19 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from src.auditoria import service, schemas
-from src.database import SessionLocal
+from src.database import get_db
 from src.utilizadores.dependencies import get_current_user
 from src.utilizadores.utils import is_master_admin
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.get("/", response_model=list[schemas.AuditoriaResponse])
 def listar_auditoria(
     db: Session = Depends(get_db),
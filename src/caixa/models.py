@@ -1,6 +1,6 @@
 import enum
 from sqlalchemy import (
-    Column, Integer, Numeric, DateTime, ForeignKey, String, Text, Enum as SAEnum, func
+    Column, Integer, Numeric, DateTime, ForeignKey, String, Text, Enum as SAEnum, Index, func
 )
 from sqlalchemy.orm import relationship
 from src.database import Base
@@ -26,6 +26,10 @@ class CaixaSession(Base):
 
 class CashierPayment(Base):
     __tablename__ = "CaixaPayments"
+    __table_args__ = (
+        # histórico/totais da sessão aberta e cursor incremental (id > x)
+        Index("ix_caixapayments_session_id", "session_id", "id"),
+    )
 
     id               = Column(Integer, primary_key=True, index=True)
     session_id       = Column(Integer, ForeignKey("CaixaSessions.id"), nullable=False)
@@ -1,8 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
-from src.database import SessionLocal
+from src.database import get_db
 from src.utilizadores.dependencies import get_current_user
 from src.utilizadores.models import Utilizador
 from src.utilizadores.utils import is_frontdesk
@@ -11,13 +11,6 @@ from src.caixa import service, schemas
 
 router = APIRouter(prefix="/caixa/sessions", tags=["Caixa"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def frontoffice_only(user: Utilizador = Depends(get_current_user)):
     if not is_frontdesk(user): 
         raise HTTPException(
@@ -27,8 +20,13 @@ def frontoffice_only(user: Utilizador = Depends(get_current_user)):
     return user
 
 @router.get("", response_model=Dict[str, Any])
-def get_open_session(db: Session = Depends(get_db)):
-    sess = service.fetch_open_session(db)
+def get_open_session(
+    after_id: Optional[int] = Query(
+        None, description="Cursor: devolve só pagamentos com id maior (payments.cursor da resposta anterior)"
+    ),
+    db: Session = Depends(get_db),
+):
+    sess = service.fetch_open_session(db, after_id=after_id)
     if not sess:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Nenhuma sessão aberta")
     return sess
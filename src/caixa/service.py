@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Optional, List
 
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 
@@ -11,72 +12,87 @@ from src.caixa.schemas import (
 )
 from src.faturacao.models import Fatura, FaturaEstado, FaturaPagamento, FaturaTipo, ParcelaEstado, ParcelaPagamento
 from src.pacientes.models import Paciente
+from src.utilizadores.models import Utilizador
 
-def fetch_open_session(db: Session) -> Optional[dict]:
-    """Fetch open session with detailed payment information and history."""
-    session = db.query(CaixaSession)\
-               .filter(CaixaSession.status == CaixaStatus.aberto)\
-               .order_by(CaixaSession.data_inicio.desc())\
-               .first()
-    
-    if not session:
+def _get_open_session(db: Session):
+    """Sessão aberta mais recente + nome do operador, numa só query."""
+    return db.execute(
+        select(CaixaSession, Utilizador.nome)
+        .outerjoin(Utilizador, Utilizador.id == CaixaSession.operador_id)
+        .where(CaixaSession.status == CaixaStatus.aberto)
+        .order_by(CaixaSession.data_inicio.desc())
+        .limit(1)
+    ).first()
+
+
+def fetch_open_session(db: Session, after_id: Optional[int] = None) -> Optional[dict]:
+    """
+    Fetch open session with detailed payment information and history.
+
+    Com `after_id`, o histórico traz apenas os pagamentos com id maior
+    (atualização incremental do ecrã de caixa); os totais são sempre os
+    da sessão inteira. `payments.cursor` é o valor a enviar no pedido
+    seguinte.
+    """
+    row = _get_open_session(db)
+    if not row:
         return None
-    
-    # Get all payments for this session
-    payments = db.query(CashierPayment)\
-                .filter(CashierPayment.session_id == session.id)\
-                .order_by(CashierPayment.data_pagamento.desc())\
-                .all()
-    
-    # Get customer names for each payment
-    payment_details = []
-    for payment in payments:
-        customer_name = None
-        
-        # Get customer name if fatura_id is present
-        if payment.fatura_id:
-            fatura = db.query(Fatura).filter(Fatura.id == payment.fatura_id).first()
-            if fatura and fatura.paciente_id:
-                paciente = db.query(Paciente).filter(Paciente.id == fatura.paciente_id).first()
-                if paciente:
-                    customer_name = paciente.nome
-        
-        # Get customer name if parcela_id is present
-        elif payment.parcela_id:
-            parcela = db.query(ParcelaPagamento).filter(ParcelaPagamento.id == payment.parcela_id).first()
-            if parcela and parcela.fatura_id:
-                fatura = db.query(Fatura).filter(Fatura.id == parcela.fatura_id).first()
-                if fatura and fatura.paciente_id:
-                    paciente = db.query(Paciente).filter(Paciente.id == fatura.paciente_id).first()
-                    if paciente:
-                        customer_name = paciente.nome
-        
-        payment_details.append({
-            "id": payment.id,
-            "valor": float(payment.valor_pago),
-            "metodo": payment.metodo_pagamento,
-            "data": payment.data_pagamento,
-            "paciente_nome": customer_name,
-            "fatura_id": payment.fatura_id,
-            "parcela_id": payment.parcela_id
-        })
-    
-    # Calculate totals by payment method
+    session, operador_nome = row
+
+    # Nome do paciente: via fatura direta ou via fatura da parcela
+    fatura_id = func.coalesce(CashierPayment.fatura_id, ParcelaPagamento.fatura_id)
+    history_q = (
+        select(
+            CashierPayment.id,
+            CashierPayment.valor_pago,
+            CashierPayment.metodo_pagamento,
+            CashierPayment.data_pagamento,
+            CashierPayment.fatura_id,
+            CashierPayment.parcela_id,
+            Paciente.nome.label("paciente_nome"),
+        )
+        .outerjoin(ParcelaPagamento, ParcelaPagamento.id == CashierPayment.parcela_id)
+        .outerjoin(Fatura, Fatura.id == fatura_id)
+        .outerjoin(Paciente, Paciente.id == Fatura.paciente_id)
+        .where(CashierPayment.session_id == session.id)
+        .order_by(CashierPayment.data_pagamento.desc(), CashierPayment.id.desc())
+    )
+    if after_id is not None:
+        history_q = history_q.where(CashierPayment.id > after_id)
+
+    payment_details = [
+        {
+            "id": p.id,
+            "valor": float(p.valor_pago),
+            "metodo": p.metodo_pagamento,
+            "data": p.data_pagamento,
+            "paciente_nome": p.paciente_nome,
+            "fatura_id": p.fatura_id,
+            "parcela_id": p.parcela_id,
+        }
+        for p in db.execute(history_q)
+    ]
+
+    # Calculate totals by payment method (GROUP BY na base de dados)
+    totals_q = (
+        select(
+            CashierPayment.metodo_pagamento,
+            func.count(CashierPayment.id),
+            func.coalesce(func.sum(CashierPayment.valor_pago), 0),
+        )
+        .where(CashierPayment.session_id == session.id)
+        .group_by(CashierPayment.metodo_pagamento)
+    )
     payment_totals = {}
-    for payment in payments:
-        method = payment.metodo_pagamento
-        if method not in payment_totals:
-            payment_totals[method] = {
-                "count": 0,
-                "total": 0
-            }
-        
-        payment_totals[method]["count"] += 1
-        payment_totals[method]["total"] += float(payment.valor_pago)
-    
-    # Calculate overall total
-    total_amount = sum(float(p.valor_pago) for p in payments)
-    
+    total_count = 0
+    total_amount = 0.0
+    for method, count, total in db.execute(totals_q):
+        payment_totals[method] = {"count": count, "total": float(total)}
+        total_count += count
+        total_amount += float(total)
+
+    cursor = max((p["id"] for p in payment_details), default=after_id)
+
     # Return enriched session data
     return {
         "session": {
@@ -85,18 +101,19 @@ def fetch_open_session(db: Session) -> Optional[dict]:
             "valor_inicial": float(session.valor_inicial),
             "status": session.status.value,
             "operador_id": session.operador_id,
-            "operador_nome": session.operador.nome if session.operador else None
+            "operador_nome": operador_nome
         },
         "payments": {
-            "count": len(payments),
+            "count": total_count,
             "total": total_amount,
             "by_method": payment_totals,
-            "history": payment_details
+            "history": payment_details,
+            "cursor": cursor
         }
     }
 def open_session(db: Session, payload: CaixaSessionCreate, operador_id: int) -> CaixaSession:
     # Check if there's already an open session
-    existing = fetch_open_session(db)
+    existing = _get_open_session(db)
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
-from src.database import SessionLocal
+from src.database import get_db
 from src.utilizadores.dependencies import get_current_user
 from src.utilizadores.models import Utilizador
 from src.utilizadores.utils import is_master_admin
@@ -10,13 +10,6 @@ from . import service, schemas
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post(
     "",
     response_model=schemas.CategoriaResponse,
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from src.database import SessionLocal
+from src.database import get_db
 from src.utilizadores.dependencies import get_current_user
 from src.utilizadores.utils import is_master_admin
 from . import service, schemas, models
@@ -8,13 +8,6 @@ from src.utilizadores import models as utilizador_models
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # -------- CLINICA --------
 @router.post("", response_model=schemas.ClinicaResponse)
 def criar_clinica(
@@ -1,6 +1,7 @@
 from src.utilizadores.models import Utilizador, UtilizadorClinica
 from src.utilizadores.utils import is_master_admin
 from src.auditoria.utils import registrar_auditoria
+from src.email.raw_service import chave_config, invalidar_mailer
 from sqlalchemy.orm import Session, selectinload
 from src.clinica import models, schemas
 
@@ -104,10 +105,13 @@ def atualizar_email(db: Session, email_id: int, dados: schemas.ClinicaEmailBase,
     email = db.query(models.ClinicaEmail).filter_by(id=email_id).first()
     if not email:
         return None
+    chave_antiga = chave_config(email)
     for key, value in dados.dict().items():
         setattr(email, key, value)
     db.commit()
     db.refresh(email)
+    # as ligações SMTP abertas usam as credenciais antigas
+    invalidar_mailer(chave_antiga)
     registrar_auditoria(
         db, user_id, "Atualização", "ClinicaEmail", email.id, f"E-mail SMTP atualizado."
     )
@@ -116,8 +120,10 @@ def atualizar_email(db: Session, email_id: int, dados: schemas.ClinicaEmailBase,
 def remover_email(db: Session, email_id: int, user_id: int):
     email = db.query(models.ClinicaEmail).filter_by(id=email_id).first()
     if email:
+        chave_antiga = chave_config(email)
         db.delete(email)
         db.commit()
+        invalidar_mailer(chave_antiga)
         registrar_auditoria(
             db, user_id, "Remoção", "ClinicaEmail", email_id, f"E-mail SMTP removido."
         )
@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    ARRAY, Column, Integer, SmallInteger, String, DateTime, ForeignKey, Numeric, Text, func
+    ARRAY, Column, Integer, SmallInteger, String, DateTime, ForeignKey, Numeric, Text, Index, func
 )
 from sqlalchemy.orm import relationship
 from src.database import Base
@@ -7,6 +7,10 @@ from src.artigos.models import ArtigoMedico
 
 class Consulta(Base):
     __tablename__ = "Consultas"
+    __table_args__ = (
+        Index("ix_consultas_paciente_data_inicio", "paciente_id", "data_inicio"),
+        Index("ix_consultas_clinica_medico_inicio", "clinica_id", "medico_id", "data_inicio"),
+    )
 
     id           = Column(Integer, primary_key=True, index=True)
     paciente_id  = Column(Integer, ForeignKey("Paciente.id"), nullable=False)
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Literal, Optional, Union
 from datetime import date
-from src.database import SessionLocal
+from src.database import get_async_db, get_db
 from src.utilizadores.dependencies import get_current_user
 from src.utilizadores.models import Utilizador
 
@@ -15,14 +16,6 @@ router = APIRouter(
 )
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @router.post(
     "",
     response_model=schemas.ConsultaFull,
@@ -43,10 +36,10 @@ def criar_consulta(
 
 @router.get(
     "",
-    response_model=List[schemas.ConsultaFull],
+    response_model=Union[List[schemas.ConsultaFull], List[schemas.ConsultaCalendario]],
     summary="Listar consultas",
 )
-def listar_consultas(
+async def listar_consultas(
     clinica_id: int = Query(..., description="ID da clínica (obrigatório)"),
     medico_id: Optional[int] = Query(None, description="ID do médico"),
     paciente_id: Optional[int] = Query(None, description="ID do paciente"),
@@ -55,13 +48,16 @@ def listar_consultas(
     data_fim: Optional[date] = Query(None, description="Data máxima"),
     estado: Optional[str] = Query(None, description="Estado da consulta"),
     
-    db: Session = Depends(get_db),
+    formato: Literal["completo", "calendario"] = Query(
+        "completo", description="'calendario': só id, horas, estado, paciente e médico"
+    ),
+    db: AsyncSession = Depends(get_async_db),
     utilizador_atual: Utilizador = Depends(get_current_user),
 ):
     """
     Lista todas as consultas filtrando por clínica (obrigatório) e demais filtros opcionais.
     """
-    return service.list_consultas(
+    return await service.list_consultas_async(
         db,
         clinica_id=clinica_id,
         medico_id=medico_id,
@@ -70,6 +66,7 @@ def listar_consultas(
         data_inicio=data_inicio,
         data_fim=data_fim,
         estado=estado,
+        calendario=(formato == "calendario"),
     )
     
     
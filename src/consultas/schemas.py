@@ -62,6 +62,16 @@ class ConsultaRead(ConsultaBase):
         orm_mode = True
 
 
+# Feed compacto para o calendário (vista de mês)
+class ConsultaCalendario(BaseModel):
+    id:            int
+    data_inicio:   datetime           = Field(..., description="Timestamp de início da consulta")
+    data_fim:      Optional[datetime] = Field(None, description="Timestamp de fim da consulta")
+    estado:        str                = Field(..., description="Estado da consulta")
+    paciente_nome: str                = Field(..., description="Nome do paciente")
+    medico_id:     Optional[int]      = Field(None, description="ID do médico")
+
+
 # ----------------- ConsultaItem -----------------
 
 class ConsultaItemBase(BaseModel):
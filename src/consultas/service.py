@@ -1,5 +1,6 @@
-from sqlalchemy.orm import Session,joinedload
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import select
 from fastapi import HTTPException, status
 from typing import Optional, List
 from datetime import date, datetime
@@ -7,6 +8,7 @@ from src.marcacoes.models import Marcacao
 from src.orcamento.models import Orcamento, OrcamentoItem
 from src.consultas.models import Consulta, ConsultaItem
 from src.auditoria.utils import registrar_auditoria
+from src.core.datas import intervalo_dias
 
 from src.consultas.schemas import (
     ConsultaCreate,
@@ -337,8 +339,7 @@ def update_item(
 
 
 
-def list_consultas(
-    db: Session,
+def _select_consultas(
     clinica_id: int,
     medico_id: Optional[int] = None,
     paciente_id: Optional[int] = None,
@@ -346,27 +347,86 @@ def list_consultas(
     data_inicio: Optional[date] = None,
     data_fim: Optional[date] = None,
     estado: Optional[str] = None,
-) -> List[Consulta]:
-    # Usando joinedload para carregar os itens relacionados
-    q = db.query(Consulta).options(
-        joinedload(Consulta.itens).joinedload(ConsultaItem.artigo)
-    ).filter(Consulta.clinica_id == clinica_id)
+    calendario: bool = False,
+):
+    if calendario:
+        # vista de mês: só as colunas que o calendário desenha, sem ORM
+        q = select(
+            Consulta.id,
+            Consulta.data_inicio,
+            Consulta.data_fim,
+            Consulta.estado,
+            Consulta.medico_id,
+            Paciente.nome.label("paciente_nome"),
+        ).join(Paciente, Paciente.id == Consulta.paciente_id)
+    else:
+        # Usando joinedload para carregar os itens relacionados;
+        # médico e entidade fazem parte da resposta → selectinload
+        q = select(Consulta).options(
+            joinedload(Consulta.itens).joinedload(ConsultaItem.artigo),
+            selectinload(Consulta.medico),
+            selectinload(Consulta.entidade),
+        )
+    q = q.where(Consulta.clinica_id == clinica_id)
     
-    # Resto do código permanece igual
     if medico_id:
-        q = q.filter(Consulta.medico_id == medico_id)
+        q = q.where(Consulta.medico_id == medico_id)
     if paciente_id:
-        q = q.filter(Consulta.paciente_id == paciente_id)
+        q = q.where(Consulta.paciente_id == paciente_id)
     if entidade_id:
-        q = q.filter(Consulta.entidade_id == entidade_id)
-    if data_inicio:
-        q = q.filter(func.date(Consulta.data_inicio) >= data_inicio)
-    if data_fim:
-        q = q.filter(func.date(Consulta.data_inicio) <= data_fim)
+        q = q.where(Consulta.entidade_id == entidade_id)
+    # intervalo semiaberto sobre a coluna (usa ix_consultas_clinica_medico_inicio)
+    desde, ate = intervalo_dias(data_inicio, data_fim)
+    if desde:
+        q = q.where(Consulta.data_inicio >= desde)
+    if ate:
+        q = q.where(Consulta.data_inicio < ate)
     if estado:
-        q = q.filter(Consulta.estado == estado)
+        q = q.where(Consulta.estado == estado)
     
-    return q.order_by(Consulta.data_inicio.desc()).all()
+    return q.order_by(Consulta.data_inicio.desc())
+
+
+def list_consultas(
+    db: Session,
+    clinica_id: int,
+    medico_id: Optional[int] = None,
+    paciente_id: Optional[int] = None,
+    entidade_id: Optional[int] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    estado: Optional[str] = None,
+    calendario: bool = False,
+) -> List[Consulta]:
+    """
+    Com `calendario=True` devolve linhas compactas (id, horas, estado,
+    nome do paciente e médico) em vez de objetos Consulta.
+    """
+    q = _select_consultas(
+        clinica_id, medico_id, paciente_id, entidade_id, data_inicio, data_fim, estado, calendario
+    )
+    if calendario:
+        return db.execute(q).mappings().all()
+    return db.execute(q).unique().scalars().all()
+
+
+async def list_consultas_async(
+    db: AsyncSession,
+    clinica_id: int,
+    medico_id: Optional[int] = None,
+    paciente_id: Optional[int] = None,
+    entidade_id: Optional[int] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    estado: Optional[str] = None,
+    calendario: bool = False,
+) -> List[Consulta]:
+    q = _select_consultas(
+        clinica_id, medico_id, paciente_id, entidade_id, data_inicio, data_fim, estado, calendario
+    )
+    if calendario:
+        return (await db.execute(q)).mappings().all()
+    return (await db.execute(q)).unique().scalars().all()
 
 
 def delete_item(db: Session, item_id: int) -> bool:
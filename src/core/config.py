@@ -7,10 +7,67 @@ class Settings(BaseSettings):
     DB_NAME: str = "clinica_db"
     DB_USER: str = "admin"
     DB_PASSWORD: str = "admin123"
+
+    # Pool de ligações (por processo/worker uvicorn)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30           # segundos à espera de uma ligação livre
+    DB_POOL_RECYCLE: int = 1800         # segundos até reciclar uma ligação
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 30000
     
+    # Fuso horário dos horários de funcionamento das clínicas
+    TIMEZONE: str = "Europe/Lisbon"
+
     SECRET_KEY: str = "supersegredo"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
 
+    # Hashing de palavras-passe (bcrypt) num pool de processos dedicado
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2      # 0 = corre no próprio processo
+    PASSWORD_HASH_MAX_PENDING: int = 32 # acima disto o login responde 503
+
+    # Cache de validação de sessões (partilhado entre workers via SQLite)
+    AUTH_CACHE_TTL_SECONDS: int = 60    # 0 desativa o cache
+    AUTH_CACHE_PATH: str = ""           # vazio = ficheiro na pasta temporária do sistema
+
+    # Cache em disco dos PDFs de faturas/orçamentos (LRU por tamanho)
+    PDF_CACHE_MAX_MB: int = 200         # 0 desativa o cache
+    PDF_CACHE_DIR: str = ""             # vazio = src/pdf/generated_pdfs/cache
+
+    # Geração de PDFs (WeasyPrint) num pool de processos dedicado
+    PDF_RENDER_WORKERS: int = 2         # 0 = corre no próprio processo
+    PDF_RENDER_MAX_PENDING: int = 16    # acima disto os pedidos de PDF respondem 503
+    PDF_RENDER_TIMEOUT_SECONDS: int = 60
+
+    # Exportação de faturas em ZIP (POST /pdf/faturas/export)
+    PDF_EXPORT_CONCURRENCY: int = 2     # PDFs em geração em simultâneo por exportação
+    PDF_EXPORT_BATCH_SIZE: int = 50     # faturas lidas da BD de cada vez
+    PDF_EXPORT_MAX_FATURAS: int = 5000
+    PDF_EXPORT_TTL_HOURS: int = 24      # ZIPs mais antigos são apagados
+
+    # Fila de e-mails (EmailOutbox) e dispatcher em background
+    EMAIL_DISPATCHER_ATIVO: bool = True
+    EMAIL_DISPATCH_INTERVAL_SECONDS: int = 5   # pausa quando a fila está vazia
+    EMAIL_DISPATCH_BATCH: int = 20             # e-mails reservados por ciclo
+    EMAIL_LEASE_SECONDS: int = 300             # reserva de um e-mail em envio
+    EMAIL_RATE_PER_MINUTE: int = 30            # por clínica e por worker; 0 = sem limite
+    EMAIL_MAX_TENTATIVAS: int = 6
+    EMAIL_RETRY_BASE_SECONDS: int = 30         # 30 s, 1 min, 2 min, ... (máx. 1 h)
+    EMAIL_SMTP_LOCAL: str = ""                 # "localhost:1025" = servidor de teste
+    EMAIL_SMTP_POOL_SIZE: int = 2              # ligações SMTP abertas por configuração e worker
+    EMAIL_SMTP_IDLE_SECONDS: int = 60          # fecha ligações paradas há mais tempo
+
+    # WebSockets das mensagens (src.mensagens.ws)
+    MENSAGENS_BROKER_URL: str = ""             # "redis://localhost:6379/0" com vários workers; vazio = só este processo
+    MENSAGENS_WS_SEND_TIMEOUT_SECONDS: float = 5.0  # cliente mais lento do que isto é desligado
+    MENSAGENS_WS_QUEUE_SIZE: int = 100         # mensagens por enviar por socket; cheia = desliga
+    MENSAGENS_WS_PING_SECONDS: int = 25        # heartbeat; sem resposta no ciclo seguinte = desliga
+
+    # Lembretes automáticos das marcações de amanhã (src.email.lembretes)
+    LEMBRETES_ATIVO: bool = True
+    LEMBRETES_INTERVAL_SECONDS: int = 3600     # o job corre de hora a hora (é idempotente)
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,33 @@
+"""
+Datas e fuso horário das clínicas.
+
+Os filtros por dia (`data_inicio` / `data_fim`) são convertidos em
+intervalos semiabertos de timestamps no fuso `settings.TIMEZONE`, para
+que as queries possam usar os índices sobre as colunas de data/hora.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from src.core.config import settings
+
+
+def fuso_clinicas() -> ZoneInfo:
+    return ZoneInfo(settings.TIMEZONE)
+
+
+def inicio_do_dia(dia: date) -> datetime:
+    """00:00 do dia, no fuso das clínicas."""
+    return datetime.combine(dia, time.min, fuso_clinicas())
+
+
+def intervalo_dias(
+    data_inicio: Optional[date], data_fim: Optional[date]
+) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Converte um intervalo de dias (ambos inclusive) em [desde, ate):
+    `coluna >= desde AND coluna < ate`. Limites em falta ficam None.
+    """
+    desde = inicio_do_dia(data_inicio) if data_inicio else None
+    ate = inicio_do_dia(data_fim + timedelta(days=1)) if data_fim else None
+    return desde, ate
@@ -1,5 +1,10 @@
-from sqlalchemy import create_engine
+import threading
+import time
+
+from sqlalchemy import create_engine, exc
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from src.core.config import settings
 
 # URL de ligação à base de dados a partir do ficheiro .env
@@ -7,12 +12,168 @@ DATABASE_URL = (
     f"postgresql://{settings.DB_USER}:{settings.DB_PASSWORD}"
     f"@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
 )
+# Mesma base de dados, driver asyncpg (engine async)
+ASYNC_DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+
+# ---------- MÉTRICAS DO POOL ----------
+class PoolMetrics:
+    """
+    Contadores de checkout do pool de ligações.
+    O tempo de espera é o tempo até o pool entregar uma ligação
+    (inclui o tempo em fila quando o pool está esgotado).
+    """
+
+    # limites (em ms) do histograma de espera
+    BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.espera_total_ms = 0.0
+            self.espera_max_ms = 0.0
+            self.histograma = [0] * (len(self.BUCKETS_MS) + 1)
+
+    def registar_checkout(self, espera_ms: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.espera_total_ms += espera_ms
+            self.espera_max_ms = max(self.espera_max_ms, espera_ms)
+            for i, limite in enumerate(self.BUCKETS_MS):
+                if espera_ms <= limite:
+                    self.histograma[i] += 1
+                    break
+            else:
+                self.histograma[-1] += 1
+
+    def registar_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            etiquetas = [f"<={b}ms" for b in self.BUCKETS_MS] + [f">{self.BUCKETS_MS[-1]}ms"]
+            return {
+                "pool_size": pool.size(),
+                "max_overflow": settings.DB_MAX_OVERFLOW,
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "espera_media_ms": round(self.espera_total_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "espera_max_ms": round(self.espera_max_ms, 3),
+                "espera_histograma": dict(zip(etiquetas, self.histograma)),
+            }
+
+
+pool_metrics = PoolMetrics()
+async_pool_metrics = PoolMetrics()
+
+
+class _MonitoredPoolMixin:
+    """Regista o tempo de espera de cada checkout no `PoolMetrics` da classe."""
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.registar_timeout()
+            raise
+        self.metrics.registar_checkout((time.perf_counter() - inicio) * 1000)
+        return conn
+
+
+class MonitoredQueuePool(_MonitoredPoolMixin, QueuePool):
+    metrics = pool_metrics
+
+
+class MonitoredAsyncQueuePool(_MonitoredPoolMixin, AsyncAdaptedQueuePool):
+    metrics = async_pool_metrics
+
 
 # Criação do engine
-engine = create_engine(DATABASE_URL)
+engine = create_engine(
+    DATABASE_URL,
+    poolclass=MonitoredQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    connect_args={"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"},
+)
 
 # Criação da sessão
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Declarative Base que o Alembic usará
 Base = declarative_base()
+
+
+# ---------- ENGINE ASYNC (asyncpg) ----------
+# Coexiste com o engine síncrono enquanto os módulos migram um a um.
+# Só é criado no primeiro uso, para que os módulos síncronos não dependam do asyncpg.
+_async_engine: AsyncEngine | None = None
+_AsyncSessionLocal: async_sessionmaker[AsyncSession] | None = None
+
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            poolclass=MonitoredAsyncQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+            connect_args={
+                "server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}
+            },
+        )
+    return _async_engine
+
+
+def get_async_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    global _AsyncSessionLocal
+    if _AsyncSessionLocal is None:
+        # expire_on_commit=False: os objetos continuam legíveis depois do commit
+        # (um refresh implícito exigiria I/O fora de um await)
+        _AsyncSessionLocal = async_sessionmaker(
+            get_async_engine(), autoflush=False, expire_on_commit=False
+        )
+    return _AsyncSessionLocal
+
+
+def estado_pools() -> dict:
+    """Métricas do pool síncrono e, se já foi criado, do pool async."""
+    estado = pool_metrics.snapshot(engine.pool)
+    if _async_engine is not None:
+        estado["async"] = async_pool_metrics.snapshot(_async_engine.pool)
+    return estado
+
+
+# ---------- DEPENDÊNCIA DB ----------
+def get_db():
+    """Sessão por pedido, partilhada por todos os routers; fechada no fim do pedido."""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    """Equivalente async de `get_db`, para rotas `async def`."""
+    async with get_async_sessionmaker()() as db:
+        yield db
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 
-from src.database import SessionLocal
+from src.database import get_db
 from src.dentes import schemas, service
 from src.utilizadores.dependencies import get_current_user
 from src.utilizadores.models import Utilizador
@@ -11,15 +11,6 @@ from src.utilizadores.models import Utilizador
 router = APIRouter()
 
 
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @router.get("", response_model=List[schemas.DenteResponse])
 def listar_dentes(
     db: Session = Depends(get_db),
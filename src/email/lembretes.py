@@ -0,0 +1,234 @@
+"""
+Lembretes automáticos das marcações de amanhã.
+
+O `AgendadorLembretes` corre como tarefa asyncio em cada worker (ver o
+lifespan em `src.main`) e, a cada `LEMBRETES_INTERVAL_SECONDS`, executa
+`executar_lembretes()`:
+
+* só um worker/instância corre o job de cada vez: os outros falham o
+  `pg_try_advisory_lock` e saltam esse ciclo;
+* uma única query lê as marcações `agendada` de amanhã (no fuso
+  `settings.TIMEZONE`) ainda sem `lembrete_enviado_em`, com paciente,
+  médico e clínica já carregados; outra lê as configurações SMTP dessas
+  clínicas;
+* os e-mails são todos renderizados de uma vez (no threadpool) e enviados
+  clínica a clínica pelo mailer partilhado da configuração
+  (`raw_service.obter_mailer`), que reutiliza a mesma ligação SMTP;
+* cada envio bem sucedido marca logo `lembrete_enviado_em`, por isso
+  correr o job outra vez (ou noutro worker, ou depois de o worker morrer
+  a meio) não repete lembretes; os que falharam ficam para o ciclo
+  seguinte.
+"""
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import joinedload
+from starlette.concurrency import run_in_threadpool
+
+from src.clinica.models import ClinicaEmail
+from src.core.config import settings
+from src.core.datas import fuso_clinicas, inicio_do_dia
+from src.database import SessionLocal, engine
+from src.email.raw_service import env, obter_mailer
+from src.email.schemas import EmailConfig
+from src.marcacoes.models import Marcacao
+
+logger = logging.getLogger("app.email")
+
+# chave do pg_advisory_lock do job ("LEMB")
+CHAVE_LOCK = 0x4C454D42
+
+
+# ---------- Lock entre workers ----------
+def _obter_lock():
+    """
+    Devolve uma ligação dedicada com o advisory lock, ou None se outro
+    worker já estiver a correr o job. O lock é de sessão: fica preso à
+    ligação até `_libertar_lock`, independentemente dos commits do job.
+    """
+    conn = engine.connect()
+    try:
+        obtido = conn.execute(select(func.pg_try_advisory_lock(CHAVE_LOCK))).scalar()
+        conn.commit()
+    except Exception:
+        conn.invalidate()  # o lock pode ter ficado preso a esta sessão
+        conn.close()
+        raise
+    if not obtido:
+        conn.close()
+        return None
+    return conn
+
+
+def _libertar_lock(conn) -> None:
+    try:
+        conn.execute(select(func.pg_advisory_unlock(CHAVE_LOCK)))
+        conn.commit()
+    except Exception:
+        # o reset do pool não liberta advisory locks: se o unlock falhou,
+        # descarta a ligação (o Postgres liberta o lock ao fechar a sessão)
+        conn.invalidate()
+        raise
+    finally:
+        conn.close()
+
+
+# ---------- Leitura + renderização (síncronas, correm no threadpool) ----------
+def _preparar_lembretes(dia: date) -> Dict[int, Dict]:
+    """
+    Lê as marcações do dia por lembrar e devolve, por clínica, a
+    configuração SMTP e as mensagens já renderizadas.
+    """
+    db = SessionLocal()
+    try:
+        marcacoes = db.execute(
+            select(Marcacao)
+            .options(
+                joinedload(Marcacao.paciente),
+                joinedload(Marcacao.medico),
+                joinedload(Marcacao.clinic),
+            )
+            .where(
+                Marcacao.estado == "agendada",
+                Marcacao.lembrete_enviado_em.is_(None),
+                Marcacao.data_hora_inicio >= inicio_do_dia(dia),
+                Marcacao.data_hora_inicio < inicio_do_dia(dia + timedelta(days=1)),
+            )
+            .order_by(Marcacao.clinic_id, Marcacao.data_hora_inicio)
+        ).scalars().all()
+        if not marcacoes:
+            return {}
+
+        configs = {
+            c.clinica_id: EmailConfig.model_validate(c)
+            for c in db.query(ClinicaEmail).filter(
+                ClinicaEmail.clinica_id.in_({m.clinic_id for m in marcacoes}),
+                ClinicaEmail.ativo == True,
+            )
+        }
+
+        template = env.get_template("lembrete_consulta.html")
+        por_clinica: Dict[int, Dict] = {}
+        sem_config, sem_email = set(), 0
+        for marc in marcacoes:
+            config = configs.get(marc.clinic_id)
+            if config is None:
+                sem_config.add(marc.clinic_id)
+                continue
+            if not marc.paciente.email:
+                sem_email += 1
+                continue
+            grupo = por_clinica.setdefault(marc.clinic_id, {"config": config, "mensagens": []})
+            grupo["mensagens"].append({
+                "marcacao_id": marc.id,
+                "para": marc.paciente.email,
+                "assunto": f"Lembrete da sua consulta – {marc.data_hora_inicio:%d/%m %H:%M}",
+                "html": template.render(
+                    clinica=marc.clinic, paciente=marc.paciente, medico=marc.medico, marcacao=marc,
+                ),
+            })
+
+        if sem_config:
+            logger.warning("Lembretes: clínicas sem configuração de e-mail ativa: %s", sorted(sem_config))
+        if sem_email:
+            logger.info("Lembretes: %s marcações de pacientes sem e-mail", sem_email)
+        return por_clinica
+    finally:
+        db.close()
+
+
+def _marcar_enviados(marcacao_ids: List[int]) -> None:
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(Marcacao)
+            .where(Marcacao.id.in_(marcacao_ids), Marcacao.lembrete_enviado_em.is_(None))
+            .values(lembrete_enviado_em=datetime.now(timezone.utc))
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+# ---------- Envio ----------
+async def _enviar_clinica(clinica_id: int, config: EmailConfig, mensagens: List[Dict]) -> int:
+    mailer = obter_mailer(config)
+    enviados = 0
+    for msg in mensagens:
+        try:
+            await mailer.enviar_email(
+                assunto=msg["assunto"],
+                destinatarios=[msg["para"]],
+                html_corpo=msg["html"],
+            )
+        except Exception as exc:
+            logger.warning(
+                "Lembrete da marcação %s (clínica %s) falhou: %s",
+                msg["marcacao_id"], clinica_id, getattr(exc, "detail", exc),
+            )
+            continue
+        # marca logo: se o worker morrer a meio da clínica, os já enviados não se repetem
+        await run_in_threadpool(_marcar_enviados, [msg["marcacao_id"]])
+        enviados += 1
+    return enviados
+
+
+async def executar_lembretes(dia: Optional[date] = None) -> Optional[int]:
+    """
+    Envia os lembretes das marcações de `dia` (por omissão, amanhã).
+    Devolve quantos foram enviados, ou None se outro worker tem o lock.
+    """
+    if dia is None:
+        dia = datetime.now(fuso_clinicas()).date() + timedelta(days=1)
+
+    lock = await run_in_threadpool(_obter_lock)
+    if lock is None:
+        return None
+    try:
+        por_clinica = await run_in_threadpool(_preparar_lembretes, dia)
+        resultados = await asyncio.gather(*(
+            _enviar_clinica(clinica_id, grupo["config"], grupo["mensagens"])
+            for clinica_id, grupo in por_clinica.items()
+        ))
+        total = sum(len(g["mensagens"]) for g in por_clinica.values())
+        if total:
+            logger.info("Lembretes de %s: %s de %s enviados", dia, sum(resultados), total)
+        return sum(resultados)
+    finally:
+        await run_in_threadpool(_libertar_lock, lock)
+
+
+class AgendadorLembretes:
+    def __init__(self):
+        self._tarefa: Optional[asyncio.Task] = None
+
+    # ----- ciclo de vida (lifespan da app) -----
+    def iniciar(self) -> None:
+        if self._tarefa is None:
+            self._tarefa = asyncio.create_task(self._correr(), name="lembretes")
+
+    async def parar(self) -> None:
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+
+    # ----- ciclo -----
+    async def _correr(self) -> None:
+        while True:
+            try:
+                await executar_lembretes()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Lembretes: falha no ciclo")
+            await asyncio.sleep(settings.LEMBRETES_INTERVAL_SECONDS)
+
+
+agendador = AgendadorLembretes()
@@ -0,0 +1,57 @@
+import enum
+
+from sqlalchemy import (
+    Column, Integer, DateTime, ForeignKey, String, Text, Enum as SAEnum, Index, func, text
+)
+from sqlalchemy.orm import relationship
+
+from src.database import Base
+
+
+class EmailTipo(enum.Enum):
+    fatura       = "fatura"
+    orcamento    = "orcamento"
+    lembrete     = "lembrete"
+    cancelamento = "cancelamento"
+
+
+class EmailEstado(enum.Enum):
+    pendente = "pendente"
+    enviado  = "enviado"
+    falhado  = "falhado"
+
+
+class EmailOutbox(Base):
+    """
+    E-mails por enviar. Os endpoints só inserem aqui; o `EmailDispatcher`
+    monta a mensagem (template, PDF) no momento do envio a partir de
+    `tipo` + `referencia_id`.
+    """
+    __tablename__ = "EmailOutbox"
+    __table_args__ = (
+        # o dispatcher só procura pendentes cuja hora já chegou
+        Index(
+            "ix_emailoutbox_pendentes",
+            "proxima_tentativa_em",
+            postgresql_where=text("estado = 'pendente'"),
+        ),
+        Index("ix_emailoutbox_clinica_criado", "clinica_id", "criado_em"),
+    )
+
+    id                   = Column(Integer, primary_key=True, index=True)
+    clinica_id           = Column(Integer, ForeignKey("Clinica.id"), nullable=False)
+    tipo                 = Column(SAEnum(EmailTipo), nullable=False)
+    referencia_id        = Column(Integer, nullable=False)      # fatura / orçamento / marcação
+    email_para           = Column(String(255), nullable=True)   # None = e-mail do paciente
+
+    estado               = Column(SAEnum(EmailEstado), nullable=False, default=EmailEstado.pendente)
+    tentativas           = Column(Integer, nullable=False, default=0)
+    # próxima tentativa; enquanto um dispatcher envia, serve também de "lease"
+    proxima_tentativa_em = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    ultimo_erro          = Column(Text, nullable=True)
+
+    criado_por           = Column(Integer, ForeignKey("Utilizador.id"), nullable=True)
+    criado_em            = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    enviado_em           = Column(DateTime(timezone=True), nullable=True)
+
+    clinica              = relationship("Clinica")
@@ -0,0 +1,267 @@
+"""
+Fila de e-mails (tabela EmailOutbox) e o dispatcher que a esvazia.
+
+Os endpoints de `email.router` apenas validam o pedido e inserem uma
+linha; a resposta é 202 de imediato. O `EmailDispatcher` corre como
+tarefa asyncio em cada worker e:
+
+* reserva um lote de pendentes com `FOR UPDATE SKIP LOCKED` — vários
+  workers podem correr o dispatcher sem enviar o mesmo e-mail duas vezes.
+  A reserva empurra `proxima_tentativa_em` para daqui a
+  `EMAIL_LEASE_SECONDS`; se o worker morrer a meio, a linha volta a ficar
+  disponível depois disso;
+* envia os e-mails de cada clínica em sequência, respeitando
+  `EMAIL_RATE_PER_MINUTE` (por clínica e por worker), e clínicas
+  diferentes em paralelo;
+* regista o resultado: `enviado`, ou nova tentativa com backoff
+  exponencial, ou `falhado` quando o erro é definitivo (4xx: fatura
+  inexistente, paciente sem e-mail, ...) ou se esgotam as tentativas.
+
+Para testes locais, `EMAIL_SMTP_LOCAL=localhost:1025` envia tudo para um
+servidor SMTP de teste (ver `python -m src.email.smtp_local`).
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from src.core.config import settings
+from src.database import SessionLocal
+from src.email.models import EmailEstado, EmailOutbox, EmailTipo
+
+logger = logging.getLogger("app.email")
+
+# Backoff: base * 2^(tentativas-1), no máximo isto
+MAX_BACKOFF = timedelta(hours=1)
+
+
+# ---------- Fila ----------
+def validar_documento(db: Session, tipo: EmailTipo, referencia_id: int, email_para: Optional[str]) -> None:
+    """
+    Verificações baratas feitas no pedido, para a receção ver logo os erros
+    óbvios (documento inexistente, paciente sem e-mail) em vez de um
+    `falhado` na fila.
+    """
+    from src.faturacao.models import Fatura
+    from src.orcamento.models import Orcamento
+
+    modelo, nome = (Fatura, "Fatura") if tipo == EmailTipo.fatura else (Orcamento, "Orçamento")
+    documento = db.get(modelo, referencia_id)
+    if documento is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f"{nome} não encontrado(a)")
+    if not (email_para or documento.paciente.email):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Paciente sem e-mail e parâmetro email_para ausente")
+
+
+def enfileirar(
+    db: Session,
+    tipo: EmailTipo,
+    referencia_id: int,
+    clinica_id: int,
+    email_para: Optional[str] = None,
+    criado_por: Optional[int] = None,
+) -> EmailOutbox:
+    email = EmailOutbox(
+        clinica_id=clinica_id,
+        tipo=tipo,
+        referencia_id=referencia_id,
+        email_para=email_para,
+        criado_por=criado_por,
+    )
+    db.add(email)
+    db.commit()
+    db.refresh(email)
+    dispatcher.acordar()
+    return email
+
+
+def obter_email(db: Session, email_id: int) -> EmailOutbox:
+    email = db.get(EmailOutbox, email_id)
+    if not email:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "E-mail não encontrado")
+    return email
+
+
+def listar_emails(
+    db: Session,
+    clinica_id: int,
+    estado: Optional[EmailEstado] = None,
+    limit: int = 50,
+) -> List[EmailOutbox]:
+    q = db.query(EmailOutbox).filter(EmailOutbox.clinica_id == clinica_id)
+    if estado is not None:
+        q = q.filter(EmailOutbox.estado == estado)
+    return q.order_by(EmailOutbox.criado_em.desc(), EmailOutbox.id.desc()).limit(limit).all()
+
+
+# ---------- Reserva / resultado (síncronos, correm no threadpool) ----------
+def _reservar_lote(limite: int) -> List[Dict]:
+    db = SessionLocal()
+    try:
+        agora = datetime.now(timezone.utc)
+        linhas = db.execute(
+            select(EmailOutbox)
+            .where(
+                EmailOutbox.estado == EmailEstado.pendente,
+                EmailOutbox.proxima_tentativa_em <= agora,
+            )
+            .order_by(EmailOutbox.proxima_tentativa_em, EmailOutbox.id)
+            .limit(limite)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        lote = []
+        for email in linhas:
+            email.proxima_tentativa_em = agora + timedelta(seconds=settings.EMAIL_LEASE_SECONDS)
+            lote.append({
+                "id": email.id,
+                "clinica_id": email.clinica_id,
+                "tipo": email.tipo,
+                "referencia_id": email.referencia_id,
+                "email_para": email.email_para,
+                "tentativas": email.tentativas,
+            })
+        db.commit()
+        return lote
+    finally:
+        db.close()
+
+
+def _registar_resultado(email_id: int, erro: Optional[str], definitivo: bool) -> None:
+    db = SessionLocal()
+    try:
+        email = db.get(EmailOutbox, email_id)
+        if email is None:
+            return
+        agora = datetime.now(timezone.utc)
+        if erro is None:
+            email.estado = EmailEstado.enviado
+            email.enviado_em = agora
+            email.ultimo_erro = None
+        else:
+            email.tentativas += 1
+            email.ultimo_erro = erro[:2000]
+            if definitivo or email.tentativas >= settings.EMAIL_MAX_TENTATIVAS:
+                email.estado = EmailEstado.falhado
+            else:
+                espera = timedelta(seconds=settings.EMAIL_RETRY_BASE_SECONDS * 2 ** (email.tentativas - 1))
+                email.proxima_tentativa_em = agora + min(espera, MAX_BACKOFF)
+        db.commit()
+    finally:
+        db.close()
+
+
+# ---------- Envio ----------
+async def _enviar(email: Dict) -> None:
+    # importados aqui: service → pdf → ... não é preciso no arranque
+    from src.email.service import EmailManager
+    from src.email.util import get_email_config
+    from src.marcacoes.service import get_marcacao
+
+    db = SessionLocal()
+    try:
+        config = await get_email_config(email["clinica_id"], db)
+        mgr = EmailManager(db, config)
+        tipo, ref = email["tipo"], email["referencia_id"]
+        if tipo == EmailTipo.fatura:
+            await mgr.enviar_fatura(ref, email["clinica_id"], email["email_para"])
+        elif tipo == EmailTipo.orcamento:
+            await mgr.enviar_orcamento(ref, email["clinica_id"], email["email_para"])
+        else:
+            marc = await run_in_threadpool(get_marcacao, db, ref)
+            if tipo == EmailTipo.lembrete:
+                await mgr.enviar_lembrete(marc)
+                # o job automático (email.lembretes) já não a volta a lembrar
+                marc.lembrete_enviado_em = datetime.now(timezone.utc)
+                await run_in_threadpool(db.commit)
+            else:
+                await mgr.enviar_cancelamento(marc)
+    finally:
+        await run_in_threadpool(db.close)
+
+
+class EmailDispatcher:
+    def __init__(self):
+        self._tarefa: Optional[asyncio.Task] = None
+        self._acordar: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ultimo_envio: Dict[int, float] = defaultdict(float)
+
+    # ----- ciclo de vida (lifespan da app) -----
+    def iniciar(self) -> None:
+        if self._tarefa is None:
+            self._loop = asyncio.get_running_loop()
+            self._acordar = asyncio.Event()
+            self._tarefa = asyncio.create_task(self._correr(), name="email-dispatcher")
+
+    async def parar(self) -> None:
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+
+    def acordar(self) -> None:
+        """Pede um ciclo já (chamado ao enfileirar; seguro a partir de qualquer thread)."""
+        if self._loop is not None and self._acordar is not None:
+            self._loop.call_soon_threadsafe(self._acordar.set)
+
+    # ----- ciclo -----
+    async def _correr(self) -> None:
+        while True:
+            try:
+                enviados = await self.processar_lote()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Dispatcher de e-mails: falha no ciclo")
+                enviados = 0
+            if enviados == 0:
+                self._acordar.clear()
+                try:
+                    await asyncio.wait_for(self._acordar.wait(), settings.EMAIL_DISPATCH_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def processar_lote(self) -> int:
+        lote = await run_in_threadpool(_reservar_lote, settings.EMAIL_DISPATCH_BATCH)
+        por_clinica: Dict[int, List[Dict]] = defaultdict(list)
+        for email in lote:
+            por_clinica[email["clinica_id"]].append(email)
+        await asyncio.gather(*(self._enviar_clinica(c, emails) for c, emails in por_clinica.items()))
+        return len(lote)
+
+    async def _enviar_clinica(self, clinica_id: int, emails: List[Dict]) -> None:
+        intervalo = 60.0 / settings.EMAIL_RATE_PER_MINUTE if settings.EMAIL_RATE_PER_MINUTE > 0 else 0.0
+        for email in emails:
+            espera = self._ultimo_envio[clinica_id] + intervalo - time.monotonic()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            self._ultimo_envio[clinica_id] = time.monotonic()
+
+            erro, definitivo = None, False
+            try:
+                await _enviar(email)
+            except HTTPException as exc:
+                erro = str(exc.detail)
+                definitivo = 400 <= exc.status_code < 500
+            except Exception as exc:
+                erro = f"{type(exc).__name__}: {exc}"
+            if erro is not None:
+                logger.warning(
+                    "E-mail %s (%s %s) falhou na tentativa %s: %s",
+                    email["id"], email["tipo"].value, email["referencia_id"],
+                    email["tentativas"] + 1, erro,
+                )
+            await run_in_threadpool(_registar_resultado, email["id"], erro, definitivo)
+
+
+dispatcher = EmailDispatcher()
@@ -1,21 +1,79 @@
-import os
-import tempfile
+"""
+Envio de e-mails por SMTP, com ligações reutilizadas.
+
+Cada configuração SMTP de clínica (ClinicaEmail) tem um único
+`EmailService` por worker, obtido com `obter_mailer(config)`. O serviço
+mantém até `EMAIL_SMTP_POOL_SIZE` ligações abertas e autenticadas e usa-as
+para várias mensagens seguidas, em vez de pagar ligação, TLS e login a
+cada e-mail. Ligações paradas há mais de `EMAIL_SMTP_IDLE_SECONDS` são
+fechadas antes de voltarem a ser usadas.
+
+O registo é indexado pelo conteúdo da configuração (servidor,
+credenciais, ...): credenciais novas dão sempre um mailer novo. Quando a
+configuração muda (`clinica.service.atualizar_email` / `remover_email`),
+`invalidar_mailer` descarta o mailer antigo e as suas ligações.
+
+Os templates Jinja são compilados uma vez por processo (`env`).
+"""
+import asyncio
+import hashlib
+import json
 import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from email.utils import formataddr
+from io import BytesIO
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 
-from fastapi import HTTPException
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
-from tenacity import retry, stop_after_attempt, wait_exponential
+import aiosmtplib
+from fastapi import HTTPException, UploadFile
+from fastapi_mail import MessageSchema, ConnectionConfig
+from fastapi_mail.msg import MailMsg
 from jinja2 import Environment, FileSystemLoader
+from pydantic import ValidationError
 
+from src.core.config import settings
 from src.email.schemas import EmailAttachment, EmailConfig   # mantém como estava
 
 logger = logging.getLogger("app.email")
 
+TEMPLATE_DIR = Path(__file__).parent / "templates"
+
+# ------------------ Jinja env partilhado (templates compilados) -------
+env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), auto_reload=False)
+env.filters["dt"] = lambda dt: dt.strftime("%d/%m/%Y %H:%M")
+
+# Campos que identificam uma configuração SMTP (iguais em EmailConfig e ClinicaEmail)
+CAMPOS_CONFIG = (
+    "remetente", "nome_remetente", "smtp_host", "smtp_porta",
+    "utilizador_smtp", "password_smtp", "usar_tls", "usar_ssl",
+)
+
+
+def _anexo(anexo: EmailAttachment) -> Dict[str, Any]:
+    """
+    Anexo no formato do fastapi-mail, sem ficheiros temporários: os bytes
+    vão num buffer em memória e um `path` é aberto e lido uma única vez ao
+    montar a mensagem (o MailMsg fecha-o a seguir).
+    """
+    if anexo.path is not None:
+        ficheiro = open(anexo.path, "rb")
+    elif anexo.content is not None:
+        ficheiro = BytesIO(anexo.content)
+    else:
+        raise ValueError(f"Anexo {anexo.filename} sem conteúdo")
+    tipo, _, subtipo = anexo.content_type.partition("/")
+    return {
+        "file": UploadFile(file=ficheiro, filename=anexo.filename),
+        "mime_type": tipo,
+        "mime_subtype": subtipo or "octet-stream",
+    }
+
 
 class EmailService:
-    """Serviço de baixo nível que envia e-mails usando FastMail."""
+    """Serviço de baixo nível que envia e-mails por SMTP (uma instância por configuração)."""
 
     def __init__(self, config: EmailConfig):
         self.config = config
@@ -23,26 +81,120 @@ class EmailService:
         self.connection_config = ConnectionConfig(
             MAIL_USERNAME   = config.utilizador_smtp,
             MAIL_PASSWORD   = config.password_smtp,
-            MAIL_FROM       = (
-                f"{config.nome_remetente} <{config.remetente}>"
-                if config.nome_remetente else config.remetente
-            ),
+            MAIL_FROM       = config.remetente,
+            MAIL_FROM_NAME  = config.nome_remetente,
             MAIL_PORT       = config.smtp_porta,
             MAIL_SERVER     = config.smtp_host,
             MAIL_STARTTLS   = config.usar_tls,
             MAIL_SSL_TLS    = config.usar_ssl,
             USE_CREDENTIALS = True,
             VALIDATE_CERTS  = True,
-            TEMPLATE_FOLDER = Path(__file__).parent / "templates",
+            TEMPLATE_FOLDER = TEMPLATE_DIR,
         )
 
-        self.fast_mail = FastMail(self.connection_config)
+        if settings.EMAIL_SMTP_LOCAL:
+            # modo local: tudo vai para um servidor SMTP de teste, sem TLS nem login
+            host, _, porta = settings.EMAIL_SMTP_LOCAL.partition(":")
+            self.connection_config = self.connection_config.model_copy(update={
+                "MAIL_SERVER": host,
+                "MAIL_PORT": int(porta or 25),
+                "MAIL_STARTTLS": False,
+                "MAIL_SSL_TLS": False,
+                "USE_CREDENTIALS": False,
+                "VALIDATE_CERTS": False,
+            })
+
+        self.remetente = (
+            formataddr((config.nome_remetente, config.remetente))
+            if config.nome_remetente else config.remetente
+        )
+        # ligações livres: (smtp, hora em que ficou livre)
+        self._livres: List[tuple] = []
+        self._vagas = asyncio.Semaphore(settings.EMAIL_SMTP_POOL_SIZE)
+        self.descartado = False
+
+    # ------------------------------------------------------------------
+    #  Ligações SMTP
+    # ------------------------------------------------------------------
+    async def _abrir(self) -> aiosmtplib.SMTP:
+        c = self.connection_config
+        smtp = aiosmtplib.SMTP(
+            hostname=c.MAIL_SERVER,
+            port=c.MAIL_PORT,
+            use_tls=c.MAIL_SSL_TLS,
+            start_tls=c.MAIL_STARTTLS,
+            validate_certs=c.VALIDATE_CERTS,
+            timeout=c.TIMEOUT,
+        )
+        await smtp.connect()
+        if c.USE_CREDENTIALS:
+            await smtp.login(c.MAIL_USERNAME, c.MAIL_PASSWORD.get_secret_value())
+        return smtp
+
+    @staticmethod
+    async def _fechar_ligacao(smtp: aiosmtplib.SMTP) -> None:
+        try:
+            if smtp.is_connected:
+                await smtp.quit()
+        except Exception:
+            smtp.close()
+
+    @asynccontextmanager
+    async def _ligacao(self):
+        async with self._vagas:
+            smtp = None
+            while self._livres:
+                candidato, livre_desde = self._livres.pop()
+                if candidato.is_connected and time.monotonic() - livre_desde < settings.EMAIL_SMTP_IDLE_SECONDS:
+                    smtp = candidato
+                    break
+                await self._fechar_ligacao(candidato)
+            if smtp is None:
+                smtp = await self._abrir()
+            try:
+                yield smtp
+            except aiosmtplib.SMTPResponseException:
+                # o servidor recusou a mensagem mas a sessão continua válida
+                try:
+                    await smtp.rset()
+                    self._devolver(smtp)
+                except Exception:
+                    await self._fechar_ligacao(smtp)
+                raise
+            except BaseException:
+                await self._fechar_ligacao(smtp)
+                raise
+            self._devolver(smtp)
+
+    def _devolver(self, smtp: aiosmtplib.SMTP) -> None:
+        if self.descartado:
+            smtp.close()
+        else:
+            self._livres.append((smtp, time.monotonic()))
+
+    async def _enviar_mensagem(self, mensagem) -> None:
+        try:
+            async with self._ligacao() as smtp:
+                await smtp.send_message(mensagem)
+        except aiosmtplib.SMTPServerDisconnected:
+            # o servidor fechou uma ligação reutilizada: tenta uma vez com uma nova
+            async with self._ligacao() as smtp:
+                await smtp.send_message(mensagem)
+
+    async def fechar(self) -> None:
+        livres, self._livres = self._livres, []
+        for smtp, _ in livres:
+            await self._fechar_ligacao(smtp)
+
+    async def testar_ligacao(self) -> None:
+        """Liga e autentica no servidor SMTP (erros propagam-se)."""
+        smtp = await self._abrir()
+        await self._fechar_ligacao(smtp)
 
     # ------------------------------------------------------------------
-    #  Enviar e-mail (com ou sem template / anexos) — 3 tentativas
+    #  Enviar e-mail (com ou sem template / anexos) — uma tentativa; as
+    #  novas tentativas são feitas pelo dispatcher da fila (email.outbox)
     # ------------------------------------------------------------------
-    @retry(stop=stop_after_attempt(3),
-           wait=wait_exponential(multiplier=1, min=4, max=10))
     async def enviar_email(
         self,
         assunto: str,
@@ -57,61 +209,35 @@ class EmailService:
         Envia um e-mail:
           • Usa `nome_template`+`dados_template` → renderiza HTML.
           • Ou `html_corpo` / `corpo` se fornecidos.
-          • Suporta anexos (EmailAttachment.content em bytes).
-        Lança HTTPException 500 se falhar após 3 tentativas.
+          • Suporta anexos (EmailAttachment.content em bytes, ou
+            EmailAttachment.path, lido diretamente para a mensagem).
+        Lança HTTPException 500 se falhar.
         """
+        await _fechar_descartados()
         try:
             subtype = "html" if (html_corpo or nome_template) else "plain"
 
-            # ------------------ anexos → ficheiros temporários -----------
-            temp_files: List[str] = []
-            attach_paths: List[str] = []
-
-            if anexos:
-                for a in anexos:
-                    tmp = tempfile.NamedTemporaryFile(
-                        delete=False, suffix=f"_{a.filename}"
-                    )
-                    tmp.write(a.content)
-                    tmp.flush()
-                    temp_files.append(tmp.name)
-                    attach_paths.append(tmp.name)
+            # -------- renderização do corpo -----------------------------
+            body_content = corpo or html_corpo or ""
+            if nome_template:
+                tmpl = env.get_template(nome_template)
+                body_content = tmpl.render(**(dados_template or {}))
 
-            try:
-                # -------- renderização do corpo -------------------------
-                body_content = corpo or html_corpo or ""
-                if nome_template:
-                    env = Environment(
-                        loader=FileSystemLoader(
-                            Path(__file__).parent / "templates"
-                        )
-                    )
-                    env.filters["dt"] = lambda dt: dt.strftime("%d/%m/%Y %H:%M")
-                    tmpl = env.get_template(nome_template)
-                    body_content = tmpl.render(**(dados_template or {}))
-
-                # -------- construir mensagem & enviar -------------------
-                msg = MessageSchema(
-                    subject     = assunto,
-                    recipients  = destinatarios,
-                    body        = body_content,
-                    subtype     = subtype,
-                    attachments = attach_paths,
-                )
-                await self.fast_mail.send_message(msg)
-                logger.info(
-                    "Email enviado para %s – %s",
-                    ", ".join(destinatarios), assunto
-                )
-                return True
-
-            finally:
-                # apagar temp files
-                for path in temp_files:
-                    try:
-                        os.unlink(path)
-                    except Exception as exc:
-                        logger.warning("Falha ao apagar %s: %s", path, exc)
+            # -------- construir mensagem & enviar -----------------------
+            msg = MessageSchema(
+                subject     = assunto,
+                recipients  = destinatarios,
+                body        = body_content,
+                subtype     = subtype,
+                attachments = [_anexo(a) for a in anexos or []],
+            )
+            mensagem = await MailMsg(msg)._message(self.remetente)
+            await self._enviar_mensagem(mensagem)
+            logger.info(
+                "Email enviado para %s – %s",
+                ", ".join(destinatarios), assunto
+            )
+            return True
 
         except Exception as exc:
             logger.error("Falha ao enviar email: %s", exc)
@@ -119,3 +245,67 @@ class EmailService:
                 status_code=500,
                 detail=f"Falha ao enviar email: {exc}"
             ) from exc
+
+
+# ------------------ Registo de mailers por configuração -------------
+_mailers: Dict[str, EmailService] = {}
+_descartados: List[EmailService] = []
+_registo_lock = threading.Lock()
+
+
+def chave_config(config) -> str:
+    """
+    Identifica uma configuração SMTP (aceita EmailConfig ou ClinicaEmail).
+    Uma linha ClinicaEmail passa primeiro pelo EmailConfig, que normaliza
+    campos como o `remetente`: a chave tem de ser a mesma de `obter_mailer`,
+    senão `invalidar_mailer` não encontra o mailer.
+    """
+    if not isinstance(config, EmailConfig):
+        try:
+            config = EmailConfig.model_validate(config)
+        except ValidationError:
+            pass  # configuração inválida: nunca chegou a ter mailer
+    valores = [getattr(config, campo, None) for campo in CAMPOS_CONFIG]
+    return hashlib.sha256(json.dumps(valores, default=str).encode("utf-8")).hexdigest()
+
+
+def obter_mailer(config: EmailConfig) -> EmailService:
+    chave = chave_config(config)
+    with _registo_lock:
+        mailer = _mailers.get(chave)
+        if mailer is None:
+            mailer = _mailers[chave] = EmailService(config)
+        return mailer
+
+
+def invalidar_mailer(chave: str) -> None:
+    """
+    Descarta o mailer da configuração com esta chave (calculada com os
+    valores *antigos*, antes da alteração). Pode ser chamado de qualquer
+    thread; as ligações livres são fechadas no event loop, no envio seguinte.
+    """
+    with _registo_lock:
+        mailer = _mailers.pop(chave, None)
+        if mailer is not None:
+            mailer.descartado = True
+            _descartados.append(mailer)
+
+
+async def _fechar_descartados() -> None:
+    with _registo_lock:
+        if not _descartados:
+            return
+        mailers = list(_descartados)
+        _descartados.clear()
+    for mailer in mailers:
+        await mailer.fechar()
+
+
+async def fechar_mailers() -> None:
+    """Fecha todas as ligações SMTP (fim do lifespan da app)."""
+    with _registo_lock:
+        mailers = list(_mailers.values()) + list(_descartados)
+        _mailers.clear()
+        _descartados.clear()
+    for mailer in mailers:
+        await mailer.fechar()
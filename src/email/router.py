@@ -3,22 +3,21 @@ from typing import Optional, List
 from fastapi import APIRouter, Depends, Query, HTTPException, status
 from pydantic import EmailStr
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from src.database import SessionLocal
+from src.database import get_db
 from src.utilizadores.dependencies import get_current_user
 from src.utilizadores.models import Utilizador
-from src.email.service import EmailManager
+from src.email import outbox
+from src.email.models import EmailEstado, EmailTipo
+from src.email.schemas import EmailOutboxRead
 from src.email.util import get_email_config, test_email_config
 from src.marcacoes.service import get_marcacao as obter_marcacao   # função helper no seu módulo
 
 router = APIRouter(prefix="/email", tags=["Email"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Os envios abaixo só põem o e-mail na fila (EmailOutbox) e respondem 202;
+# o estado de entrega consulta-se em GET /email/outbox/{id}.
 
 # ---------- Teste de configuração ----------------------------------------
 @router.post("/test")
@@ -32,7 +31,7 @@ async def testar_email(
     return {"detail": "Configuração OK"}
 
 # ---------- Fatura --------------------------------------------------------
-@router.post("/fatura/{fatura_id}")
+@router.post("/fatura/{fatura_id}", response_model=EmailOutboxRead, status_code=status.HTTP_202_ACCEPTED)
 async def enviar_fatura_email(
     fatura_id: int,
     clinica_id: int = Query(...),
@@ -40,13 +39,14 @@ async def enviar_fatura_email(
     db: Session = Depends(get_db),
     current_user: Utilizador = Depends(get_current_user),
 ):
-    config = await get_email_config(clinica_id, db)
-    svc = EmailManager(db, config)
-    await svc.enviar_fatura(fatura_id, clinica_id, email_para)
-    return {"detail": "Fatura enviada"}
+    await get_email_config(clinica_id, db)
+    await run_in_threadpool(outbox.validar_documento, db, EmailTipo.fatura, fatura_id, email_para)
+    return await run_in_threadpool(
+        outbox.enfileirar, db, EmailTipo.fatura, fatura_id, clinica_id, email_para, current_user.id
+    )
 
 # ---------- Orçamento -----------------------------------------------------
-@router.post("/orcamento/{orcamento_id}")
+@router.post("/orcamento/{orcamento_id}", response_model=EmailOutboxRead, status_code=status.HTTP_202_ACCEPTED)
 async def enviar_orcamento_email(
     orcamento_id: int,
     clinica_id: int = Query(...),
@@ -54,36 +54,58 @@ async def enviar_orcamento_email(
     db: Session = Depends(get_db),
     current_user: Utilizador = Depends(get_current_user),
 ):
-    config = await get_email_config(clinica_id, db)
-    svc = EmailManager(db, config)
-    await svc.enviar_orcamento(orcamento_id, clinica_id, email_para)
-    return {"detail": "Orçamento enviado"}
+    await get_email_config(clinica_id, db)
+    await run_in_threadpool(outbox.validar_documento, db, EmailTipo.orcamento, orcamento_id, email_para)
+    return await run_in_threadpool(
+        outbox.enfileirar, db, EmailTipo.orcamento, orcamento_id, clinica_id, email_para, current_user.id
+    )
 
 # ---------- Lembrete de consulta -----------------------------------------
-@router.post("/marcacoes/{marc_id}/lembrete", status_code=status.HTTP_202_ACCEPTED)
+@router.post("/marcacoes/{marc_id}/lembrete", response_model=EmailOutboxRead, status_code=status.HTTP_202_ACCEPTED)
 async def enviar_lembrete_email(
     marc_id: int,
     db: Session = Depends(get_db),
     current_user: Utilizador = Depends(get_current_user),
 ):
-    marc = obter_marcacao(db, marc_id)
-    config = await get_email_config(marc.clinic_id, db)
-    svc = EmailManager(db, config)
-    await svc.enviar_lembrete(marc)
-    return {"detail": "Lembrete enviado"}
+    marc = await run_in_threadpool(obter_marcacao, db, marc_id)
+    await get_email_config(marc.clinic_id, db)
+    return await run_in_threadpool(
+        outbox.enfileirar, db, EmailTipo.lembrete, marc_id, marc.clinic_id, None, current_user.id
+    )
 
 # ---------- Cancelamento de consulta -------------------------------------
-@router.post("/marcacoes/{marc_id}/cancelamento", status_code=status.HTTP_202_ACCEPTED)
+@router.post("/marcacoes/{marc_id}/cancelamento", response_model=EmailOutboxRead, status_code=status.HTTP_202_ACCEPTED)
 async def enviar_cancelamento_email(
     marc_id: int,
     db: Session = Depends(get_db),
     current_user: Utilizador = Depends(get_current_user),
 ):
-    marc = obter_marcacao(db, marc_id)
+    marc = await run_in_threadpool(obter_marcacao, db, marc_id)
     if marc.estado != "cancelada":
         raise HTTPException(400, "Marcação não está cancelada")
 
-    config = await get_email_config(marc.clinic_id, db)
-    svc = EmailManager(db, config)
-    await svc.enviar_cancelamento(marc)
-    return {"detail": "Cancelamento enviado"}
+    await get_email_config(marc.clinic_id, db)
+    return await run_in_threadpool(
+        outbox.enfileirar, db, EmailTipo.cancelamento, marc_id, marc.clinic_id, None, current_user.id
+    )
+
+# ---------- Fila de envio -------------------------------------------------
+@router.get("/outbox", response_model=List[EmailOutboxRead])
+def listar_outbox(
+    clinica_id: int = Query(...),
+    estado: Optional[EmailEstado] = None,
+    limit: int = Query(50, gt=0, le=500),
+    db: Session = Depends(get_db),
+    current_user: Utilizador = Depends(get_current_user),
+):
+    """E-mails mais recentes da clínica, com o estado de entrega."""
+    return outbox.listar_emails(db, clinica_id, estado, limit)
+
+
+@router.get("/outbox/{email_id}", response_model=EmailOutboxRead)
+def obter_outbox(
+    email_id: int,
+    db: Session = Depends(get_db),
+    current_user: Utilizador = Depends(get_current_user),
+):
+    return outbox.obter_email(db, email_id)
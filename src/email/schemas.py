@@ -1,10 +1,17 @@
+from datetime import datetime
 from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional
 
+from src.email.models import EmailEstado, EmailTipo
+
 class EmailAttachment(BaseModel):
-    """Model for email attachments."""
-    content: bytes
+    """
+    Model for email attachments: `content` in memory, or `path` to a file
+    read straight into the message (e.g. a PDF in the PDF cache).
+    """
     filename: str
+    content: Optional[bytes] = None
+    path: Optional[str] = None
     content_type: str = "application/pdf"
 
 class EmailBase(BaseModel):
@@ -31,4 +38,21 @@ class EmailConfig(BaseModel):
     ativo: Optional[bool] = True
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class EmailOutboxRead(BaseModel):
+    """E-mail na fila de envio e o seu estado de entrega."""
+    id: int
+    clinica_id: int
+    tipo: EmailTipo
+    referencia_id: int
+    email_para: Optional[str] = None
+    estado: EmailEstado
+    tentativas: int
+    proxima_tentativa_em: datetime
+    ultimo_erro: Optional[str] = None
+    criado_em: datetime
+    enviado_em: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
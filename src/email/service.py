@@ -4,44 +4,49 @@ Fachada central para envio de e-mails:
   • Orçamento (PDF em anexo)
   • Lembrete de consulta (sem anexo)
   • Cancelamento de consulta (sem anexo)
-Usa a classe EmailService antiga     → importada como RawEmailService
+Usa o EmailService de raw_service (um por configuração SMTP, com
+ligações reutilizadas)                → obtido com obter_mailer
 """
 
 from __future__ import annotations
 
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
 
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from jinja2 import Environment, FileSystemLoader
+from starlette.concurrency import run_in_threadpool
 
-from src.email.raw_service import EmailService as RawEmailService
+from src.email.raw_service import obter_mailer
 from src.email.schemas      import EmailAttachment, EmailConfig
 
 # --------- serviços/DAO da tua app -----------------------------
-from src.faturacao.service  import get_fatura
+from src.faturacao.models   import Fatura
 from src.orcamento.service  import get_orcamento
 from src.pacientes.service  import obter_paciente
 from src.clinica.service    import obter_clinica_por_id
 from src.marcacoes.models   import Marcacao
-from src.pdf.service        import generate_fatura_pdf, generate_orcamento_pdf
+from src.pdf.service        import contexto_fatura, contexto_orcamento, render_pdf_cached_ficheiro
+
+def _anexo_pdf(filename: str, pdf: Union[Path, bytes]) -> EmailAttachment:
+    # PDF do cache: anexado a partir do ficheiro, sem cópia
+    if isinstance(pdf, Path):
+        return EmailAttachment(filename=filename, path=str(pdf))
+    return EmailAttachment(filename=filename, content=pdf)
 
-# ------------------ Jinja env partilhado -----------------------
-TEMPLATE_DIR = Path(__file__).parent / "templates"
-env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
-env.filters["dt"] = lambda dt: dt.strftime("%d/%m/%Y %H:%M")
 
 # ------------------ Fachada principal --------------------------
 class EmailManager:
     """
-    Usa RawEmailService (FastMail) internamente.
+    Usa o EmailService partilhado da configuração da clínica.
     Recebe DB session para poder fazer look-ups e gerar PDFs.
+    Os look-ups (SQLAlchemy síncrono) e a geração de PDF correm no
+    threadpool, para não bloquear o event loop.
     """
 
     def __init__(self, db: Session, cfg: EmailConfig):
         self.db   = db
-        self.mail = RawEmailService(cfg)   # ← a tua classe antiga
+        self.mail = obter_mailer(cfg)      # partilhado entre pedidos
 
     # ---------- Fatura -----------------------------------------
     async def enviar_fatura(
@@ -50,19 +55,11 @@ class EmailManager:
         clinica_id: int,
         email_para: Optional[str] = None
     ):
-        fatura = get_fatura(self.db, fatura_id)
-        if not fatura:
-            raise HTTPException(404, "Fatura não encontrada")
-
-        paciente = obter_paciente(self.db, fatura.paciente_id)
-        clinica  = obter_clinica_por_id(self.db, clinica_id, None)
-
+        fatura, paciente, clinica, pdf = await run_in_threadpool(
+            self._preparar_fatura, fatura_id, clinica_id, email_para
+        )
         destinatario = email_para or paciente.email
-        if not destinatario:
-            raise HTTPException(400, "Paciente sem e-mail e parâmetro email_para ausente")
-
-        pdf  = generate_fatura_pdf(fatura_id, self.db)
-        anexo = EmailAttachment(filename=f"fatura_{fatura_id}.pdf", content=pdf)
+        anexo = _anexo_pdf(f"fatura_{fatura_id}.pdf", pdf)
 
         await self.mail.enviar_email(
             assunto        = f"Fatura #{fatura_id}",
@@ -83,19 +80,11 @@ class EmailManager:
         clinica_id: int,
         email_para: Optional[str] = None
     ):
-        orcamento = get_orcamento(self.db, orcamento_id)
-        if not orcamento:
-            raise HTTPException(404, "Orçamento não encontrado")
-
-        paciente = obter_paciente(self.db, orcamento.paciente_id)
-        clinica  = obter_clinica_por_id(self.db, clinica_id, None)
-
+        orcamento, paciente, clinica, pdf = await run_in_threadpool(
+            self._preparar_orcamento, orcamento_id, clinica_id, email_para
+        )
         destinatario = email_para or paciente.email
-        if not destinatario:
-            raise HTTPException(400, "Paciente sem e-mail e parâmetro email_para ausente")
-
-        pdf  = generate_orcamento_pdf(orcamento_id, self.db)
-        anexo = EmailAttachment(filename=f"orcamento_{orcamento_id}.pdf", content=pdf)
+        anexo = _anexo_pdf(f"orcamento_{orcamento_id}.pdf", pdf)
 
         await self.mail.enviar_email(
             assunto        = f"Orçamento #{orcamento_id}",
@@ -111,30 +100,62 @@ class EmailManager:
 
     # ---------- Lembrete (sem anexo) ----------------------------
     async def enviar_lembrete(self, marc: Marcacao):
+        dados = await run_in_threadpool(self._dados_marcacao, marc)
         await self.mail.enviar_email(
             assunto        = f"Lembrete da sua consulta – {marc.data_hora_inicio:%d/%m %H:%M}",
-            destinatarios  = [marc.paciente.email],
+            destinatarios  = [dados["paciente"].email],
             nome_template  = "lembrete_consulta.html",
-            dados_template = {
-                "clinica":  marc.clinic,
-                "paciente": marc.paciente,
-                "medico":   marc.medico,
-                "marcacao": marc,
-            },
+            dados_template = dados,
             anexos=[],
         )
 
     # ---------- Cancelamento (sem anexo) ------------------------
     async def enviar_cancelamento(self, marc: Marcacao):
+        dados = await run_in_threadpool(self._dados_marcacao, marc)
         await self.mail.enviar_email(
             assunto        = f"Consulta cancelada – {marc.data_hora_inicio:%d/%m %H:%M}",
-            destinatarios  = [marc.paciente.email],
+            destinatarios  = [dados["paciente"].email],
             nome_template  = "consulta_cancelada.html",
-            dados_template = {
-                "clinica":  marc.clinic,
-                "paciente": marc.paciente,
-                "medico":   marc.medico,
-                "marcacao": marc,
-            },
+            dados_template = dados,
             anexos=[],
         )
+
+    # ---------- Look-ups síncronos (correm no threadpool) --------
+    def _preparar_fatura(self, fatura_id: int, clinica_id: int, email_para: Optional[str]):
+        # Carrega a fatura (itens, parcelas, paciente, origens) de uma vez;
+        # o e-mail e o PDF usam os mesmos objetos, já na sessão.
+        context  = contexto_fatura(fatura_id, self.db)
+        fatura   = self.db.get(Fatura, fatura_id)
+        paciente = fatura.paciente
+        clinica  = obter_clinica_por_id(self.db, clinica_id, None)
+
+        if not (email_para or paciente.email):
+            raise HTTPException(400, "Paciente sem e-mail e parâmetro email_para ausente")
+
+        pdf = render_pdf_cached_ficheiro("fatura", fatura_id, "fatura.html", context)
+        return fatura, paciente, clinica, pdf
+
+    def _preparar_orcamento(self, orcamento_id: int, clinica_id: int, email_para: Optional[str]):
+        orcamento = get_orcamento(self.db, orcamento_id)
+        if not orcamento:
+            raise HTTPException(404, "Orçamento não encontrado")
+
+        paciente = obter_paciente(self.db, orcamento.paciente_id)
+        clinica  = obter_clinica_por_id(self.db, clinica_id, None)
+
+        if not (email_para or paciente.email):
+            raise HTTPException(400, "Paciente sem e-mail e parâmetro email_para ausente")
+
+        context = contexto_orcamento(orcamento_id, self.db)
+        pdf = render_pdf_cached_ficheiro("orcamento", orcamento_id, "orcamento.html", context)
+        return orcamento, paciente, clinica, pdf
+
+    @staticmethod
+    def _dados_marcacao(marc: Marcacao) -> Dict[str, Any]:
+        # acede às relações lazy aqui, fora do event loop
+        return {
+            "clinica":  marc.clinic,
+            "paciente": marc.paciente,
+            "medico":   marc.medico,
+            "marcacao": marc,
+        }
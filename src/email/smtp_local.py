@@ -0,0 +1,64 @@
+"""
+Servidor SMTP de teste (aiosmtpd) para correr a fila de e-mails localmente.
+
+Aceita qualquer mensagem, sem TLS nem autenticação, e grava cada uma como
+ficheiro .eml numa pasta. Usar com a API arrancada com
+`EMAIL_SMTP_LOCAL=localhost:1025`:
+
+    pip install aiosmtpd
+    python -m src.email.smtp_local --porta 1025 --pasta /tmp/emails
+
+Opcionalmente falha uma fração das mensagens (--falhar) para ver as novas
+tentativas do dispatcher.
+"""
+import argparse
+import asyncio
+import random
+import time
+from pathlib import Path
+
+
+class GuardarEmPasta:
+    def __init__(self, pasta: Path, falhar: float):
+        self.pasta = pasta
+        self.falhar = falhar
+        self.recebidas = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        if random.random() < self.falhar:
+            return "451 Falha simulada, tente mais tarde"
+        self.recebidas += 1
+        nome = f"{time.strftime('%Y%m%d-%H%M%S')}-{self.recebidas:05d}.eml"
+        (self.pasta / nome).write_bytes(envelope.original_content or envelope.content)
+        print(f"{nome}: {envelope.mail_from} → {', '.join(envelope.rcpt_tos)}")
+        return "250 OK"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--porta", type=int, default=1025)
+    parser.add_argument("--pasta", default="emails_recebidos")
+    parser.add_argument("--falhar", type=float, default=0.0, help="fração de mensagens a recusar (0-1)")
+    args = parser.parse_args()
+
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        raise SystemExit("Este servidor de teste precisa do aiosmtpd: pip install aiosmtpd")
+
+    pasta = Path(args.pasta)
+    pasta.mkdir(parents=True, exist_ok=True)
+    controller = Controller(GuardarEmPasta(pasta, args.falhar), hostname=args.host, port=args.porta)
+    controller.start()
+    print(f"SMTP de teste em {args.host}:{args.porta}, mensagens em {pasta.resolve()} (Ctrl+C para sair)")
+    try:
+        asyncio.run(asyncio.Event().wait())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
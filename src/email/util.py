@@ -1,19 +1,12 @@
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, Depends
 from typing import Optional
+from starlette.concurrency import run_in_threadpool
 
-from src.database import SessionLocal
+from src.database import get_db
 from src.clinica.models import ClinicaEmail
 from src.email.schemas import EmailConfig
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 async def get_email_config(clinica_id: int, db: Session = Depends(get_db)) -> EmailConfig:
     """
     Get email configuration for a clinic.
@@ -28,11 +21,13 @@ async def get_email_config(clinica_id: int, db: Session = Depends(get_db)) -> Em
     Raises:
         HTTPException: If no active email configuration is found
     """
-    # Get the active email configuration for the clinic
-    email_config = db.query(ClinicaEmail).filter(
-        ClinicaEmail.clinica_id == clinica_id,
-        ClinicaEmail.ativo == True
-    ).first()
+    # Get the active email configuration for the clinic (sync query → threadpool)
+    email_config = await run_in_threadpool(
+        lambda: db.query(ClinicaEmail).filter(
+            ClinicaEmail.clinica_id == clinica_id,
+            ClinicaEmail.ativo == True
+        ).first()
+    )
     
     if not email_config:
         raise HTTPException(
@@ -55,13 +50,11 @@ async def test_email_config(config: EmailConfig) -> bool:
     Raises:
         HTTPException: If the configuration is invalid
     """
-    from .service import EmailService
+    from .raw_service import EmailService
     
     try:
-        # Create email service
-        email_service = EmailService(config)
-        
-        # If no error is raised, the configuration is valid
+        # Connect and log in to the SMTP server
+        await EmailService(config).testar_ligacao()
         return True
     except Exception as e:
         raise HTTPException(
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from src.database import SessionLocal
+from src.database import get_db
 from src.utilizadores.dependencies import get_current_user
 from src.utilizadores.models import Utilizador
 from src.utilizadores.utils import is_master_admin
@@ -8,13 +8,6 @@ from . import service, schemas
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.get("", response_model=list[schemas.EntidadeResponse])
 def listar_entidades(
     db: Session = Depends(get_db),
@@ -3,7 +3,7 @@ from fastapi.params import Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
-from src.database import SessionLocal
+from src.database import get_db
 from src.utilizadores.dependencies import get_current_user
 from src.utilizadores.models import Utilizador
 
@@ -17,14 +17,6 @@ router = APIRouter(
 )
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @router.get("", response_model=List[schemas.FaturaRead], summary="Listar faturas")
 def listar_faturas(
     paciente_id: int = None,
@@ -1,5 +1,8 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from src.core.config import settings
 from src.utilizadores.router import router as utilizadores_router
 from src.perfis.router import router as perfis_router
 from src.auditoria.router import router as auditoria_router
@@ -20,10 +23,35 @@ from src.pdf.router import router as pdf_router
 from src.email.router import router as email_router
 from src.mensagens.router import router as mensagens_router
 from src.relatorios.router import router as relatorios_router
+from src.database import estado_pools
+from src.email.outbox import dispatcher as email_dispatcher
+from src.email.lembretes import agendador as agendador_lembretes
+from src.email.raw_service import fechar_mailers
+from src.mensagens.ws import manager as ws_manager
+from src.pdf import renderer as pdf_renderer
+from src.utilizadores import hashing
+from src.utilizadores.dependencies import get_current_user
+from src.utilizadores.utils import is_master_admin
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # tarefas em background de cada worker
+    if settings.EMAIL_DISPATCHER_ATIVO:
+        email_dispatcher.iniciar()
+    if settings.LEMBRETES_ATIVO:
+        agendador_lembretes.iniciar()
+    yield
+    await agendador_lembretes.parar()
+    await email_dispatcher.parar()
+    await fechar_mailers()
+    await ws_manager.parar()
+    hashing.encerrar_pool()
+    pdf_renderer.encerrar_pool()
 
 
 app = FastAPI(
+    lifespan=lifespan,
     title="Clínica Dentária API",
     description="API para gestão de utilizadores, perfis e autenticação da clínica dentária.",
     version="1.0.0",
@@ -54,6 +82,18 @@ def root():
         "redoc": "/redoc"
     }
 
+
+@app.get("/metrics/db-pool", tags=["default"])
+def db_pool_metrics(utilizador_atual=Depends(get_current_user)):
+    """
+    Estado do pool de ligações deste worker (checkouts, esperas, overflow),
+    para dimensionar DB_POOL_SIZE / DB_MAX_OVERFLOW face ao nº de workers.
+    Só para o Master Admin.
+    """
+    if not is_master_admin(utilizador_atual):
+        raise HTTPException(status_code=403, detail="Apenas o Master Admin pode consultar as métricas.")
+    return estado_pools()
+
 app.include_router(utilizadores_router, prefix="/utilizadores",tags=["Utilizadores"])
 app.include_router(perfis_router, prefix="/perfis", tags=["Perfis"])
 app.include_router(clinica_router, prefix="/clinica", tags=["Clinica"])
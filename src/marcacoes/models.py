@@ -1,6 +1,7 @@
 from sqlalchemy import (
-    Column, Integer, String, DateTime, ForeignKey, Text, func
+    Column, Integer, String, DateTime, ForeignKey, Text, Index, func, text
 )
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 from sqlalchemy.orm import relationship
 from src.database import Base
 
@@ -21,6 +22,9 @@ class Marcacao(Base):
     titulo           = Column("titulo", String(200), nullable=False, default="Marcação")
     estado       = Column(String(20), nullable=False, default="agendada") # Estado padrão 'agendada', outros estados podem ser: falta, iniciada, concluida, cancelada
 
+    # lembrete automático das 24 h (src.email.lembretes); volta a None se a marcação mudar de hora
+    lembrete_enviado_em = Column(DateTime(timezone=True), nullable=True)
+
     created_at   = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at   = Column(DateTime(timezone=True), server_default=func.now(),
                           onupdate=func.now(), nullable=False)
@@ -29,4 +33,27 @@ class Marcacao(Base):
     medico       = relationship("Utilizador", foreign_keys=[medico_id])      
     clinic       = relationship("Clinica")
     agendador    = relationship("Utilizador", foreign_keys=[agendada_por])  
-    entidade     = relationship("Entidade")
\ No newline at end of file
+    entidade     = relationship("Entidade")
+
+    __table_args__ = (
+        # motor de vagas / verificação de sobreposição: marcações do médico
+        # que terminam depois do início do intervalo pedido
+        Index("ix_marcacoes_medico_fim", "medico_id", "data_hora_fim"),
+        # agenda da clínica por intervalo de datas
+        Index("ix_marcacoes_clinic_inicio", "clinic_id", "data_hora_inicio"),
+        # job de lembretes: marcações agendadas ainda sem lembrete, por data
+        Index(
+            "ix_marcacoes_lembrete_pendente",
+            "data_hora_inicio",
+            postgresql_where=text("estado = 'agendada' AND lembrete_enviado_em IS NULL"),
+        ),
+        # impede marcações sobrepostas do mesmo médico (requer btree_gist);
+        # as canceladas não ocupam a agenda
+        ExcludeConstraint(
+            (medico_id, "="),
+            (func.tstzrange(data_hora_inicio, data_hora_fim, "[)"), "&&"),
+            name="ex_marcacoes_medico_sobreposicao",
+            using="gist",
+            where=text("estado <> 'cancelada'"),
+        ),
+    )
\ No newline at end of file
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Literal, Optional, Union
 from datetime import date
 
-from src.database import SessionLocal
+from src.database import get_async_db, get_db
 from src.utilizadores.dependencies import get_current_user
 from src.utilizadores.models import Utilizador
 
@@ -16,14 +17,6 @@ router = APIRouter(
 )
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @router.post(
     "",
     response_model=schemas.MarcacaoRead,
@@ -44,10 +37,10 @@ def criar_marcacao(
 
 @router.get(
     "",
-    response_model=List[schemas.MarcacaoRead],
+    response_model=Union[List[schemas.MarcacaoRead], List[schemas.MarcacaoCalendario]],
     summary="Listar marcações",
 )
-def listar_marcacoes_endpoint(
+async def listar_marcacoes_endpoint(
     clinica_id: int               = Query(..., description="ID da clínica (obrigatório)"),
     medico_id: Optional[int]      = Query(None, description="ID do médico"),
     paciente_id: Optional[int]    = Query(None, description="ID do paciente"),
@@ -55,12 +48,13 @@ def listar_marcacoes_endpoint(
     data_inicio: Optional[date]   = Query(None, description="Data mínima"),
     data_fim: Optional[date]      = Query(None, description="Data máxima"),
     estado: Optional[str]         = Query(None, description="Estado da marcação"),
-    db: Session                   = Depends(get_db),
+    formato: Literal["completo", "calendario"] = Query("completo", description="'calendario': só id, horas, estado, paciente e médico"),
+    db: AsyncSession              = Depends(get_async_db),
 ):
     """
     Lista todas as marcações filtrando por clínica (obrigatório) e demais filtros opcionais.
     """
-    return service.list_marcacoes(
+    return await service.list_marcacoes_async(
         db,
         clinica_id=clinica_id,
         medico_id=medico_id,
@@ -69,6 +63,36 @@ def listar_marcacoes_endpoint(
         data_inicio=data_inicio,
         data_fim=data_fim,
         estado=estado,
+        calendario=(formato == "calendario"),
+    )
+
+
+@router.get(
+    "/vagas",
+    response_model=List[schemas.VagasMedico],
+    summary="Vagas livres por médico",
+)
+def listar_vagas(
+    clinica_id: int               = Query(..., description="ID da clínica"),
+    medico_id: List[int]          = Query(..., description="ID do médico (pode repetir-se)"),
+    data_inicio: date             = Query(..., description="Primeiro dia"),
+    data_fim: Optional[date]      = Query(None, description="Último dia (por omissão = data_inicio)"),
+    duracao: int                  = Query(30, ge=5, le=480, description="Duração da vaga em minutos"),
+    db: Session                   = Depends(get_db),
+    utilizador_atual: Utilizador  = Depends(get_current_user),
+):
+    """
+    Devolve, para cada médico, as vagas livres de `duracao` minutos dentro
+    do horário da clínica (`abertura`/`fecho` em ClinicaConfiguracao),
+    descontando as marcações existentes e o buffer entre marcações.
+    """
+    return service.calcular_vagas(
+        db,
+        clinica_id=clinica_id,
+        medico_ids=list(dict.fromkeys(medico_id)),
+        data_inicio=data_inicio,
+        data_fim=data_fim or data_inicio,
+        duracao_minutos=duracao,
     )
 
 
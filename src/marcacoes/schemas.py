@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -79,6 +79,31 @@ class MarcacaoRead(MarcacaoBase):
         orm_mode = True
 
 
+# ----------------------------------------------------------------
+# Feed compacto para o calendário (vista de mês)
+# ----------------------------------------------------------------
+class MarcacaoCalendario(BaseModel):
+    id:               int            = Field(..., description="ID da marcação")
+    data_hora_inicio: datetime       = Field(..., description="Início")
+    data_hora_fim:    datetime       = Field(..., description="Fim")
+    estado:           str            = Field(..., description="Estado da marcação")
+    paciente_nome:    str            = Field(..., description="Nome do paciente")
+    medico_id:        int            = Field(..., description="ID do médico")
+
+
+# ----------------------------------------------------------------
+# Vagas (disponibilidade)
+# ----------------------------------------------------------------
+class Vaga(BaseModel):
+    inicio: datetime = Field(..., description="Início da vaga")
+    fim:    datetime = Field(..., description="Fim da vaga")
+
+
+class VagasMedico(BaseModel):
+    medico_id: int        = Field(..., description="ID do médico")
+    vagas:     List[Vaga] = Field(default_factory=list, description="Vagas livres, por ordem")
+
+
 # ----------------------------------------------------------------
 # Schema de leitura (response)
 # ----------------------------------------------------------------
@@ -1,8 +1,11 @@
-from typing import Optional, List
-from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError
 
 from src.marcacoes.models import Marcacao
 from src.marcacoes.schemas import (
@@ -12,7 +15,8 @@ from src.marcacoes.schemas import (
 )
 from src.pacientes.models import Paciente
 from src.utilizadores.models import Utilizador
-from src.clinica.models import Clinica
+from src.clinica.models import Clinica, ClinicaConfiguracao
+from src.core.datas import fuso_clinicas, intervalo_dias
 from src.entidades.models import Entidade
 
 
@@ -23,6 +27,286 @@ def _get_fk_or_404(db: Session, model, id: int, name: str):
     return obj
 
 
+# ----------------------------------------------------------------
+# Disponibilidade (vagas)
+# ----------------------------------------------------------------
+# Buffer por omissão entre marcações do mesmo médico (minutos); cada
+# clínica pode definir o seu em ClinicaConfiguracao (`buffer_minutos`).
+BUFFER_MINUTES = 5
+# Estados que não ocupam a agenda do médico
+ESTADOS_SEM_OCUPACAO = ("cancelada",)
+# Intervalo máximo pedido de uma vez ao motor de vagas
+MAX_DIAS_VAGAS = 31
+
+Intervalo = Tuple[datetime, datetime]
+
+
+class HorarioClinica(NamedTuple):
+    abertura: time
+    fecho: time
+    buffer: timedelta
+    dias: frozenset          # dias da semana abertos (1 = segunda ... 7 = domingo)
+    fuso: ZoneInfo
+
+
+def _ler_hora(valor: Optional[str], omissao: time) -> time:
+    """Aceita "08:00", "8:00" ou "8h30"."""
+    if not valor:
+        return omissao
+    try:
+        horas, _, minutos = valor.strip().lower().replace("h", ":").partition(":")
+        return time(int(horas), int(minutos or 0))
+    except ValueError:
+        return omissao
+
+
+def obter_horario_clinica(db: Session, clinica_id: int) -> HorarioClinica:
+    """
+    Lê o horário de funcionamento da clínica de `ClinicaConfiguracao`:
+    `abertura` / `fecho` (HH:MM), `buffer_minutos` e, opcionalmente,
+    `dias_funcionamento` ("1,2,3,4,5"). Chaves em falta na clínica usam a
+    configuração global (clinica_id nulo) e depois os valores por omissão.
+    """
+    linhas = db.execute(
+        select(ClinicaConfiguracao.clinica_id, ClinicaConfiguracao.chave, ClinicaConfiguracao.valor)
+        .where(
+            ClinicaConfiguracao.chave.in_(("abertura", "fecho", "buffer_minutos", "dias_funcionamento")),
+            or_(ClinicaConfiguracao.clinica_id == clinica_id, ClinicaConfiguracao.clinica_id.is_(None)),
+        )
+    ).all()
+    config: Dict[str, str] = {}
+    # globais primeiro, para serem substituídas pelas da clínica
+    for linha in sorted(linhas, key=lambda l: l.clinica_id is not None):
+        config[linha.chave] = linha.valor
+
+    try:
+        buffer = int(config.get("buffer_minutos", BUFFER_MINUTES))
+    except ValueError:
+        buffer = BUFFER_MINUTES
+    try:
+        dias = frozenset(int(d) for d in config["dias_funcionamento"].split(",") if d.strip())
+    except (KeyError, ValueError):
+        dias = frozenset(range(1, 8))
+
+    return HorarioClinica(
+        abertura=_ler_hora(config.get("abertura"), time(8, 0)),
+        fecho=_ler_hora(config.get("fecho"), time(20, 0)),
+        buffer=timedelta(minutes=max(0, buffer)),
+        dias=dias,
+        fuso=fuso_clinicas(),
+    )
+
+
+def _com_fuso(valor: datetime) -> datetime:
+    """Datas sem fuso horário são interpretadas no fuso das clínicas."""
+    if valor is not None and valor.tzinfo is None:
+        return valor.replace(tzinfo=fuso_clinicas())
+    return valor
+
+
+def _janelas_abertura(horario: HorarioClinica, data_inicio: date, data_fim: date) -> List[Intervalo]:
+    """Janelas [abertura, fecho) de cada dia aberto do intervalo, por ordem."""
+    janelas = []
+    dia = data_inicio
+    while dia <= data_fim:
+        if dia.isoweekday() in horario.dias:
+            inicio = datetime.combine(dia, horario.abertura, horario.fuso)
+            fim = datetime.combine(dia, horario.fecho, horario.fuso)
+            if fim > inicio:
+                janelas.append((inicio, fim))
+        dia += timedelta(days=1)
+    return janelas
+
+
+def _ocupacoes(
+    db: Session,
+    medico_ids: Iterable[int],
+    inicio: datetime,
+    fim: datetime,
+    excluir_marcacao_id: Optional[int] = None,
+) -> Dict[int, List[Intervalo]]:
+    """
+    Intervalos ocupados de cada médico que tocam [inicio, fim), numa só
+    query e já ordenados por início. Considera marcações de todas as
+    clínicas: o médico não pode estar em dois sítios ao mesmo tempo.
+    """
+    q = (
+        select(Marcacao.medico_id, Marcacao.data_hora_inicio, Marcacao.data_hora_fim)
+        .where(
+            Marcacao.medico_id.in_(list(medico_ids)),
+            Marcacao.data_hora_fim > inicio,
+            Marcacao.data_hora_inicio < fim,
+            Marcacao.estado.notin_(ESTADOS_SEM_OCUPACAO),
+        )
+        .order_by(Marcacao.medico_id, Marcacao.data_hora_inicio)
+    )
+    if excluir_marcacao_id is not None:
+        q = q.where(Marcacao.id != excluir_marcacao_id)
+
+    ocupacoes: Dict[int, List[Intervalo]] = {m: [] for m in medico_ids}
+    for medico_id, ini, fim_ in db.execute(q):
+        ocupacoes[medico_id].append((ini, fim_))
+    return ocupacoes
+
+
+def _intervalos_livres(
+    janelas: List[Intervalo], ocupados: List[Intervalo], buffer: timedelta
+) -> List[Intervalo]:
+    """
+    Varrimento de intervalos ordenados: subtrai às janelas de abertura os
+    intervalos ocupados (alargados pelo buffer). Ambas as listas vêm
+    ordenadas por início, por isso é O(janelas + ocupados).
+    """
+    livres = []
+    j = 0
+    for abertura, fecho in janelas:
+        cursor = abertura
+        # ocupações que acabam antes desta janela já não interessam
+        while j < len(ocupados) and ocupados[j][1] + buffer <= abertura:
+            j += 1
+        k = j
+        while k < len(ocupados) and ocupados[k][0] - buffer < fecho:
+            ini, fim = ocupados[k][0] - buffer, ocupados[k][1] + buffer
+            if ini > cursor:
+                livres.append((cursor, ini))
+            cursor = max(cursor, fim)
+            k += 1
+        if cursor < fecho:
+            livres.append((cursor, fecho))
+    return livres
+
+
+def _fatiar(livres: List[Intervalo], duracao: timedelta, horario: HorarioClinica) -> List[Intervalo]:
+    """
+    Corta os intervalos livres em vagas de `duracao`, alinhadas numa grelha
+    de `duracao` a partir da hora de abertura desse dia.
+    """
+    vagas = []
+    for ini, fim in livres:
+        referencia = datetime.combine(ini.astimezone(horario.fuso).date(), horario.abertura, horario.fuso)
+        passos = -((referencia - ini) // duracao)      # arredonda para cima
+        inicio = referencia + passos * duracao
+        while inicio + duracao <= fim:
+            vagas.append((inicio, inicio + duracao))
+            inicio += duracao
+    return vagas
+
+
+def calcular_vagas(
+    db: Session,
+    clinica_id: int,
+    medico_ids: List[int],
+    data_inicio: date,
+    data_fim: date,
+    duracao_minutos: int = 30,
+) -> List[dict]:
+    """
+    Vagas livres de `duracao_minutos` de cada médico entre `data_inicio` e
+    `data_fim` (inclusive), dentro do horário da clínica. Faz duas queries
+    no total (horário + marcações), independentemente do número de médicos.
+    """
+    if data_fim < data_inicio:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "data_fim anterior a data_inicio.")
+    if (data_fim - data_inicio).days >= MAX_DIAS_VAGAS:
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            f"Intervalo máximo de {MAX_DIAS_VAGAS} dias.",
+        )
+
+    horario = obter_horario_clinica(db, clinica_id)
+    # não oferecer vagas no passado
+    agora = datetime.now(timezone.utc)
+    janelas = [
+        (max(ini, agora), fim)
+        for ini, fim in _janelas_abertura(horario, data_inicio, data_fim)
+        if fim > agora
+    ]
+    if not janelas:
+        return [{"medico_id": m, "vagas": []} for m in medico_ids]
+
+    duracao = timedelta(minutes=duracao_minutos)
+    ocupacoes = _ocupacoes(
+        db, medico_ids, janelas[0][0] - horario.buffer, janelas[-1][1] + horario.buffer
+    )
+
+    resultado = []
+    for medico_id in medico_ids:
+        livres = _intervalos_livres(janelas, ocupacoes[medico_id], horario.buffer)
+        vagas = _fatiar(livres, duracao, horario)
+        resultado.append({
+            "medico_id": medico_id,
+            "vagas": [{"inicio": ini, "fim": fim} for ini, fim in vagas],
+        })
+    return resultado
+
+
+def verificar_disponibilidade(
+    db: Session,
+    clinica_id: int,
+    medico_id: int,
+    inicio: datetime,
+    fim: datetime,
+    excluir_marcacao_id: Optional[int] = None,
+) -> None:
+    """
+    Garante que [inicio, fim) está dentro do horário da clínica e não
+    colide (incluindo o buffer) com outra marcação do médico.
+    """
+    # com fuso antes de comparar: um valor pode vir com fuso e o outro sem
+    inicio, fim = _com_fuso(inicio), _com_fuso(fim)
+    if fim <= inicio:
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            "A data/hora de fim tem de ser posterior à de início."
+        )
+    horario = obter_horario_clinica(db, clinica_id)
+
+    inicio_local, fim_local = inicio.astimezone(horario.fuso), fim.astimezone(horario.fuso)
+    dentro_do_horario = (
+        inicio_local.date() == fim_local.date()
+        and inicio_local.isoweekday() in horario.dias
+        and horario.abertura <= inicio_local.time()
+        and fim_local.time() <= horario.fecho
+    )
+    if not dentro_do_horario:
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            "A marcação está fora do horário de funcionamento da clínica."
+        )
+
+    ocupados = _ocupacoes(
+        db, [medico_id], inicio - horario.buffer, fim + horario.buffer, excluir_marcacao_id
+    )[medico_id]
+    if ocupados:
+        raise HTTPException(
+            status.HTTP_409_CONFLICT,
+            "O médico já tem uma marcação nesse horário."
+        )
+
+
+# violação de uma EXCLUDE constraint no PostgreSQL
+SQLSTATE_EXCLUSION_VIOLATION = "23P01"
+
+
+def _commit_marcacao(db: Session) -> None:
+    """
+    Commit que traduz a constraint de sobreposição (ex_marcacoes_medico_sobreposicao)
+    num 409. É a garantia final contra duas reservas simultâneas do mesmo
+    horário, que passariam ambas por `verificar_disponibilidade`.
+    """
+    try:
+        db.commit()
+    except IntegrityError as exc:
+        db.rollback()
+        codigo = getattr(exc.orig, "pgcode", None) or getattr(exc.orig, "sqlstate", None)
+        if codigo == SQLSTATE_EXCLUSION_VIOLATION:
+            raise HTTPException(
+                status.HTTP_409_CONFLICT,
+                "O médico já tem uma marcação nesse horário."
+            )
+        raise
+
+
 def create_marcacao(
     db: Session,
     data: MarcacaoCreate,
@@ -47,11 +331,18 @@ def create_marcacao(
             "O utilizador selecionado não tem perfil de médico."
         )
 
+    # horário da clínica e sobreposição com outras marcações do médico
+    verificar_disponibilidade(
+        db, data.clinic_id, data.medico_id, data.data_hora_inicio, data.data_hora_fim
+    )
+
     # cria marcacao (estado e timestamps geridos pelo model)
     payload = data.dict(exclude={"estado", "agendada_por"})
+    payload["data_hora_inicio"] = _com_fuso(payload["data_hora_inicio"])
+    payload["data_hora_fim"] = _com_fuso(payload["data_hora_fim"])
     m = Marcacao(**payload, agendada_por=agendador_id)
     db.add(m)
-    db.commit()
+    _commit_marcacao(db)
     db.refresh(m)
     return m
 
@@ -63,8 +354,8 @@ def get_marcacao(db: Session, marc_id: int) -> Marcacao:
     return m
 
 
-def list_marcacoes(
-    db: Session,
+def _filtrar_marcacoes(
+    q,
     clinica_id: int,
     medico_id: Optional[int] = None,
     paciente_id: Optional[int] = None,
@@ -72,21 +363,84 @@ def list_marcacoes(
     data_inicio: Optional[date] = None,
     data_fim: Optional[date] = None,
     estado: Optional[str] = None,
-) -> List[Marcacao]:
-    q = db.query(Marcacao).filter(Marcacao.clinic_id == clinica_id)
+):
+    q = q.where(Marcacao.clinic_id == clinica_id)
     if medico_id:
-        q = q.filter(Marcacao.medico_id == medico_id)
+        q = q.where(Marcacao.medico_id == medico_id)
     if paciente_id:
-        q = q.filter(Marcacao.paciente_id == paciente_id)
+        q = q.where(Marcacao.paciente_id == paciente_id)
     if entidade_id:
-        q = q.filter(Marcacao.entidade_id == entidade_id)
-    if data_inicio:
-        q = q.filter(func.date(Marcacao.data_hora_inicio) >= data_inicio)
-    if data_fim:
-        q = q.filter(func.date(Marcacao.data_hora_inicio) <= data_fim)
+        q = q.where(Marcacao.entidade_id == entidade_id)
+    # intervalo semiaberto sobre a coluna (usa ix_marcacoes_clinic_inicio)
+    desde, ate = intervalo_dias(data_inicio, data_fim)
+    if desde:
+        q = q.where(Marcacao.data_hora_inicio >= desde)
+    if ate:
+        q = q.where(Marcacao.data_hora_inicio < ate)
     if estado:
-        q = q.filter(Marcacao.estado == estado)
-    return q.order_by(Marcacao.data_hora_inicio).all()
+        q = q.where(Marcacao.estado == estado)
+    return q.order_by(Marcacao.data_hora_inicio)
+
+
+def _select_marcacoes(*filtros, calendario: bool = False):
+    if calendario:
+        # vista de mês: só as colunas que o calendário desenha, sem ORM
+        q = select(
+            Marcacao.id,
+            Marcacao.data_hora_inicio,
+            Marcacao.data_hora_fim,
+            Marcacao.estado,
+            Marcacao.medico_id,
+            Paciente.nome.label("paciente_nome"),
+        ).join(Paciente, Paciente.id == Marcacao.paciente_id)
+    else:
+        # paciente e entidade fazem parte da resposta → carregados de uma vez
+        q = select(Marcacao).options(
+            selectinload(Marcacao.paciente), selectinload(Marcacao.entidade)
+        )
+    return _filtrar_marcacoes(q, *filtros)
+
+
+def list_marcacoes(
+    db: Session,
+    clinica_id: int,
+    medico_id: Optional[int] = None,
+    paciente_id: Optional[int] = None,
+    entidade_id: Optional[int] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    estado: Optional[str] = None,
+    calendario: bool = False,
+) -> List[Marcacao]:
+    """
+    Com `calendario=True` devolve linhas compactas (id, horas, estado,
+    nome do paciente e médico) em vez de objetos Marcacao.
+    """
+    q = _select_marcacoes(
+        clinica_id, medico_id, paciente_id, entidade_id, data_inicio, data_fim, estado,
+        calendario=calendario,
+    )
+    resultado = db.execute(q)
+    return resultado.mappings().all() if calendario else resultado.scalars().all()
+
+
+async def list_marcacoes_async(
+    db: AsyncSession,
+    clinica_id: int,
+    medico_id: Optional[int] = None,
+    paciente_id: Optional[int] = None,
+    entidade_id: Optional[int] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    estado: Optional[str] = None,
+    calendario: bool = False,
+) -> List[Marcacao]:
+    q = _select_marcacoes(
+        clinica_id, medico_id, paciente_id, entidade_id, data_inicio, data_fim, estado,
+        calendario=calendario,
+    )
+    resultado = await db.execute(q)
+    return resultado.mappings().all() if calendario else resultado.scalars().all()
 
 
 def update_marcacao(
@@ -98,10 +452,25 @@ def update_marcacao(
 
     # atualiza apenas campos fornecidos
     updates = changes.dict(exclude_unset=True)
+    for campo in ("data_hora_inicio", "data_hora_fim"):
+        if updates.get(campo) is not None:
+            updates[campo] = _com_fuso(updates[campo])
+    if updates.keys() & {"medico_id", "clinic_id", "data_hora_inicio", "data_hora_fim"}:
+        verificar_disponibilidade(
+            db,
+            updates.get("clinic_id") or m.clinic_id,
+            updates.get("medico_id") or m.medico_id,
+            updates.get("data_hora_inicio") or m.data_hora_inicio,
+            updates.get("data_hora_fim") or m.data_hora_fim,
+            excluir_marcacao_id=m.id,
+        )
+    if updates.get("data_hora_inicio") not in (None, m.data_hora_inicio):
+        # nova hora: o lembrete já enviado deixa de valer
+        m.lembrete_enviado_em = None
     for field, val in updates.items():
         setattr(m, field, val)
 
-    db.commit()
+    _commit_marcacao(db)
     db.refresh(m)
     return m
 
@@ -113,7 +482,8 @@ def set_estado(
 ) -> Marcacao:
     m = get_marcacao(db, marc_id)
     m.estado = novo_estado
-    db.commit()
+    # reativar uma marcação cancelada pode colidir com outra entretanto criada
+    _commit_marcacao(db)
     db.refresh(m)
     return m
 
@@ -37,6 +37,11 @@ class Thread(Base):
 
 class Mensagem(Base):
     __tablename__ = "Mensagens"
+    __table_args__ = (
+        # última mensagem / histórico de uma thread, por keyset (created_at, id)
+        # nos dois sentidos
+        Index("ix_mensagens_thread_created_id", "thread_id", "created_at", "id"),
+    )
 
     id           = Column(Integer, primary_key=True)
     clinica_id   = Column(Integer, ForeignKey("Clinica.id"), nullable=False)
@@ -47,4 +52,17 @@ class Mensagem(Base):
     lida         = Column(Boolean, default=False)
 
     thread       = relationship("Thread", back_populates="mensagens")
-    clinica      = relationship("Clinica")
\ No newline at end of file
+    clinica      = relationship("Clinica")
+
+class ThreadLeitura(Base):
+    """
+    Até onde cada utilizador leu cada thread (cursor de leitura). As não
+    lidas são as mensagens de outros depois desta, na ordem (created_at, id);
+    marcar como lido só avança o cursor, sem tocar nas mensagens.
+    """
+    __tablename__ = "ThreadLeituras"
+
+    thread_id            = Column(Integer, ForeignKey("Threads.id", ondelete="CASCADE"), primary_key=True)
+    utilizador_id        = Column(Integer, ForeignKey("Utilizador.id"), primary_key=True)
+    last_read_message_id = Column(Integer, ForeignKey("Mensagens.id", ondelete="SET NULL"), nullable=True)
+    updated_at           = Column(DateTime, default=datetime.utcnow, nullable=False)
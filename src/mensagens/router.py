@@ -1,25 +1,18 @@
 # src/mensagens/router.py
 from fastapi import APIRouter, Depends, WebSocket, Query, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import datetime
+from starlette.concurrency import run_in_threadpool
 
-from src.database import SessionLocal
-from src.utilizadores.dependencies import get_current_user
-from src.utilizadores.models import Utilizador, Sessao, UtilizadorClinica
-from src.utilizadores.jwt import verify_token  # Import your existing verify_token function
+from src.database import SessionLocal, get_async_db, get_db
+from src.utilizadores.dependencies import get_current_user, validar_token
+from src.utilizadores.models import Utilizador, UtilizadorClinica
 
-from . import schemas, service, ws
+from . import models, schemas, service, ws
 
 router = APIRouter(prefix="/mensagens", tags=["Mensagens"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # ---------- REST ----------
 @router.post("", response_model=schemas.MessageRead)
 async def enviar_mensagem(
@@ -36,6 +29,7 @@ async def enviar_mensagem(
         "clinica_id": msg.clinica_id,
         "thread_id": msg.thread_id,
         "created_at": msg.created_at.isoformat(),
+        "cursor": service.cursor_mensagem(msg),
     })
     return msg
 
@@ -81,17 +75,92 @@ def minhas_threads(
 
 
 @router.get("/thread/{thread_id}", response_model=List[schemas.MessageRead])
-def historico(
+async def historico(
     thread_id: int,
     clinica_id: int = Query(...),
     before_id: Optional[int] = None,
+    antes: Optional[str] = Query(None, description="Cursor: mensagens anteriores a esta (campo `cursor` de uma mensagem)"),
+    depois: Optional[str] = Query(None, description="Cursor: mensagens posteriores a esta"),
+    db: AsyncSession = Depends(get_async_db),
+    user: Utilizador = Depends(get_current_user),
+    limit: int = Query(30, gt=0, le=200)
+):
+    """
+    Mensagens da thread, da mais recente para a mais antiga. Para paginar,
+    enviar em `antes` o `cursor` da mensagem mais antiga recebida, ou em
+    `depois` o da mais recente.
+    """
+    if antes and depois:
+        raise HTTPException(status_code=400, detail="Use 'antes' ou 'depois', não ambos.")
+    return await service.listar_mensagens_async(
+        db, thread_id, clinica_id, limit, before_id, antes=antes, depois=depois
+    )
+
+@router.post("/thread/{thread_id}/read", response_model=schemas.LeituraRead)
+async def marcar_thread_lida(
+    thread_id: int,
+    dados: Optional[schemas.LeituraCreate] = None,
     db: Session = Depends(get_db),
     user: Utilizador = Depends(get_current_user),
-    limit: int = 30
 ):
-    return service.listar_mensagens(db, thread_id, clinica_id, limit, before_id)
+    """
+    Marca a thread como lida até `mensagem_id` (ou até à última mensagem).
+    Os outros participantes recebem o recibo de leitura pelo WebSocket.
+    """
+    leitura = await run_in_threadpool(
+        service.marcar_lida, db, thread_id, user.id, dados.mensagem_id if dados else None
+    )
+    if leitura.last_read_message_id is not None:
+        thread = await run_in_threadpool(db.get, models.Thread, thread_id)
+        await ws.manager.broadcast(f"clinica-{thread.clinica_id}", {
+            "tipo": "leitura",
+            "thread_id": thread_id,
+            "utilizador_id": user.id,
+            "last_read_message_id": leitura.last_read_message_id,
+        })
+    return leitura
+
+@router.get("/presenca", response_model=schemas.PresencaRead)
+async def presenca_clinica(
+    clinica_id: int = Query(...),
+    db: Session = Depends(get_db),
+    user: Utilizador = Depends(get_current_user),
+):
+    """Utilizadores da clínica com o chat (WebSocket) aberto neste momento."""
+    is_member = await run_in_threadpool(
+        lambda: db.query(UtilizadorClinica).filter_by(
+            utilizador_id=user.id, clinica_id=clinica_id
+        ).first() is not None
+    )
+    if not is_member:
+        raise HTTPException(
+            status_code=403,
+            detail="Usuário não pertence a esta clínica."
+        )
+    online = await ws.manager.online(f"clinica-{clinica_id}")
+    return {"clinica_id": clinica_id, "online": sorted(online)}
 
 # ---------- WebSocket ----------
+def _autenticar_ws(token: str, clinica_id: int) -> int:
+    """
+    Mesma validação do `get_current_user` (com a cache de sessões) mais a
+    pertença à clínica. Síncrona: corre no threadpool, para uma vaga de
+    reconexões não bloquear o event loop e os restantes sockets do worker.
+    """
+    db = SessionLocal()
+    try:
+        utilizador = validar_token(token, db)
+        is_member = db.query(UtilizadorClinica).filter_by(
+            utilizador_id=utilizador.id,
+            clinica_id=clinica_id
+        ).first() is not None
+        if not is_member:
+            raise HTTPException(status_code=403, detail="Usuário não pertence a esta clínica")
+        return utilizador.id
+    finally:
+        db.close()
+
+
 @router.websocket("/ws/clinica/{clinica_id}")
 async def ws_clinica(
     websocket: WebSocket,
@@ -99,51 +168,17 @@ async def ws_clinica(
     token: str = Query(..., alias="token")  # token via query
 ):
     try:
-        # Use your existing verification system
-        db = next(get_db())
-        
-        # Verify token and get user ID
-        payload = verify_token(token)
-        user_id = int(payload.get("sub"))
-        
-        # Verify session is active
-        sessao = db.query(Sessao).filter_by(
-            token=token, 
-            utilizador_id=user_id, 
-            ativo=True
-        ).first()
-        
-        if not sessao or sessao.data_expiracao < datetime.utcnow():
+        user_id = await run_in_threadpool(_autenticar_ws, token, clinica_id)
+    except HTTPException as exc:
+        if exc.status_code == 401:
             await websocket.close(code=4001, reason="Sessão expirada ou inválida")
-            return
-            
-        # Get user
-        utilizador = db.query(Utilizador).filter(
-            Utilizador.id == user_id,
-            Utilizador.ativo == True
-        ).first()
-        
-        if not utilizador:
-            await websocket.close(code=4003, reason="Utilizador não encontrado ou inativo")
-            return
-            
-        # Verify user belongs to this clinic
-        # This depends on your data model - adjust as needed
-        is_member = db.query(UtilizadorClinica).filter_by(
-            utilizador_id=user_id,
-            clinica_id=clinica_id
-        ).first() is not None
-        
-        if not is_member:
-            await websocket.close(code=4003, reason="Usuário não pertence a esta clínica")
-            return
-        
+        else:
+            await websocket.close(code=4003, reason=str(exc.detail))
+        return
     except Exception as e:
         print(f"WebSocket authentication error: {e}")
         await websocket.close(code=4003, reason="Falha na autenticação")
         return
-    finally:
-        db.close()
 
     # If we get here, authentication was successful
-    await ws.clinic_chat_ws(websocket, clinica_id, user_id)
\ No newline at end of file
+    await ws.clinic_chat_ws(websocket, clinica_id, user_id)
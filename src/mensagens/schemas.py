@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel
 
 
@@ -22,6 +22,7 @@ class MessageRead(MessageBase):
     remetente_nome: Optional[str] = None
     created_at: datetime
     lida: bool
+    cursor: Optional[str] = None  # para ?antes= / ?depois= em GET /mensagens/thread/{id}
 
     class Config:
         orm_mode = True
@@ -34,6 +35,29 @@ class ThreadRead(BaseModel):
     nome: Optional[str] = None
     outro_participante_id: Optional[int] = None  
     outro_participante_nome: Optional[str] = None
+    ultima_mensagem: Optional[MessageRead] = None
+    nao_lidas: int = 0
     
     class Config:
         from_attributes = True
+
+
+
+class LeituraCreate(BaseModel):
+    mensagem_id: Optional[int] = None  # None = até à última mensagem da thread
+
+
+class LeituraRead(BaseModel):
+    thread_id: int
+    utilizador_id: int
+    last_read_message_id: Optional[int] = None
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+
+class PresencaRead(BaseModel):
+    clinica_id: int
+    online: List[int]  # IDs dos utilizadores com o chat aberto
@@ -1,8 +1,12 @@
 # src/mensagens/service.py
+import base64
 from datetime import datetime
-from typing import Optional
-from sqlalchemy import or_
-from sqlalchemy.orm import Session, joinedload
+from typing import List, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import case, exists, func, or_, select, true, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
 from src.mensagens import models, schemas
 from src.utilizadores.models import Utilizador, UtilizadorClinica
 
@@ -102,74 +106,254 @@ def criar_mensagem(
     return msg
 
 
-def listar_mensagens(db: Session, thread_id: int, clinica_id: int, limit: int = 30, before_id: Optional[int] = None):
-    """List messages for a thread with user information."""
+# ---------- cursores (keyset por (created_at, id)) ----------------
+def cursor_mensagem(msg: models.Mensagem) -> str:
+    """Cursor opaco de uma mensagem, para pedir as anteriores/seguintes."""
+    bruto = f"{msg.created_at.isoformat()}|{msg.id}".encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip("=")
+
+
+def _ler_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, msg_id = bruto.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(msg_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Cursor inválido.")
+
+
+def _select_mensagens(
+    thread_id: int,
+    clinica_id: int,
+    limit: int,
+    antes: Optional[str] = None,
+    depois: Optional[str] = None,
+    before_id: Optional[int] = None,
+):
+    """
+    Uma página de mensagens da thread com o nome do remetente (uma query),
+    por keyset sobre (created_at, id) — índice (thread_id, created_at, id):
+
+    * sem cursor: as mais recentes;
+    * `antes`: as anteriores ao cursor (scroll para cima);
+    * `depois`: as seguintes ao cursor (apanhar o que chegou entretanto).
+
+    Devolve sempre da mais recente para a mais antiga.
+    """
+    M = models.Mensagem
+    chave = tuple_(M.created_at, M.id)
     query = (
-        db.query(models.Mensagem)
-        .filter(models.Mensagem.thread_id == thread_id)
-        .filter(models.Mensagem.clinica_id == clinica_id)
-        .order_by(models.Mensagem.created_at.desc())
+        select(M, Utilizador.nome.label("remetente_nome"))
+        .outerjoin(Utilizador, Utilizador.id == M.remetente_id)
+        .where(M.thread_id == thread_id)
+        .where(M.clinica_id == clinica_id)
     )
-    
-    if before_id:
-        query = query.filter(models.Mensagem.id < before_id)
-    
-    messages = query.limit(limit).all()
-    
-    # Get user information for each message
-    result = []
-    for msg in messages:
-        # Get user name from Utilizador table
-        user = db.query(Utilizador).filter(Utilizador.id == msg.remetente_id).first()
-        
-        # Create a dictionary with message data plus user name
-        msg_dict = {
-            "id": msg.id,
-            "thread_id": msg.thread_id,
-            "remetente_id": msg.remetente_id,
-            "remetente_nome": user.nome if user else None,
-            "clinica_id": msg.clinica_id,
-            "texto": msg.texto,
-            "created_at": msg.created_at,
-            "lida": msg.lida
-        }
-        result.append(msg_dict)
-    
-    return result
+    if depois:
+        return query.where(chave > tuple_(*_ler_cursor(depois))).order_by(M.created_at, M.id).limit(limit)
+    if antes:
+        query = query.where(chave < tuple_(*_ler_cursor(antes)))
+    elif before_id:
+        # compatibilidade: `before_id` passa a ser a posição dessa mensagem
+        ref = aliased(M)
+        query = query.where(
+            chave < tuple_(select(ref.created_at).where(ref.id == before_id).scalar_subquery(), before_id)
+        )
+    return query.order_by(M.created_at.desc(), M.id.desc()).limit(limit)
+
+
+def _mensagem_dict(msg: models.Mensagem, remetente_nome: Optional[str]) -> dict:
+    return {
+        "id": msg.id,
+        "thread_id": msg.thread_id,
+        "remetente_id": msg.remetente_id,
+        "remetente_nome": remetente_nome,
+        "clinica_id": msg.clinica_id,
+        "texto": msg.texto,
+        "created_at": msg.created_at,
+        "lida": msg.lida,
+        "cursor": cursor_mensagem(msg),
+    }
+
+
+def _pagina(rows, depois: Optional[str]) -> List[dict]:
+    mensagens = [_mensagem_dict(msg, nome) for msg, nome in rows]
+    if depois:
+        mensagens.reverse()  # pedidas por ordem crescente
+    return mensagens
+
+
+def listar_mensagens(
+    db: Session,
+    thread_id: int,
+    clinica_id: int,
+    limit: int = 30,
+    before_id: Optional[int] = None,
+    antes: Optional[str] = None,
+    depois: Optional[str] = None,
+):
+    """List messages for a thread with user information."""
+    rows = db.execute(_select_mensagens(thread_id, clinica_id, limit, antes, depois, before_id)).all()
+    return _pagina(rows, depois)
+
+
+async def listar_mensagens_async(
+    db: AsyncSession,
+    thread_id: int,
+    clinica_id: int,
+    limit: int = 30,
+    before_id: Optional[int] = None,
+    antes: Optional[str] = None,
+    depois: Optional[str] = None,
+):
+    """Async version of `listar_mensagens`."""
+    rows = (await db.execute(_select_mensagens(thread_id, clinica_id, limit, antes, depois, before_id))).all()
+    return _pagina(rows, depois)
 
 
 def listar_threads(db: Session, user_id: int, clinica_id: int):
-    threads = (
-        db.query(models.Thread)
-          .options(joinedload(models.Thread.mensagens))
-          .filter(
-              models.Thread.clinica_id == clinica_id,
-              or_(
-                  models.Thread.participante_a_id == user_id,
-                  models.Thread.participante_b_id == user_id,
-              )
-          )
-          .all()
+    """
+    Threads do utilizador com a última mensagem e o número de não lidas,
+    numa só query: a última mensagem vem de um LATERAL (… ORDER BY
+    created_at DESC LIMIT 1) e as não lidas de um COUNT correlacionado
+    das mensagens de outros depois do cursor de leitura (ThreadLeituras),
+    ambos servidos pelo índice (thread_id, created_at, id).
+    """
+    M = models.Mensagem
+    T = models.Thread
+    L = models.ThreadLeitura
+    lida = aliased(M)  # mensagem onde está o cursor de leitura
+
+    ultima_sq = (
+        select(M)
+        .where(M.thread_id == T.id)
+        .order_by(M.created_at.desc(), M.id.desc())
+        .limit(1)
+        .lateral("ultima")
     )
-    out = []
-    for t in threads:
-        outro = (
-            t.participante_a_id
-            if t.participante_b_id == user_id
-            else t.participante_b_id
+    ultima = aliased(M, ultima_sq)
+    remetente = aliased(Utilizador)
+    outro = aliased(Utilizador)
+
+    nao_lidas = (
+        select(func.count())
+        .select_from(M)
+        .where(
+            M.thread_id == T.id,
+            M.remetente_id != user_id,
+            or_(lida.id.is_(None), tuple_(M.created_at, M.id) > tuple_(lida.created_at, lida.id)),
+        )
+        .correlate(T, lida)
+        .scalar_subquery()
+    )
+    outro_id = case(
+        (T.participante_a_id == user_id, T.participante_b_id),
+        else_=T.participante_a_id,
+    )
+
+    rows = db.execute(
+        select(T, ultima, remetente.nome, outro.nome, nao_lidas.label("nao_lidas"))
+        .select_from(T)
+        .outerjoin(ultima, true())
+        .outerjoin(remetente, remetente.id == ultima.remetente_id)
+        .outerjoin(outro, outro.id == outro_id)
+        .outerjoin(L, (L.thread_id == T.id) & (L.utilizador_id == user_id))
+        .outerjoin(lida, lida.id == L.last_read_message_id)
+        .where(
+            T.clinica_id == clinica_id,
+            or_(T.participante_a_id == user_id, T.participante_b_id == user_id),
         )
-        ultima = t.mensagens[-1] if t.mensagens else None
+        .order_by(ultima.created_at.desc().nulls_last(), T.id.desc())
+    ).all()
+
+    out = []
+    for t, msg, remetente_nome, outro_nome, n in rows:
         out.append(
             {
                 "id": t.id,
                 "clinica_id": clinica_id,
-                "outro_participante_id": outro,
-                "ultima_mensagem": ultima,
+                "tipo": t.tipo,
+                "nome": t.nome,
+                "outro_participante_id": (
+                    t.participante_a_id
+                    if t.participante_b_id == user_id
+                    else t.participante_b_id
+                ),
+                "outro_participante_nome": outro_nome,
+                "ultima_mensagem": _mensagem_dict(msg, remetente_nome) if msg else None,
+                "nao_lidas": n,
             }
         )
     return out
 
 
+def _verificar_acesso_thread(db: Session, thread_id: int, user_id: int) -> models.Thread:
+    thread = db.get(models.Thread, thread_id)
+    if not thread:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Thread inexistente.")
+    if thread.tipo == "dm":
+        permitido = user_id in (thread.participante_a_id, thread.participante_b_id)
+    else:
+        permitido = db.query(UtilizadorClinica).filter_by(
+            utilizador_id=user_id, clinica_id=thread.clinica_id
+        ).first() is not None
+    if not permitido:
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Utilizador não pertence à thread.")
+    return thread
+
+
+def marcar_lida(
+    db: Session,
+    thread_id: int,
+    user_id: int,
+    mensagem_id: Optional[int] = None,
+) -> models.ThreadLeitura:
+    """
+    Avança o cursor de leitura do utilizador até `mensagem_id` (por omissão
+    a última mensagem da thread). Um único UPSERT, qualquer que seja o
+    tamanho da thread; nunca recua (pedidos fora de ordem não "desleem").
+    """
+    M = models.Mensagem
+    L = models.ThreadLeitura
+    _verificar_acesso_thread(db, thread_id, user_id)
+
+    alvo = select(M.id, M.created_at).where(M.thread_id == thread_id)
+    if mensagem_id is not None:
+        alvo = alvo.where(M.id == mensagem_id)
+    else:
+        alvo = alvo.order_by(M.created_at.desc(), M.id.desc()).limit(1)
+    alvo = db.execute(alvo).first()
+    if alvo is None:
+        if mensagem_id is not None:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, "Mensagem não pertence à thread.")
+        leitura = db.get(L, (thread_id, user_id))
+        if leitura is None:
+            leitura = L(thread_id=thread_id, utilizador_id=user_id, updated_at=datetime.utcnow())
+        return leitura
+
+    atual = aliased(M)
+    stmt = pg_insert(L).values(
+        thread_id=thread_id,
+        utilizador_id=user_id,
+        last_read_message_id=alvo.id,
+        updated_at=datetime.utcnow(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[L.thread_id, L.utilizador_id],
+        set_={
+            "last_read_message_id": stmt.excluded.last_read_message_id,
+            "updated_at": stmt.excluded.updated_at,
+        },
+        # só avança: não atualiza se o cursor já está nesta mensagem ou depois
+        where=~exists().where(
+            atual.id == L.last_read_message_id,
+            tuple_(atual.created_at, atual.id) >= tuple_(alvo.created_at, alvo.id),
+        ),
+    )
+    db.execute(stmt)
+    db.commit()
+    return db.get(L, (thread_id, user_id), populate_existing=True)
+
+
 def _get_or_create_clinic_thread(
     db: Session,
     clinica_id: int
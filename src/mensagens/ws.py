@@ -1,37 +1,334 @@
-# src/mensagens/ws.py
-from typing import Dict, Set
-from fastapi import WebSocket, WebSocketDisconnect
+"""
+WebSockets das mensagens: salas por clínica ("clinica-3") e distribuição.
+
+`ConnectionManager.broadcast` não envia diretamente para os sockets:
+publica no broker, e o broker entrega a mensagem a todos os workers, cada
+um enviando-a aos sockets que tem na sala.
+
+* `BrokerLocal` — só o próprio processo (um worker uvicorn; é o padrão);
+* `BrokerRedis` — pub/sub Redis (`MENSAGENS_BROKER_URL=redis://...`), para
+  vários workers ou instâncias. Precisa do pacote `redis`.
+
+Cada ligação (`Ligacao`) tem uma fila de envio limitada
+(`MENSAGENS_WS_QUEUE_SIZE`) e uma tarefa que a esvazia com timeout por
+mensagem (`MENSAGENS_WS_SEND_TIMEOUT_SECONDS`). A entrega numa sala é só
+colocar na fila de cada ligação: um cliente lento enche a sua fila e é
+desligado, sem atrasar os restantes.
+
+`clinic_chat_ws` lê continuamente do socket e faz heartbeat: se o cliente
+não enviar nada durante `MENSAGENS_WS_PING_SECONDS`, o servidor envia
+{"tipo": "ping"}; sem resposta no intervalo seguinte, a ligação é
+fechada. O cliente também pode enviar {"tipo": "ping"} e recebe "pong".
+
+Presença (quem está online em cada clínica): com `BrokerLocal` vem das
+ligações deste processo; com `BrokerRedis` de um sorted set por sala,
+renovado a cada heartbeat, comum a todos os workers.
+"""
 import asyncio
+import itertools
+import json
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from src.core.config import settings
+
+logger = logging.getLogger("app.mensagens")
+
+Entregar = Callable[[str, dict], Awaitable[None]]
+
+_ids = itertools.count(1)
+WORKER_ID = uuid.uuid4().hex[:8]
+
+
+# ---------- Brokers ----------
+class BrokerLocal:
+    """Entrega apenas neste processo; a presença é a das ligações locais."""
+
+    async def iniciar(self, entregar: Entregar) -> None:
+        self._entregar = entregar
+
+    async def publicar(self, room: str, data: dict) -> None:
+        await self._entregar(room, data)
+
+    async def parar(self) -> None:
+        pass
+
+    # presença: nada a guardar fora do processo
+    async def presenca_entrar(self, room: str, chave: str) -> None:
+        pass
+
+    async def presenca_sair(self, room: str, chave: str) -> None:
+        pass
+
+    async def online(self, room: str) -> Optional[Set[int]]:
+        return None  # o manager usa as ligações locais
+
+
+class BrokerRedis:
+    """
+    Pub/sub Redis: cada worker subscreve `<prefixo>*` e entrega localmente
+    o que recebe — incluindo o que ele próprio publicou.
+    """
+
+    def __init__(self, url: str = "", cliente=None, prefixo: str = "mensagens:"):
+        self.url = url
+        self.prefixo = prefixo
+        self._redis = cliente
+        self._pubsub = None
+        self._tarefa: Optional[asyncio.Task] = None
+
+    async def iniciar(self, entregar: Entregar) -> None:
+        self._entregar = entregar
+        if self._redis is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError:
+                raise RuntimeError("MENSAGENS_BROKER_URL requer o pacote redis: pip install redis")
+            self._redis = redis.from_url(self.url)
+        self._pubsub = self._redis.pubsub()
+        await self._pubsub.psubscribe(f"{self.prefixo}*")
+        self._tarefa = asyncio.create_task(self._ouvir(), name="mensagens-broker")
+
+    async def publicar(self, room: str, data: dict) -> None:
+        await self._redis.publish(self.prefixo + room, json.dumps(data, default=str))
+
+    async def _ouvir(self) -> None:
+        while True:
+            try:
+                msg = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if msg is None or msg["type"] != "pmessage":
+                    continue
+                canal = msg["channel"]
+                if isinstance(canal, bytes):
+                    canal = canal.decode()
+                await self._entregar(canal[len(self.prefixo):], json.loads(msg["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Redis em baixo: tenta de novo sem matar a tarefa
+                logger.exception("Broker Redis: falha a receber mensagens")
+                await asyncio.sleep(1)
 
+    async def parar(self) -> None:
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+
+    # ----- presença: sorted set por sala, score = expira em -----
+    def _chave_presenca(self, room: str) -> str:
+        return f"{self.prefixo}presenca:{room}"
+
+    async def presenca_entrar(self, room: str, chave: str) -> None:
+        # a validade cobre dois heartbeats; um worker que morra deixa expirar
+        expira = time.time() + 2 * settings.MENSAGENS_WS_PING_SECONDS
+        await self._redis.zadd(self._chave_presenca(room), {chave: expira})
+
+    async def presenca_sair(self, room: str, chave: str) -> None:
+        await self._redis.zrem(self._chave_presenca(room), chave)
+
+    async def online(self, room: str) -> Optional[Set[int]]:
+        chave = self._chave_presenca(room)
+        agora = time.time()
+        await self._redis.zremrangebyscore(chave, "-inf", agora)
+        membros = await self._redis.zrangebyscore(chave, agora, "+inf")
+        return {
+            int((m.decode() if isinstance(m, bytes) else m).split(":", 1)[0])
+            for m in membros
+        }
+
+
+def criar_broker():
+    if settings.MENSAGENS_BROKER_URL:
+        return BrokerRedis(settings.MENSAGENS_BROKER_URL)
+    return BrokerLocal()
+
+
+# ---------- Ligações ----------
+class Ligacao:
+    """Um socket aceite, com a sua fila de envio e a tarefa que a esvazia."""
+
+    def __init__(self, websocket: WebSocket, room: str, user_id: int):
+        self.websocket = websocket
+        self.room = room
+        self.user_id = user_id
+        # identifica a ligação na presença partilhada (utilizador primeiro)
+        self.chave = f"{user_id}:{WORKER_ID}:{next(_ids)}"
+        self.fila: asyncio.Queue = asyncio.Queue(maxsize=settings.MENSAGENS_WS_QUEUE_SIZE)
+        self.fechada = asyncio.Event()
+        self._escritor = asyncio.create_task(self._escrever())
+
+    def enviar(self, data: dict) -> bool:
+        """Coloca na fila; False se o cliente não está a acompanhar."""
+        if self.fechada.is_set():
+            return False
+        try:
+            self.fila.put_nowait(data)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _escrever(self) -> None:
+        try:
+            while True:
+                data = await self.fila.get()
+                await asyncio.wait_for(
+                    self.websocket.send_json(data), settings.MENSAGENS_WS_SEND_TIMEOUT_SECONDS
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await self.fechar(1011)
+
+    async def fechar(self, code: int = 1000) -> None:
+        if self.fechada.is_set():
+            return
+        self.fechada.set()
+        if self._escritor is not asyncio.current_task():
+            self._escritor.cancel()
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), 1)
+        except Exception:
+            pass
+
+
+# ---------- Salas ----------
 class ConnectionManager:
-    def __init__(self):
-        self.rooms: Dict[str, Set[WebSocket]] = {}  # ex.: "clinica-3"
+    def __init__(self, broker=None):
+        self.rooms: Dict[str, Set[Ligacao]] = {}  # ex.: "clinica-3"
+        self.broker = broker if broker is not None else criar_broker()
+        self._iniciado = False
+        self._lock_inicio = asyncio.Lock()
+        # desligações em curso; referência forte para o loop não as recolher
+        self._desligar: Set[asyncio.Task] = set()
 
-    async def connect(self, websocket: WebSocket, room: str):
+    async def _garantir_inicio(self) -> None:
+        # o broker arranca no primeiro uso, já dentro do event loop
+        if self._iniciado:
+            return
+        async with self._lock_inicio:
+            if not self._iniciado:
+                await self.broker.iniciar(self._entregar_local)
+                self._iniciado = True
+
+    async def parar(self) -> None:
+        for ligacoes in list(self.rooms.values()):
+            for lig in list(ligacoes):
+                await lig.fechar(1001)
+        self.rooms.clear()
+        if self._desligar:
+            await asyncio.gather(*self._desligar, return_exceptions=True)
+        if self._iniciado:
+            await self.broker.parar()
+            self._iniciado = False
+
+    async def connect(self, websocket: WebSocket, room: str, user_id: int) -> Ligacao:
+        await self._garantir_inicio()
         await websocket.accept()
-        self.rooms.setdefault(room, set()).add(websocket)
+        lig = Ligacao(websocket, room, user_id)
+        self.rooms.setdefault(room, set()).add(lig)
+        await self._presenca(self.broker.presenca_entrar, lig)
+        return lig
+
+    async def disconnect(self, lig: Ligacao) -> None:
+        ligacoes = self.rooms.get(lig.room)
+        if ligacoes is not None:
+            ligacoes.discard(lig)
+            if not ligacoes:
+                del self.rooms[lig.room]
+        await lig.fechar()
+        await self._presenca(self.broker.presenca_sair, lig)
+
+    async def renovar_presenca(self, lig: Ligacao) -> None:
+        await self._presenca(self.broker.presenca_entrar, lig)
 
-    def disconnect(self, websocket: WebSocket, room: str):
-        self.rooms.get(room, set()).discard(websocket)
+    async def _presenca(self, operacao, lig: Ligacao) -> None:
+        try:
+            await operacao(lig.room, lig.chave)
+        except Exception:
+            logger.warning("Presença: falha a atualizar %s", lig.room, exc_info=True)
+
+    async def online(self, room: str) -> Set[int]:
+        """IDs dos utilizadores com pelo menos um socket aberto na sala."""
+        await self._garantir_inicio()
+        try:
+            partilhada = await self.broker.online(room)
+        except Exception:
+            logger.warning("Presença: broker indisponível, só ligações locais", exc_info=True)
+            partilhada = None
+        if partilhada is not None:
+            return partilhada
+        return {lig.user_id for lig in self.rooms.get(room, ())}
 
     async def broadcast(self, room: str, data: dict):
-        dead = []
-        for ws in self.rooms.get(room, set()):
-            try:
-                await ws.send_json(data)
-            except Exception:
-                dead.append(ws)
-        for ws in dead:
-            self.rooms[room].discard(ws)
+        """Envia `data` a todos os sockets da sala, em todos os workers."""
+        await self._garantir_inicio()
+        try:
+            await self.broker.publicar(room, data)
+        except Exception:
+            # sem broker, pelo menos os clientes deste worker recebem
+            logger.exception("Broker indisponível; entrega só local na sala %s", room)
+            await self._entregar_local(room, data)
+
+    async def _entregar_local(self, room: str, data: dict) -> None:
+        lentas = [lig for lig in list(self.rooms.get(room, ())) if not lig.enviar(data)]
+        for lig in lentas:
+            # fila cheia: o cliente não acompanha; fecha para ele reconectar
+            logger.info("WebSocket lento desligado (utilizador %s, %s)", lig.user_id, room)
+            tarefa = asyncio.create_task(self.disconnect(lig))
+            self._desligar.add(tarefa)
+            tarefa.add_done_callback(self._desligar.discard)
 
 manager = ConnectionManager()
 
 
 async def clinic_chat_ws(websocket: WebSocket, clinica_id: int, user_id: int):
     room = f"clinica-{clinica_id}"
-    await manager.connect(websocket, room)
+    lig = await manager.connect(websocket, room, user_id)
+    intervalo = settings.MENSAGENS_WS_PING_SECONDS
+    ping_pendente = False
+    presenca_em = time.monotonic()
     try:
-        while True:
-            await asyncio.sleep(60)  # ping noop para manter ligação
-    except WebSocketDisconnect:
-        manager.disconnect(websocket, room)
+        while not lig.fechada.is_set():
+            try:
+                frame = await asyncio.wait_for(websocket.receive(), intervalo)
+            except asyncio.TimeoutError:
+                if ping_pendente:
+                    break  # não respondeu ao ping anterior: ligação morta
+                ping_pendente = True
+                lig.enviar({"tipo": "ping"})
+                frame = None
+            else:
+                if frame["type"] == "websocket.disconnect":
+                    break
+                ping_pendente = False  # qualquer frame do cliente prova que está vivo
+                if _e_ping(frame.get("text")):
+                    lig.enviar({"tipo": "pong"})
+
+            if time.monotonic() - presenca_em >= intervalo:
+                presenca_em = time.monotonic()
+                await manager.renovar_presenca(lig)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        await manager.disconnect(lig)
+
+
+def _e_ping(texto: Optional[str]) -> bool:
+    if not texto:
+        return False
+    try:
+        frame = json.loads(texto)
+    except ValueError:
+        return False
+    return isinstance(frame, dict) and frame.get("tipo") == "ping"
@@ -1,7 +1,7 @@
 # src/orcamento/router.py
 from fastapi import APIRouter, Depends, status, Query
 from sqlalchemy.orm import Session
-from src.database import SessionLocal
+from src.database import get_db
 from typing import List, Optional
 from datetime import date
 
@@ -18,13 +18,6 @@ from src.orcamento.schemas import (
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # ─────────────────────────────────────────────────────────────
 #   Cabeçalho do orçamento
 # ─────────────────────────────────────────────────────────────
@@ -9,6 +9,7 @@ from sqlalchemy import (
     Date,
     DateTime,
     ForeignKey,
+    Index,
     func,
 )
 from sqlalchemy.orm import relationship
@@ -30,6 +31,10 @@ from sqlalchemy.dialects.postgresql import JSONB
 # ---------- PACIENTE ----------
 class Paciente(Base):
     __tablename__ = "Paciente"
+    __table_args__ = (
+        # Listagem por clínica ordenada por nome (paginação keyset)
+        Index("ix_paciente_clinica_nome", "clinica_id", "nome", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     clinica_id = Column(Integer, ForeignKey("Clinica.id"), nullable=False)
@@ -83,6 +88,9 @@ class Paciente(Base):
 
 class FichaClinica(Base):
     __tablename__ = "FichaClinica"
+    __table_args__ = (
+        Index("ix_fichaclinica_paciente_id", "paciente_id"),
+    )
 
     id = Column(Integer, primary_key=True)
     paciente_id = Column(Integer, ForeignKey("Paciente.id"), nullable=False)
@@ -172,6 +180,9 @@ class FicheiroClinico(Base):
 # ---------- PLANO DE TRATAMENTO ----------
 class PlanoTratamento(Base):
     __tablename__ = "PlanoTratamento"
+    __table_args__ = (
+        Index("ix_planotratamento_paciente_estado", "paciente_id", "estado"),
+    )
     id              = Column(Integer, primary_key=True, index=True)
     paciente_id     = Column(Integer, ForeignKey("Paciente.id"), nullable=False)
     data_criacao    = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status, File, Form, UploadFile, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
-from src.database import SessionLocal
+from src.database import get_async_db, get_db
 from src.utilizadores.dependencies import get_current_user
 from src.utilizadores.utils import is_master_admin
 from src.utilizadores.models import Utilizador
@@ -16,16 +17,6 @@ import os
 router = APIRouter()
 
 
-# ---------- DEPENDÊNCIA DB ----------
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-
 @router.get(
     "/template",
     response_model=List[template.Pergunta],
@@ -72,36 +63,59 @@ def criar_paciente(
     response_model=list[schemas.PacienteListItemResponse],
     summary="Listar pacientes da clínica"
 )
-def listar_pacientes_endpoint(
+async def listar_pacientes_endpoint(
     clinica_id: int,
-    db: Session = Depends(get_db),
+    limit: Optional[int] = Query(None, gt=0, le=500, description="Máximo de pacientes a devolver"),
+    offset: int = Query(0, ge=0, description="Número de pacientes a saltar"),
+    after_nome: Optional[str] = Query(None, description="Keyset: nome do último paciente da página anterior"),
+    after_id: Optional[int] = Query(None, description="Keyset: ID do último paciente da página anterior"),
+    db: AsyncSession = Depends(get_async_db),
     utilizador_atual: Utilizador = Depends(get_current_user),
 ):
+    """
+    Lista os pacientes da clínica, ordenados por nome.
+    Suporta paginação por `limit`/`offset` ou keyset (`after_nome` + `after_id`).
+    """
     # (perm checks se precisares)
-    return service.listar_pacientes(db, clinica_id)
+    if (after_nome is None) != (after_id is None):
+        raise HTTPException(
+            status_code=400,
+            detail="Paginação keyset requer 'after_nome' e 'after_id' em conjunto."
+        )
+    return await service.listar_pacientes_async(
+        db,
+        clinica_id,
+        limit=limit,
+        offset=offset,
+        after_nome=after_nome,
+        after_id=after_id,
+    )
 
 @router.get("/search", response_model=list[schemas.PacienteMinimalResponse])
 def buscar_pacientes_endpoint(
     q: str,
     clinica_id: Optional[int] = None,
+    limit: int = Query(10, gt=0, le=50),
     db: Session = Depends(get_db),
     utilizador_atual: Utilizador = Depends(get_current_user),
 ):
     """
-    Busca pacientes pelo nome para uso em campos de autocompletar.
+    Busca pacientes para uso em campos de autocompletar.
+    Procura por nome (ignorando acentos), NIF, telefone,
+    número de documento ou e-mail, ordenando por relevância.
     """
-    if len(q) < 2:
+    if len(q.strip()) < 2:
         return []
-    return service.buscar_pacientes_por_nome(db, q, clinica_id)
+    return service.buscar_pacientes(db, q, clinica_id, limit)
 
 
 @router.get("/{paciente_id}", response_model=schemas.PacienteResponse)
-def obter_paciente_por_id(
+async def obter_paciente_por_id(
     paciente_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     utilizador_atual: Utilizador = Depends(get_current_user),
 ):
-    return service.obter_paciente(db, paciente_id)
+    return await service.obter_paciente_async(db, paciente_id)
 
 
 @router.put("/{paciente_id}", response_model=schemas.PacienteResponse)
@@ -2,17 +2,20 @@ from datetime import datetime, timedelta
 from typing import List, Optional
 
 from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, selectinload
 
 from src.precos.models import Preco
+from src.artigos.models import ArtigoMedico
 from src.pacientes import models, schemas
 from src.auditoria.utils import registrar_auditoria
-from sqlalchemy import func
+from sqlalchemy import case, func, literal, or_, select, tuple_
 from src.consultas.models import Consulta, ConsultaItem
 from datetime import datetime
 import os
 import uuid
 import shutil
+import unicodedata
 from fastapi import UploadFile
 
 
@@ -49,105 +52,189 @@ def criar_paciente(
 
 
 
-def listar_pacientes(db: Session, clinica_id: int):
+def _select_listagem_pacientes(
+    clinica_id: int,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    after_nome: Optional[str] = None,
+    after_id: Optional[int] = None,
+):
     """
-    Lista todos os pacientes de uma clínica com informações resumidas:
-    - Total de consultas
-    - Número de planos ativos
-    - Indicação se tem ficha clínica
-    - Próxima consulta agendada
+    SELECT da listagem de pacientes com os campos derivados calculados
+    por subqueries correlacionadas. Partilhado pelas versões sync e async.
     """
-   
-    
-    # Buscar pacientes da clínica
-    pacientes = (
-        db.query(models.Paciente)
-          .options(selectinload(models.Paciente.clinica))
-          .filter_by(clinica_id=clinica_id)
-          .order_by(models.Paciente.nome)
-          .all()
+    agora = datetime.now()
+
+    total_consultas = (
+        select(func.count(Consulta.id))
+        .where(Consulta.paciente_id == models.Paciente.id)
+        .correlate(models.Paciente)
+        .scalar_subquery()
     )
-    
-    # Enriquecer com dados derivados
-    for paciente in pacientes:
-        # Contar consultas
-        paciente.total_consultas = (
-            db.query(func.count(Consulta.id))
-            .filter(Consulta.paciente_id == paciente.id)
-            .scalar() or 0
+    planos_ativos = (
+        select(func.count(models.PlanoTratamento.id))
+        .where(
+            models.PlanoTratamento.paciente_id == models.Paciente.id,
+            models.PlanoTratamento.estado == "em_curso",
         )
-        
-        # Contar planos ativos
-        paciente.planos_ativos = (
-            db.query(func.count(models.PlanoTratamento.id))
-            .filter(
-                models.PlanoTratamento.paciente_id == paciente.id,
-                models.PlanoTratamento.estado == "em_curso"
-            )
-            .scalar() or 0
+        .correlate(models.Paciente)
+        .scalar_subquery()
+    )
+    tem_ficha_clinica = (
+        select(models.FichaClinica.id)
+        .where(models.FichaClinica.paciente_id == models.Paciente.id)
+        .correlate(models.Paciente)
+        .exists()
+    )
+    proxima_consulta_id = (
+        select(Consulta.id)
+        .where(
+            Consulta.paciente_id == models.Paciente.id,
+            Consulta.estado == "agendada",
+            Consulta.data_inicio > agora,
         )
-        
-        # Verificar se tem ficha clínica
-        paciente.tem_ficha_clinica = (
-            db.query(models.FichaClinica)
-            .filter(models.FichaClinica.paciente_id == paciente.id)
-            .first() is not None
+        .order_by(Consulta.data_inicio)
+        .limit(1)
+        .correlate(models.Paciente)
+        .scalar_subquery()
+    )
+
+    stmt = (
+        select(
+            models.Paciente,
+            total_consultas.label("total_consultas"),
+            planos_ativos.label("planos_ativos"),
+            tem_ficha_clinica.label("tem_ficha_clinica"),
+            proxima_consulta_id.label("proxima_consulta_id"),
         )
-        
-        # Buscar próxima consulta
-        paciente.proxima_consulta = (
-            db.query(Consulta)
-            .filter(
-                Consulta.paciente_id == paciente.id,
-                Consulta.estado == "agendada",
-                Consulta.data_inicio > datetime.now()
-            )
-            .order_by(Consulta.data_inicio)
-            .first()
+        .where(models.Paciente.clinica_id == clinica_id)
+    )
+
+    if after_nome is not None and after_id is not None:
+        stmt = stmt.where(
+            tuple_(models.Paciente.nome, models.Paciente.id) > tuple_(after_nome, after_id)
         )
-    
+
+    stmt = stmt.order_by(models.Paciente.nome, models.Paciente.id)
+    if offset:
+        stmt = stmt.offset(offset)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def _select_proximas_consultas(consulta_ids: List[int]):
+    return (
+        select(Consulta)
+        .options(
+            selectinload(Consulta.medico),
+            selectinload(Consulta.entidade),
+            selectinload(Consulta.itens),
+        )
+        .where(Consulta.id.in_(consulta_ids))
+    )
+
+
+def _montar_listagem(linhas, consultas) -> List[models.Paciente]:
+    consultas_por_id = {c.id: c for c in consultas}
+    pacientes = []
+    for linha in linhas:
+        paciente = linha.Paciente
+        paciente.total_consultas = linha.total_consultas or 0
+        paciente.planos_ativos = linha.planos_ativos or 0
+        paciente.tem_ficha_clinica = bool(linha.tem_ficha_clinica)
+        paciente.proxima_consulta = consultas_por_id.get(linha.proxima_consulta_id)
+        pacientes.append(paciente)
     return pacientes
 
-def obter_paciente(db: Session, paciente_id: int) -> models.Paciente:
+
+def listar_pacientes(
+    db: Session,
+    clinica_id: int,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    after_nome: Optional[str] = None,
+    after_id: Optional[int] = None,
+):
     """
-    Recupera um paciente pelo ID com todas as suas relações:
-    - Fichas clínicas com anotações e ficheiros
-    - Planos de tratamento com itens
-    - Consultas com itens
+    Lista os pacientes de uma clínica com informações resumidas:
+    - Total de consultas
+    - Número de planos ativos
+    - Indicação se tem ficha clínica
     - Próxima consulta agendada
+
+    Os campos derivados são calculados numa única query (subqueries
+    correlacionadas), e as próximas consultas são carregadas de uma só vez,
+    em vez de 4 queries por paciente.
+
+    Paginação:
+    - `limit`/`offset` clássico;
+    - keyset: `after_nome` + `after_id` devolvem os pacientes a seguir ao
+      último da página anterior (ordem `nome, id`).
     """
-    
-    paciente = (
-        db.query(models.Paciente)
-          .options(
-              # Fichas clínicas e seus relacionamentos
-              selectinload(models.Paciente.fichas)
-                .selectinload(models.FichaClinica.anotacoes),
-              selectinload(models.Paciente.fichas)
-                .selectinload(models.FichaClinica.ficheiros),
-              # Planos de tratamento e seus itens
-              selectinload(models.Paciente.planos)
-                .selectinload(models.PlanoTratamento.itens)
-                .selectinload(models.PlanoItem.artigo),
-              # Consultas e seus relacionamentos
-              selectinload(models.Paciente.consultas)
-                .selectinload(Consulta.medico), 
-              selectinload(models.Paciente.consultas)
-                .selectinload(Consulta.entidade), 
-              selectinload(models.Paciente.consultas)
-                .selectinload(Consulta.itens)
-                .selectinload(ConsultaItem.artigo),
-              
-              # Clínica
-              selectinload(models.Paciente.clinica)
-          )
-          .filter(models.Paciente.id == paciente_id)
-          .first()
+    stmt = _select_listagem_pacientes(clinica_id, limit, offset, after_nome, after_id)
+    linhas = db.execute(stmt).unique().all()
+
+    # Carregar todas as próximas consultas numa só query
+    consulta_ids = [linha.proxima_consulta_id for linha in linhas if linha.proxima_consulta_id]
+    consultas = []
+    if consulta_ids:
+        consultas = db.execute(_select_proximas_consultas(consulta_ids)).unique().scalars().all()
+
+    return _montar_listagem(linhas, consultas)
+
+
+async def listar_pacientes_async(
+    db: AsyncSession,
+    clinica_id: int,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    after_nome: Optional[str] = None,
+    after_id: Optional[int] = None,
+):
+    """Versão async de `listar_pacientes` (mesmas queries, via asyncpg)."""
+    stmt = _select_listagem_pacientes(clinica_id, limit, offset, after_nome, after_id)
+    linhas = (await db.execute(stmt)).unique().all()
+
+    consulta_ids = [linha.proxima_consulta_id for linha in linhas if linha.proxima_consulta_id]
+    consultas = []
+    if consulta_ids:
+        consultas = (await db.execute(_select_proximas_consultas(consulta_ids))).unique().scalars().all()
+
+    return _montar_listagem(linhas, consultas)
+
+
+def _opcoes_paciente_detalhe():
+    return (
+        # Fichas clínicas e seus relacionamentos
+        selectinload(models.Paciente.fichas)
+          .selectinload(models.FichaClinica.anotacoes),
+        selectinload(models.Paciente.fichas)
+          .selectinload(models.FichaClinica.ficheiros),
+        # Planos de tratamento e seus itens
+        selectinload(models.Paciente.planos)
+          .selectinload(models.PlanoTratamento.itens)
+          .selectinload(models.PlanoItem.artigo),
+        # Consultas e seus relacionamentos
+        selectinload(models.Paciente.consultas)
+          .selectinload(Consulta.medico),
+        selectinload(models.Paciente.consultas)
+          .selectinload(Consulta.entidade),
+        selectinload(models.Paciente.consultas)
+          .selectinload(Consulta.itens)
+          .selectinload(ConsultaItem.artigo),
+
+        # Clínica
+        selectinload(models.Paciente.clinica)
     )
-    
-    if not paciente:
-        raise HTTPException(status_code=404, detail="Paciente não encontrado.")
-    
+
+
+def _enriquecer_paciente(paciente: models.Paciente, obter_artigo=None) -> models.Paciente:
+    """
+    Acrescenta os campos virtuais usados pela resposta do detalhe do paciente
+    (descrições em falta, histórico de procedimentos).
+    `obter_artigo(artigo_id)` é usado quando o artigo de um item não foi carregado.
+    """
     procedimentos_historico = []
 
     for plano in paciente.planos:
@@ -187,8 +274,7 @@ def obter_paciente(db: Session, paciente_id: int) -> models.Paciente:
                     setattr(item, 'artigo_codigo', item.artigo.codigo)
                 else:
                     # Se o artigo não estiver carregado, obter diretamente do banco
-                    from src.artigos.models import Artigo
-                    artigo = db.query(Artigo).filter_by(id=item.artigo_id).first()
+                    artigo = obter_artigo(item.artigo_id) if obter_artigo else None
                     if artigo:
                         setattr(item, 'artigo_descricao', artigo.descricao)
                         setattr(item, 'artigo_codigo', artigo.codigo)
@@ -223,22 +309,108 @@ def obter_paciente(db: Session, paciente_id: int) -> models.Paciente:
     setattr(paciente, 'procedimentos_historico', procedimentos_historico)
     
     return paciente
+
+
+def obter_paciente(db: Session, paciente_id: int) -> models.Paciente:
+    """
+    Recupera um paciente pelo ID com todas as suas relações:
+    - Fichas clínicas com anotações e ficheiros
+    - Planos de tratamento com itens
+    - Consultas com itens
+    - Próxima consulta agendada
+    """
     
+    paciente = (
+        db.query(models.Paciente)
+          .options(*_opcoes_paciente_detalhe())
+          .filter(models.Paciente.id == paciente_id)
+          .first()
+    )
+    
+    if not paciente:
+        raise HTTPException(status_code=404, detail="Paciente não encontrado.")
 
+    return _enriquecer_paciente(paciente, lambda artigo_id: db.get(ArtigoMedico, artigo_id))
 
-def buscar_pacientes_por_nome(db: Session, nome_parcial: str, clinica_id: Optional[int] = None):
+
+async def obter_paciente_async(db: AsyncSession, paciente_id: int) -> models.Paciente:
+    """Versão async de `obter_paciente`."""
+    paciente = (
+        await db.execute(
+            select(models.Paciente)
+            .options(*_opcoes_paciente_detalhe())
+            .where(models.Paciente.id == paciente_id)
+        )
+    ).unique().scalar_one_or_none()
+
+    if not paciente:
+        raise HTTPException(status_code=404, detail="Paciente não encontrado.")
+
+    # Artigos em falta já não são carregados aqui (evita I/O implícito numa sessão async)
+    return _enriquecer_paciente(paciente)
+
+
+def _normalizar_termo(termo: str) -> str:
     """
-    Busca pacientes cujo nome contenha o termo de busca.
+    Remove acentos e converte para minúsculas, tal como
+    `f_unaccent(lower(...))` faz do lado da base de dados.
+    """
+    decomposto = unicodedata.normalize("NFKD", termo)
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return sem_acentos.lower().strip()
+
+
+def _escapar_like(termo: str) -> str:
+    return termo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def buscar_pacientes(
+    db: Session,
+    termo: str,
+    clinica_id: Optional[int] = None,
+    limite: int = 10,
+) -> List[models.Paciente]:
+    """
+    Pesquisa de pacientes para autocompletar.
+
+    Procura numa só query por nome (sem acentos, por trigramas), NIF,
+    telefone, número de documento e e-mail, servida pelos índices GIN
+    `pg_trgm` (ver migração `add_pacientes_trgm_search`).
+    Os resultados são ordenados por semelhança com o termo.
     Opcionalmente filtra por clínica.
     """
+    termo_norm = _normalizar_termo(termo)
+    padrao = f"%{_escapar_like(termo_norm)}%"
+
+    nome_norm = func.f_unaccent(func.lower(models.Paciente.nome))
+    identificadores = or_(
+        models.Paciente.nif.ilike(padrao, escape="\\"),
+        models.Paciente.telefone.ilike(padrao, escape="\\"),
+        models.Paciente.numero_documento.ilike(padrao, escape="\\"),
+        models.Paciente.email.ilike(padrao, escape="\\"),
+    )
+    relevancia = func.greatest(
+        func.word_similarity(termo_norm, nome_norm),
+        func.similarity(nome_norm, termo_norm),
+        case((identificadores, 1.0), else_=0.0),
+    )
+
     query = db.query(models.Paciente).filter(
-        models.Paciente.nome.ilike(f"%{nome_parcial}%")
+        or_(
+            nome_norm.like(padrao, escape="\\"),
+            literal(termo_norm).op("<%")(nome_norm),
+            identificadores,
+        )
     )
-    
+
     if clinica_id is not None:
         query = query.filter(models.Paciente.clinica_id == clinica_id)
-    
-    return query.order_by(models.Paciente.nome).limit(10).all()
+
+    return (
+        query.order_by(relevancia.desc(), models.Paciente.nome)
+             .limit(limite)
+             .all()
+    )
 
 def obter_ficha_por_paciente(db: Session, paciente_id: int) -> Optional[models.FichaClinica]:
     """
@@ -0,0 +1,208 @@
+"""
+Cache em disco dos PDFs de faturas e orçamentos.
+
+Gerar um PDF (Jinja2 + WeasyPrint) custa centenas de milissegundos de
+CPU; o contexto que o alimenta custa poucas queries. Por isso cada PDF é
+guardado com o nome `{tipo}_{id}_{hash}.pdf`, em que `hash` é o SHA-256
+do contexto do template (sem `data_geracao`) e da versão dos templates.
+Se o contexto mudar — itens, pagamentos, estado, mas também dados do
+paciente ou da clínica — o hash muda e o PDF volta a ser gerado.
+
+Além disso, quando uma Fatura/Orçamento (ou os seus itens, parcelas e
+pagamentos) é alterada numa sessão SQLAlchemy, os PDFs desse documento
+são apagados no commit, para não ocuparem espaço até serem expulsos.
+
+O tamanho total da pasta é limitado por `PDF_CACHE_MAX_MB`; acima disso
+apagam-se os ficheiros usados há mais tempo (mtime, atualizado em cada
+acerto). A pasta pode ser partilhada pelos vários workers.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.faturacao.models import Fatura, FaturaItem, FaturaPagamento, ParcelaPagamento
+from src.orcamento.models import Orcamento, OrcamentoItem
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = Path(__file__).parent / "templates"
+CACHE_DIR = Path(settings.PDF_CACHE_DIR) if settings.PDF_CACHE_DIR else Path(__file__).parent / "generated_pdfs" / "cache"
+
+# Campos do contexto que não entram no hash (mudam em cada pedido)
+CAMPOS_VOLATEIS = ("data_geracao",)
+
+
+# ---------- Hash do contexto ----------
+@lru_cache(maxsize=1)
+def _versao_templates() -> str:
+    """Muda quando algum template, CSS ou imagem é alterado (lido uma vez por processo)."""
+    partes = [
+        f"{p.relative_to(TEMPLATES_DIR)}:{p.stat().st_mtime_ns}:{p.stat().st_size}"
+        for p in sorted(TEMPLATES_DIR.rglob("*"))
+        if p.is_file()
+    ]
+    return hashlib.sha256("\n".join(partes).encode("utf-8")).hexdigest()
+
+
+def _serializar(valor: Any):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, Enum):
+        return valor.value
+    mapper = inspect(valor, raiseerr=False)
+    if mapper is not None and hasattr(mapper, "mapper"):
+        # objeto ORM (ex.: Clinica): só as colunas contam
+        return {attr.key: getattr(valor, attr.key) for attr in mapper.mapper.column_attrs}
+    return str(valor)
+
+
+def hash_contexto(template: str, context: Dict[str, Any]) -> str:
+    estavel = {k: v for k, v in context.items() if k not in CAMPOS_VOLATEIS}
+    dados = json.dumps(
+        [template, _versao_templates(), estavel],
+        sort_keys=True,
+        default=_serializar,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(dados.encode("utf-8")).hexdigest()
+
+
+# ---------- Cache ----------
+class PdfCache:
+    def __init__(self, pasta: Path, max_bytes: int):
+        self.pasta = pasta
+        self.max_bytes = max_bytes
+        if self.ativo:
+            self.pasta.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def ativo(self) -> bool:
+        return self.max_bytes > 0
+
+    def _caminho(self, tipo: str, doc_id: int, chave: str) -> Path:
+        return self.pasta / f"{tipo}_{doc_id}_{chave}.pdf"
+
+    def obter(self, tipo: str, doc_id: int, chave: str) -> Optional[bytes]:
+        if not self.ativo:
+            return None
+        caminho = self._caminho(tipo, doc_id, chave)
+        try:
+            pdf = caminho.read_bytes()
+            os.utime(caminho)  # marca como usado recentemente (LRU)
+        except OSError:
+            return None
+        return pdf
+
+    def caminho(self, tipo: str, doc_id: int, chave: str) -> Optional[Path]:
+        """Ficheiro do PDF no cache (sem o ler), ou None se não existir."""
+        if not self.ativo:
+            return None
+        caminho = self._caminho(tipo, doc_id, chave)
+        try:
+            os.utime(caminho)
+        except OSError:
+            return None
+        return caminho
+
+    def guardar(self, tipo: str, doc_id: int, chave: str, pdf: bytes) -> Optional[Path]:
+        if not self.ativo:
+            return None
+        caminho = self._caminho(tipo, doc_id, chave)
+        try:
+            # escrever ao lado e renomear: outro worker nunca lê um PDF a meio
+            fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=str(self.pasta))
+            with os.fdopen(fd, "wb") as f:
+                f.write(pdf)
+            os.replace(tmp, caminho)
+        except OSError:
+            logger.warning("Não foi possível guardar %s no cache de PDFs", caminho.name, exc_info=True)
+            return None
+        # versões anteriores do mesmo documento já não servem
+        for antigo in self.pasta.glob(f"{tipo}_{doc_id}_*.pdf"):
+            if antigo != caminho:
+                antigo.unlink(missing_ok=True)
+        self._expulsar(manter=caminho)
+        return caminho
+
+    def _expulsar(self, manter: Path) -> None:
+        ficheiros = []
+        total = 0
+        for p in self.pasta.glob("*.pdf"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            ficheiros.append((st.st_mtime, st.st_size, p))
+            total += st.st_size
+        if total <= self.max_bytes:
+            return
+        for _, tamanho, p in sorted(ficheiros):
+            if total <= self.max_bytes:
+                break
+            if p == manter:
+                continue
+            p.unlink(missing_ok=True)
+            total -= tamanho
+
+    def invalidar(self, tipo: str, doc_id: int) -> None:
+        if not self.ativo:
+            return
+        for p in self.pasta.glob(f"{tipo}_{doc_id}_*.pdf"):
+            p.unlink(missing_ok=True)
+
+    def limpar(self) -> None:
+        if not self.ativo:
+            return
+        for p in self.pasta.glob("*.pdf"):
+            p.unlink(missing_ok=True)
+
+
+pdf_cache = PdfCache(CACHE_DIR, settings.PDF_CACHE_MAX_MB * 1024 * 1024)
+
+
+# ---------- Invalidação ao gravar Faturas / Orçamentos ----------
+def _documento(obj) -> Optional[tuple[str, int]]:
+    if isinstance(obj, Fatura):
+        return "fatura", obj.id
+    if isinstance(obj, (FaturaItem, ParcelaPagamento, FaturaPagamento)):
+        return "fatura", obj.fatura_id
+    if isinstance(obj, Orcamento):
+        return "orcamento", obj.id
+    if isinstance(obj, OrcamentoItem):
+        return "orcamento", obj.orcamento_id
+    return None
+
+
+@event.listens_for(Session, "after_flush")
+def _recolher_alterados(session: Session, flush_context) -> None:
+    # depois do flush os objetos novos já têm id; new/dirty/deleted ainda
+    # mostram o estado de antes do flush
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        doc = _documento(obj)
+        if doc is not None and doc[1] is not None:
+            session.info.setdefault("pdf_invalidar", set()).add(doc)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_alterados(session: Session) -> None:
+    for tipo, doc_id in session.info.pop("pdf_invalidar", ()):
+        pdf_cache.invalidar(tipo, doc_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_alterados(session: Session) -> None:
+    session.info.pop("pdf_invalidar", None)
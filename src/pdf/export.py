@@ -0,0 +1,248 @@
+"""
+Exportação de faturas em PDF para um único ZIP (POST /pdf/faturas/export).
+
+O pedido só escolhe as faturas e devolve o id do job; o trabalho corre
+numa thread do próprio worker:
+
+* as faturas são lidas em lotes de `PDF_EXPORT_BATCH_SIZE` com
+  `service.contextos_faturas` (número fixo de queries por lote);
+* os PDFs são gerados em paralelo (`PDF_EXPORT_CONCURRENCY` de cada vez)
+  pelo pool de renderização e pelo cache de PDFs, e cada um é escrito no
+  ZIP em disco assim que fica pronto — em memória nunca está mais do que
+  um lote;
+* o estado (total, concluídos, falhados) fica num `estado.json` ao lado do
+  ZIP, para que qualquer worker responda ao polling e ao download; é
+  regravado a cada PDF e, enquanto um PDF demora, a cada
+  `INTERVALO_HEARTBEAT` segundos.
+
+Os jobs ficam em `generated_pdfs/exports/<id>/` e são apagados ao fim de
+`PDF_EXPORT_TTL_HOURS`.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.core.datas import intervalo_dias
+from src.database import SessionLocal
+from src.faturacao.models import Fatura, FaturaEstado
+from src.pacientes.models import Paciente
+from src.pdf import service
+from src.pdf.schemas import FaturaExportRequest
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = service.PDF_TMP_DIR / "exports"
+
+# Um job "em_curso" sem progresso há mais do que isto morreu com o worker
+JOB_SEM_PROGRESSO = timedelta(minutes=10)
+
+# Enquanto espera por um PDF (ex.: pool ocupado), o job regrava o estado
+# com esta frequência, para não parecer parado
+INTERVALO_HEARTBEAT = 60
+
+# Tentativas quando o pool de renderização está cheio (503)
+MAX_TENTATIVAS_OCUPADO = 30
+
+
+# ---------- Estado em disco ----------
+def _pasta(job_id: str) -> Path:
+    # o id vem do URL: só aceitamos o formato gerado por `criar_job`
+    try:
+        return EXPORT_DIR / uuid.UUID(job_id).hex
+    except ValueError:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Exportação não encontrada")
+
+
+def _gravar_estado(pasta: Path, estado: Dict[str, Any]) -> None:
+    estado["atualizado_em"] = datetime.now(timezone.utc).isoformat()
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=str(pasta))
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(estado, f)
+    os.replace(tmp, pasta / "estado.json")
+
+
+def _ler_estado(pasta: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(pasta / "estado.json", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _purgar_antigos() -> None:
+    limite = time.time() - settings.PDF_EXPORT_TTL_HOURS * 3600
+    for pasta in EXPORT_DIR.iterdir():
+        try:
+            if pasta.stat().st_mtime < limite:
+                shutil.rmtree(pasta, ignore_errors=True)
+        except OSError:
+            continue
+
+
+# ---------- Criação ----------
+def _ids_faturas(db: Session, filtros: FaturaExportRequest) -> List[int]:
+    desde, ate = intervalo_dias(filtros.data_inicio, filtros.data_fim)
+    q = db.query(Fatura.id).filter(
+        Fatura.data_emissao >= desde,
+        Fatura.data_emissao < ate,
+    )
+    if filtros.paciente_id is not None:
+        q = q.filter(Fatura.paciente_id == filtros.paciente_id)
+    if filtros.clinica_id is not None:
+        q = q.join(Paciente, Paciente.id == Fatura.paciente_id).filter(
+            Paciente.clinica_id == filtros.clinica_id
+        )
+    if filtros.estado is not None:
+        q = q.filter(Fatura.estado == FaturaEstado(filtros.estado.value))
+    return [fid for (fid,) in q.order_by(Fatura.data_emissao, Fatura.id)]
+
+
+def criar_job(db: Session, filtros: FaturaExportRequest, utilizador_id: int) -> Dict[str, Any]:
+    if filtros.data_fim < filtros.data_inicio:
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            "data_fim não pode ser anterior a data_inicio",
+        )
+    ids = _ids_faturas(db, filtros)
+    if len(ids) > settings.PDF_EXPORT_MAX_FATURAS:
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            f"A exportação tem {len(ids)} faturas; o máximo é "
+            f"{settings.PDF_EXPORT_MAX_FATURAS}. Reduza o intervalo.",
+        )
+
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    _purgar_antigos()
+    job_id = uuid.uuid4().hex
+    pasta = EXPORT_DIR / job_id
+    pasta.mkdir()
+    estado = {
+        "id": job_id,
+        "utilizador_id": utilizador_id,
+        "estado": "em_curso",
+        "total": len(ids),
+        "concluidos": 0,
+        "falhados": [],
+        "erro": None,
+        "criado_em": datetime.now(timezone.utc).isoformat(),
+        "concluido_em": None,
+    }
+    _gravar_estado(pasta, estado)
+
+    threading.Thread(
+        target=_executar_job,
+        args=(pasta, estado, ids),
+        name=f"pdf-export-{job_id[:8]}",
+        daemon=True,
+    ).start()
+    return estado
+
+
+# ---------- Execução ----------
+def _gerar_pdf(fatura_id: int, context: Dict[str, Any]) -> bytes:
+    for _ in range(MAX_TENTATIVAS_OCUPADO):
+        try:
+            return service.render_pdf_cached("fatura", fatura_id, "fatura.html", context)
+        except HTTPException as exc:
+            # pool cheio: o job cede a vez aos pedidos interativos
+            if exc.status_code != status.HTTP_503_SERVICE_UNAVAILABLE:
+                raise
+            time.sleep(int((exc.headers or {}).get("Retry-After", 1)))
+    raise RuntimeError("pool de renderização continuamente ocupado")
+
+
+def _aguardar(futuro: Future, pasta: Path, estado: Dict[str, Any]) -> bytes:
+    """Espera pelo PDF, regravando o estado (heartbeat) enquanto não chega."""
+    while True:
+        try:
+            return futuro.result(timeout=INTERVALO_HEARTBEAT)
+        except FuturesTimeoutError:
+            _gravar_estado(pasta, estado)
+
+
+def _executar_job(pasta: Path, estado: Dict[str, Any], ids: List[int]) -> None:
+    parcial = pasta / "faturas.zip.part"
+    db = SessionLocal()
+    try:
+        with zipfile.ZipFile(parcial, "w", compression=zipfile.ZIP_STORED) as zf, \
+                ThreadPoolExecutor(max_workers=settings.PDF_EXPORT_CONCURRENCY) as ex:
+            for i in range(0, len(ids), settings.PDF_EXPORT_BATCH_SIZE):
+                lote = ids[i:i + settings.PDF_EXPORT_BATCH_SIZE]
+                contextos = service.contextos_faturas(lote, db)
+                db.expunge_all()  # o lote seguinte não precisa destes objetos
+
+                futuros = {
+                    fid: ex.submit(_gerar_pdf, fid, contextos[fid])
+                    for fid in lote
+                    if fid in contextos
+                }
+                for fid in lote:
+                    futuro = futuros.get(fid)
+                    try:
+                        if futuro is None:
+                            raise LookupError("fatura apagada entretanto")
+                        # PDFs já comprimidos: ZIP_STORED
+                        zf.writestr(f"fatura_{fid}.pdf", _aguardar(futuro, pasta, estado))
+                        estado["concluidos"] += 1
+                    except Exception as exc:
+                        logger.warning("Exportação %s: fatura %s falhou (%s)", estado["id"], fid, exc)
+                        estado["falhados"].append(fid)
+                    # progresso por PDF: `obter_job` vê o job vivo mesmo com lotes lentos
+                    _gravar_estado(pasta, estado)
+
+            if estado["falhados"]:
+                zf.writestr(
+                    "erros.txt",
+                    "Faturas que não foi possível gerar:\n"
+                    + "\n".join(str(fid) for fid in estado["falhados"]) + "\n",
+                )
+
+        os.replace(parcial, pasta / "faturas.zip")
+        estado["estado"] = "concluido"
+    except Exception as exc:
+        logger.exception("Exportação %s falhou", estado["id"])
+        estado["estado"] = "erro"
+        estado["erro"] = str(exc)
+        parcial.unlink(missing_ok=True)
+    finally:
+        db.close()
+        estado["concluido_em"] = datetime.now(timezone.utc).isoformat()
+        _gravar_estado(pasta, estado)
+
+
+# ---------- Consulta ----------
+def obter_job(job_id: str, utilizador_id: int) -> Dict[str, Any]:
+    pasta = _pasta(job_id)
+    estado = _ler_estado(pasta)
+    if estado is None or estado.get("utilizador_id") != utilizador_id:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Exportação não encontrada")
+    if estado["estado"] == "em_curso":
+        atualizado_em = datetime.fromisoformat(estado["atualizado_em"])
+        if datetime.now(timezone.utc) - atualizado_em > JOB_SEM_PROGRESSO:
+            estado["estado"] = "erro"
+            estado["erro"] = "A exportação foi interrompida (reinício do servidor?)."
+    return estado
+
+
+def caminho_zip(job_id: str, utilizador_id: int) -> Path:
+    estado = obter_job(job_id, utilizador_id)
+    if estado["estado"] != "concluido":
+        raise HTTPException(
+            status.HTTP_409_CONFLICT,
+            f"A exportação ainda não está pronta (estado: {estado['estado']}).",
+        )
+    return _pasta(job_id) / "faturas.zip"
@@ -0,0 +1,224 @@
+"""
+Renderização HTML → PDF (WeasyPrint) fora das threads do worker.
+
+O WeasyPrint ocupa o CPU durante centenas de milissegundos por documento.
+Os pedidos são enviados para um pool de processos dedicado e limitado
+(`PDF_RENDER_WORKERS`); se já houver demasiados à espera
+(`PDF_RENDER_MAX_PENDING`) responde-se 503 em vez de deixar a fila
+crescer. Cada documento tem `PDF_RENDER_TIMEOUT_SECONDS` para ficar
+pronto, contados a partir do momento em que o pool o começa a processar
+(o tempo na fila não conta): se passar disso responde-se 504 e o pool é
+reciclado, porque um processo do pool não pode ser interrompido a meio de
+uma tarefa. Os documentos que ainda estavam na fila desse pool recebem
+503 e podem ser pedidos de novo.
+
+Este módulo é importado pelos processos do pool, por isso só depende da
+configuração e do WeasyPrint.
+
+Com `PDF_RENDER_WORKERS=0` o PDF é gerado no próprio processo.
+"""
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import (
+    CancelledError as FuturesCancelledError,
+    Future,
+    ProcessPoolExecutor,
+    TimeoutError as FuturesTimeoutError,
+)
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from weasyprint import HTML, CSS
+from weasyprint.text.fonts import FontConfiguration
+
+from src.core.config import settings
+
+TEMPLATES_DIR = Path(__file__).parent / "templates"
+ASSETS_DIR = TEMPLATES_DIR / "assets"
+
+
+# ---------- Funções executadas nos processos do pool ----------
+# Cada processo prepara uma vez a configuração de fontes e as folhas de
+# estilo, e guarda as imagens (logótipo) já descodificadas em memória.
+_cache_imagens: dict = {}
+
+
+@lru_cache(maxsize=1)
+def _font_config() -> FontConfiguration:
+    return FontConfiguration()
+
+
+@lru_cache(maxsize=None)
+def _css(css_name: str) -> CSS:
+    css_path = ASSETS_DIR / css_name
+    if not css_path.exists():
+        raise FileNotFoundError(f"CSS não encontrado: {css_path}")
+    return CSS(filename=str(css_path), font_config=_font_config())
+
+
+def _renderizar(html: str, css_files: List[str]) -> bytes:
+    styles = [_css(css_name) for css_name in css_files]
+    return HTML(string=html, base_url=str(TEMPLATES_DIR)).write_pdf(
+        stylesheets=styles,
+        font_config=_font_config(),
+        cache=_cache_imagens,
+    )
+
+
+def _preparar(css_files: tuple = ("styles.css",)) -> None:
+    """Aquece o processo: fontes, CSS e logótipo ficam prontos antes do 1.º pedido."""
+    logo = ASSETS_DIR / "logo.png"
+    html = f'<img src="{logo.as_uri()}">' if logo.exists() else "<p></p>"
+    try:
+        _renderizar(html, list(css_files))
+    except Exception:
+        # o erro volta a aparecer (e é reportado) no primeiro pedido real
+        pass
+
+
+# ---------- Pool ----------
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+# Sem pool, as threads do worker partilham as fontes e o CSS preparados
+_render_local_lock = threading.Lock()
+_pendentes = threading.BoundedSemaphore(
+    max(1, settings.PDF_RENDER_WORKERS) + settings.PDF_RENDER_MAX_PENDING
+)
+
+
+def _obter_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: o processo principal tem threads (uvicorn, pool da BD)
+                _pool = ProcessPoolExecutor(
+                    max_workers=settings.PDF_RENDER_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_preparar,
+                )
+    return _pool
+
+
+def encerrar_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _reciclar_pool(pool: ProcessPoolExecutor) -> None:
+    """Mata os processos de um pool com uma tarefa presa e deixa criar outro."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    # Os outros documentos em curso neste pool recebem BrokenProcessPool (503)
+    for proc in list(getattr(pool, "_processes", {}).values()):
+        proc.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _renderizar_local(html: str, css_files: List[str]) -> bytes:
+    with _render_local_lock:
+        return _renderizar(html, css_files)
+
+
+def _reservar() -> None:
+    if not _pendentes.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Demasiados PDFs em geração. Tente novamente dentro de instantes.",
+            headers={"Retry-After": "5"},
+        )
+
+
+def _expirou() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        detail=f"A geração do PDF excedeu {settings.PDF_RENDER_TIMEOUT_SECONDS} s.",
+    )
+
+
+def _pool_perdido() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="O gerador de PDFs foi reiniciado. Tente novamente.",
+        headers={"Retry-After": "1"},
+    )
+
+
+# O executor marca o futuro como "running" quando o passa aos processos;
+# até lá está na fila e o limite de tempo ainda não conta.
+INTERVALO_FILA = 0.05
+
+
+def _na_fila(futuro: Future) -> bool:
+    return not (futuro.running() or futuro.done())
+
+
+# ---------- API ----------
+def render_pdf(html: str, css_files: Optional[List[str]] = None) -> bytes:
+    """Gera o PDF no pool e bloqueia a thread atual até estar pronto."""
+    css = list(css_files or [])
+    _reservar()
+    try:
+        if settings.PDF_RENDER_WORKERS <= 0:
+            return _renderizar_local(html, css)
+        pool = _obter_pool()
+        futuro = pool.submit(_renderizar, html, css)
+        while _na_fila(futuro):
+            time.sleep(INTERVALO_FILA)
+        try:
+            return futuro.result(timeout=settings.PDF_RENDER_TIMEOUT_SECONDS)
+        except FuturesTimeoutError:
+            _reciclar_pool(pool)
+            raise _expirou()
+        except BrokenProcessPool:
+            _reciclar_pool(pool)
+            raise _pool_perdido()
+        except FuturesCancelledError:
+            # cancelado na fila: outro pedido reciclou o pool
+            raise _pool_perdido()
+    finally:
+        _pendentes.release()
+
+
+async def render_pdf_async(html: str, css_files: Optional[List[str]] = None) -> bytes:
+    """Igual a `render_pdf`, mas espera no event loop sem ocupar uma thread."""
+    css = list(css_files or [])
+    _reservar()
+    try:
+        if settings.PDF_RENDER_WORKERS <= 0:
+            return await run_in_threadpool(_renderizar_local, html, css)
+        pool = _obter_pool()
+        futuro = pool.submit(_renderizar, html, css)
+        while _na_fila(futuro):
+            await asyncio.sleep(INTERVALO_FILA)
+        if futuro.cancelled():
+            raise _pool_perdido()
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(futuro), settings.PDF_RENDER_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            _reciclar_pool(pool)
+            raise _expirou()
+        except BrokenProcessPool:
+            _reciclar_pool(pool)
+            raise _pool_perdido()
+        except asyncio.CancelledError:
+            # o futuro foi cancelado porque outro pedido reciclou o pool,
+            # não porque este pedido foi cancelado
+            if futuro.cancelled() and not asyncio.current_task().cancelling():
+                raise _pool_perdido()
+            raise
+    finally:
+        _pendentes.release()
@@ -1,8 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Response, Query
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
-from src.database import SessionLocal
+from src.database import get_db
 from src.utilizadores.dependencies import get_current_user
+from src.pdf import export as pdf_export
 from src.pdf import service as pdf_service
+from src.pdf.schemas import FaturaExportJob, FaturaExportRequest
 from typing import Optional
 
 router = APIRouter(
@@ -10,12 +13,16 @@ router = APIRouter(
     tags=["PDF"]
 )
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+
+def _pdf_response(pdf_bytes: bytes, filename: str, download: bool) -> Response:
+    # Set appropriate headers based on download parameter
+    disposition = "attachment" if download else "inline"
+    return Response(
+        content=pdf_bytes,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f"{disposition}; filename={filename}"},
+    )
+
 
 @router.get("/orcamento/{orcamento_id}")
 def get_orcamento_pdf(
@@ -30,27 +37,39 @@ def get_orcamento_pdf(
     """
     try:
         pdf_bytes = pdf_service.generate_orcamento_pdf(orcamento_id, db)
-        
-        # Set appropriate headers based on download parameter
-        headers = {}
-        if download:
-            # For download: use attachment disposition
-            headers["Content-Disposition"] = f"attachment; filename=orcamento_{orcamento_id}.pdf"
-        else:
-            # For viewing: use inline disposition
-            headers["Content-Disposition"] = f"inline; filename=orcamento_{orcamento_id}.pdf"
-        
-        return Response(
-            content=pdf_bytes,
-            media_type="application/pdf",
-            headers=headers
+        return _pdf_response(pdf_bytes, f"orcamento_{orcamento_id}.pdf", download)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error generating orçamento PDF: {str(e)}"
         )
+
+
+@router.get("/orcamento/{orcamento_id}/async")
+async def get_orcamento_pdf_async(
+    orcamento_id: int,
+    download: Optional[bool] = Query(False, description="Set to true to download instead of view"),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """
+    Igual a GET /pdf/orcamento/{id}, mas aguarda o pool de renderização no
+    event loop em vez de ocupar uma thread enquanto o PDF é gerado.
+    """
+    try:
+        pdf_bytes = await pdf_service.generate_orcamento_pdf_async(orcamento_id, db)
+        return _pdf_response(pdf_bytes, f"orcamento_{orcamento_id}.pdf", download)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error generating orçamento PDF: {str(e)}"
         )
 
+
 @router.get("/fatura/{fatura_id}")
 def get_fatura_pdf(
     fatura_id: int,
@@ -64,23 +83,76 @@ def get_fatura_pdf(
     """
     try:
         pdf_bytes = pdf_service.generate_fatura_pdf(fatura_id, db)
-        
-        # Set appropriate headers based on download parameter
-        headers = {}
-        if download:
-            # For download: use attachment disposition
-            headers["Content-Disposition"] = f"attachment; filename=fatura_{fatura_id}.pdf"
-        else:
-            # For viewing: use inline disposition
-            headers["Content-Disposition"] = f"inline; filename=fatura_{fatura_id}.pdf"
-        
-        return Response(
-            content=pdf_bytes,
-            media_type="application/pdf",
-            headers=headers
+        return _pdf_response(pdf_bytes, f"fatura_{fatura_id}.pdf", download)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error generating invoice PDF: {str(e)}"
         )
+
+
+@router.get("/fatura/{fatura_id}/async")
+async def get_fatura_pdf_async(
+    fatura_id: int,
+    download: Optional[bool] = Query(False, description="Set to true to download instead of view"),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """
+    Igual a GET /pdf/fatura/{id}, mas aguarda o pool de renderização no
+    event loop em vez de ocupar uma thread enquanto o PDF é gerado.
+    """
+    try:
+        pdf_bytes = await pdf_service.generate_fatura_pdf_async(fatura_id, db)
+        return _pdf_response(pdf_bytes, f"fatura_{fatura_id}.pdf", download)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error generating invoice PDF: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+# ---------- Exportação de faturas (ZIP) ----------
+@router.post(
+    "/faturas/export",
+    response_model=FaturaExportJob,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def exportar_faturas(
+    filtros: FaturaExportRequest,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """
+    Inicia a exportação dos PDFs das faturas emitidas no intervalo (e,
+    opcionalmente, de uma clínica, paciente ou estado) para um ZIP.
+    Acompanhar em GET /pdf/faturas/export/{job_id} e descarregar em
+    GET /pdf/faturas/export/{job_id}/download quando `estado` = concluido.
+    """
+    return pdf_export.criar_job(db, filtros, current_user.id)
+
+
+@router.get("/faturas/export/{job_id}", response_model=FaturaExportJob)
+def estado_exportacao(
+    job_id: str,
+    current_user = Depends(get_current_user)
+):
+    return pdf_export.obter_job(job_id, current_user.id)
+
+
+@router.get("/faturas/export/{job_id}/download")
+def download_exportacao(
+    job_id: str,
+    current_user = Depends(get_current_user)
+):
+    """Envia o ZIP em blocos, diretamente do disco."""
+    caminho = pdf_export.caminho_zip(job_id, current_user.id)
+    return FileResponse(
+        path=caminho,
+        media_type="application/zip",
+        filename=f"faturas_{job_id[:8]}.zip",
+    )
@@ -0,0 +1,27 @@
+from datetime import date, datetime
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+from src.faturacao.schemas import FaturaEstado
+
+
+# -------------------- Exportação de faturas (ZIP) --------------------
+
+class FaturaExportRequest(BaseModel):
+    data_inicio: date                   = Field(..., description="Data de emissão inicial (inclusive)")
+    data_fim:    date                   = Field(..., description="Data de emissão final (inclusive)")
+    clinica_id:  Optional[int]          = Field(None, description="Só faturas de pacientes desta clínica")
+    paciente_id: Optional[int]          = Field(None, description="Só faturas deste paciente")
+    estado:      Optional[FaturaEstado] = Field(None, description="Só faturas neste estado")
+
+
+class FaturaExportJob(BaseModel):
+    id:           str
+    estado:       Literal["em_curso", "concluido", "erro"]
+    total:        int                = Field(..., description="Número de faturas a exportar")
+    concluidos:   int                = Field(..., description="PDFs já adicionados ao ZIP")
+    falhados:     List[int]          = Field(default_factory=list, description="IDs de faturas cujo PDF falhou")
+    erro:         Optional[str]      = None
+    criado_em:    datetime
+    concluido_em: Optional[datetime] = None
@@ -4,17 +4,18 @@ pdf_service.py  ·  Gerar PDFs (Fatura & Orçamento) com Jinja2 + WeasyPrint
 
 from __future__ import annotations
 
-import os
-import tempfile
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Union
 
 from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from jinja2 import Environment, FileSystemLoader, select_autoescape
-from weasyprint import HTML, CSS
+from sqlalchemy.orm import joinedload, selectinload
 
 from src.clinica.models import Clinica
+from src.pdf.cache import hash_contexto, pdf_cache
+from src.pdf.renderer import render_pdf, render_pdf_async
 
 # ──────────────────────────────────────────────────────────────
 # Configuração global
@@ -68,33 +69,27 @@ def generate_pdf(
     html: str,
     css_files: Optional[List[str]] = None,
 ) -> bytes:
-    """Transforma HTML em PDF, aplicando folhas de estilo opcionais."""
+    """Transforma HTML em PDF (no pool de renderização), aplicando folhas de estilo opcionais."""
     try:
-        # 1) gravar HTML num ficheiro temporário
-        with tempfile.NamedTemporaryFile(
-            suffix=".html", delete=False, dir=str(PDF_TMP_DIR)
-        ) as tmp_html:
-            tmp_html.write(html.encode("utf-8"))
-            html_path = tmp_html.name
-
-        # 2) preparar CSS
-        styles: List[CSS] = []
-        for css_name in (css_files or []):
-            css_path = ASSETS_DIR / css_name
-            if css_path.exists():
-                styles.append(CSS(filename=str(css_path)))
-            else:
-                raise FileNotFoundError(f"CSS não encontrado: {css_path}")
-
-        # 3) gerar PDF
-        pdf_bytes = HTML(filename=html_path, base_url=str(TEMPLATES_DIR)).write_pdf(
-            stylesheets=styles
-        )
+        return render_pdf(html, css_files)
+    except HTTPException:
+        raise
+    except Exception as exc:
+        raise HTTPException(
+            status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao gerar PDF: {exc}",
+        ) from exc
 
-        # 4) limpar ficheiro temporário
-        os.unlink(html_path)
-        return pdf_bytes
 
+async def generate_pdf_async(
+    html: str,
+    css_files: Optional[List[str]] = None,
+) -> bytes:
+    """Como `generate_pdf`, mas aguarda o pool sem ocupar uma thread."""
+    try:
+        return await render_pdf_async(html, css_files)
+    except HTTPException:
+        raise
     except Exception as exc:
         raise HTTPException(
             status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -102,63 +97,101 @@ def generate_pdf(
         ) from exc
 
 
+def render_pdf_cached(
+    tipo: str,
+    doc_id: int,
+    template: str,
+    context: Dict[str, Any],
+) -> bytes:
+    """
+    Devolve o PDF do cache se já houver um gerado com este mesmo contexto;
+    caso contrário renderiza-o e guarda-o.
+    """
+    chave = hash_contexto(template, context)
+    pdf_bytes = pdf_cache.obter(tipo, doc_id, chave)
+    if pdf_bytes is None:
+        html = render_template(template, context)
+        pdf_bytes = generate_pdf(html, css_files=["styles.css"])
+        pdf_cache.guardar(tipo, doc_id, chave, pdf_bytes)
+    return pdf_bytes
+
+
+def render_pdf_cached_ficheiro(
+    tipo: str,
+    doc_id: int,
+    template: str,
+    context: Dict[str, Any],
+) -> Union[Path, bytes]:
+    """
+    Como `render_pdf_cached`, mas devolve o caminho do PDF no cache em vez
+    de o ler (para anexar a e-mails sem copiar). Se o cache estiver
+    desativado ou não for possível guardar, devolve os bytes.
+    """
+    chave = hash_contexto(template, context)
+    caminho = pdf_cache.caminho(tipo, doc_id, chave)
+    if caminho is not None:
+        return caminho
+    html = render_template(template, context)
+    pdf_bytes = generate_pdf(html, css_files=["styles.css"])
+    return pdf_cache.guardar(tipo, doc_id, chave, pdf_bytes) or pdf_bytes
+
+
+def _cache_ou_html(
+    tipo: str,
+    doc_id: int,
+    template: str,
+    context: Dict[str, Any],
+) -> Tuple[str, Optional[bytes], Optional[str]]:
+    """(chave, PDF do cache) se existir; senão (chave, None, HTML renderizado)."""
+    chave = hash_contexto(template, context)
+    pdf_bytes = pdf_cache.obter(tipo, doc_id, chave)
+    if pdf_bytes is not None:
+        return chave, pdf_bytes, None
+    return chave, None, render_template(template, context)
+
+
+async def render_pdf_cached_async(
+    tipo: str,
+    doc_id: int,
+    template: str,
+    context: Dict[str, Any],
+) -> bytes:
+    # hash, leitura do cache e Jinja no threadpool; o WeasyPrint no pool de processos
+    chave, pdf_bytes, html = await run_in_threadpool(_cache_ou_html, tipo, doc_id, template, context)
+    if pdf_bytes is None:
+        pdf_bytes = await generate_pdf_async(html, css_files=["styles.css"])
+        await run_in_threadpool(pdf_cache.guardar, tipo, doc_id, chave, pdf_bytes)
+    return pdf_bytes
+
+
 # ──────────────────────────────────────────────────────────────
 # Funções específicas · Fatura
 # ──────────────────────────────────────────────────────────────
 
-def generate_fatura_pdf(fatura_id: int, db) -> bytes:
-    """Gera PDF para a Fatura indicada."""
-    from src.consultas.models import ConsultaItem
-    from src.pacientes.models import PlanoItem
-    from src.faturacao.service import get_fatura
-    from src.clinica.service import get_clinica_details
-
-    fatura = get_fatura(db, fatura_id)
-    if not fatura:
+def contexto_fatura(fatura_id: int, db) -> Dict[str, Any]:
+    """
+    Carrega a Fatura e monta o contexto do template `fatura.html`, com um
+    número fixo de queries (ver `contextos_faturas`), independentemente do
+    número de itens. Usado pelo PDF e pelo envio por e-mail.
+    """
+    contextos = contextos_faturas([fatura_id], db)
+    if fatura_id not in contextos:
         raise HTTPException(
             status.HTTP_404_NOT_FOUND,
             detail=f"Fatura ID={fatura_id} não encontrada.",
         )
+    return contextos[fatura_id]
 
-    clinica = None
-    if fatura.paciente:
-        # Try to get clinic_id from patient if available
-        paciente_id = fatura.paciente.id
-        paciente_clinica_id = getattr(fatura.paciente, 'clinica_id', None)
-        
-        if paciente_clinica_id:
-            clinica = db.query(Clinica).filter(Clinica.id == paciente_clinica_id).first()
-            print(f"Found clinic {clinica.nome} from patient association")
-
-    # If no clinic found via patient, try consulta or plano
-    if not clinica and fatura.consulta_id and fatura.consulta:
-        consulta_clinica_id = getattr(fatura.consulta, 'clinica_id', None)
-        if consulta_clinica_id:
-            clinica = db.query(Clinica).filter(Clinica.id == consulta_clinica_id).first()
-            print(f"Found clinic {clinica.nome} from consulta association")
-    
-    if not clinica and fatura.plano_id and fatura.plano:
-        plano_clinica_id = getattr(fatura.plano, 'clinica_id', None)
-        if plano_clinica_id:
-            clinica = db.query(Clinica).filter(Clinica.id == plano_clinica_id).first()
-            print(f"Found clinic {clinica.nome} from plano association")
-
-    # Fallback to default clinic if still not found
-    if not clinica:
-        clinica = get_clinica_details(db)
-        print(f"Using default clinic: {clinica.nome}")
 
+def _montar_contexto_fatura(
+    fatura,
+    clinica: Optional[Clinica],
+    dentes: Dict[int, Optional[int]],
+) -> Dict[str, Any]:
+    """Contexto de `fatura.html`; `dentes` mapeia FaturaItem.id → numero_dente da origem."""
     # ── 1. Preparar itens ────────────────────────────────────
     itens = []
     for item in fatura.itens:
-        numero_dente = None
-        if item.origem_tipo == "consulta_item":
-            ci = db.get(ConsultaItem, item.origem_id)
-            numero_dente = getattr(ci, "numero_dente", None)
-        elif item.origem_tipo == "plano_item":
-            pi = db.get(PlanoItem, item.origem_id)
-            numero_dente = getattr(pi, "numero_dente", None)
-
         itens.append(
             {
                 "descricao": item.descricao or f"Item {item.id}",
@@ -166,7 +199,7 @@ def generate_fatura_pdf(fatura_id: int, db) -> bytes:
                 "quantidade": item.quantidade,
                 "preco_unitario": f"{float(item.preco_unitario):.2f}",
                 "total": f"{float(item.total):.2f}",
-                "numero_dente": numero_dente,
+                "numero_dente": dentes.get(item.id),
             }
         )
 
@@ -236,17 +269,99 @@ def generate_fatura_pdf(fatura_id: int, db) -> bytes:
         else None,
     }
 
-    # ── 5. Renderizar & gerar PDF ────────────────────────────
-    html = render_template("fatura.html", context)
-    return generate_pdf(html, css_files=["styles.css"])
+    return context
+
+
+def contextos_faturas(fatura_ids: Sequence[int], db) -> Dict[int, Dict[str, Any]]:
+    """
+    Contextos de várias faturas num número fixo de queries: faturas com
+    itens, parcelas, paciente e consulta; os itens de origem (consulta e
+    plano) e as clínicas são lidos de uma vez para todo o lote.
+    Faturas inexistentes ficam de fora do resultado.
+    """
+    from src.consultas.models import ConsultaItem
+    from src.pacientes.models import PlanoItem
+    from src.faturacao.models import Fatura
+    from src.clinica.service import get_clinica_details
+
+    if not fatura_ids:
+        return {}
+
+    faturas = (
+        db.query(Fatura)
+        .options(
+            selectinload(Fatura.itens),
+            selectinload(Fatura.parcelas),
+            joinedload(Fatura.paciente),
+            joinedload(Fatura.consulta),
+            joinedload(Fatura.plano),
+        )
+        .filter(Fatura.id.in_(list(fatura_ids)))
+        .all()
+    )
+
+    # numero_dente dos itens de origem, por tipo
+    origens: Dict[str, set] = {"consulta_item": set(), "plano_item": set()}
+    for fatura in faturas:
+        for item in fatura.itens:
+            if item.origem_tipo in origens:
+                origens[item.origem_tipo].add(item.origem_id)
+    numero_dente: Dict[str, Dict[int, Optional[int]]] = {"consulta_item": {}, "plano_item": {}}
+    for tipo, modelo in (("consulta_item", ConsultaItem), ("plano_item", PlanoItem)):
+        if origens[tipo]:
+            numero_dente[tipo] = dict(
+                db.query(modelo.id, modelo.numero_dente)
+                .filter(modelo.id.in_(origens[tipo]))
+                .all()
+            )
+
+    # clínica: a do paciente, senão a da consulta, senão a clínica por omissão
+    def _clinica_id(fatura) -> Optional[int]:
+        return (
+            getattr(fatura.paciente, "clinica_id", None)
+            or getattr(fatura.consulta, "clinica_id", None)
+        )
+
+    clinica_ids = {cid for cid in map(_clinica_id, faturas) if cid}
+    clinicas = (
+        {c.id: c for c in db.query(Clinica).filter(Clinica.id.in_(clinica_ids))}
+        if clinica_ids
+        else {}
+    )
+    clinica_omissao = None
+
+    contextos: Dict[int, Dict[str, Any]] = {}
+    for fatura in faturas:
+        clinica = clinicas.get(_clinica_id(fatura))
+        if clinica is None:
+            if clinica_omissao is None:
+                clinica_omissao = get_clinica_details(db)
+            clinica = clinica_omissao
+        dentes = {
+            item.id: numero_dente.get(item.origem_tipo, {}).get(item.origem_id)
+            for item in fatura.itens
+        }
+        contextos[fatura.id] = _montar_contexto_fatura(fatura, clinica, dentes)
+    return contextos
+
+
+def generate_fatura_pdf(fatura_id: int, db) -> bytes:
+    """Gera PDF para a Fatura indicada (ou devolve-o do cache)."""
+    context = contexto_fatura(fatura_id, db)
+    return render_pdf_cached("fatura", fatura_id, "fatura.html", context)
+
+
+async def generate_fatura_pdf_async(fatura_id: int, db) -> bytes:
+    context = await run_in_threadpool(contexto_fatura, fatura_id, db)
+    return await render_pdf_cached_async("fatura", fatura_id, "fatura.html", context)
 
 
 # ──────────────────────────────────────────────────────────────
 # Funções específicas · Orçamento
 # ──────────────────────────────────────────────────────────────
 
-def generate_orcamento_pdf(orcamento_id: int, db) -> bytes:
-    """Gera PDF para Orçamento."""
+def contexto_orcamento(orcamento_id: int, db) -> Dict[str, Any]:
+    """Carrega o Orçamento e monta o contexto do template `orcamento.html`."""
     from src.orcamento.service import get_orcamento
     from src.clinica.service import get_clinica_details
 
@@ -331,5 +446,15 @@ def generate_orcamento_pdf(orcamento_id: int, db) -> bytes:
         else None,
     }
     print(f"Contexto para orçamento {orcamento_id}: {context}")
-    html = render_template("orcamento.html", context)
-    return generate_pdf(html, css_files=["styles.css"])
+    return context
+
+
+def generate_orcamento_pdf(orcamento_id: int, db) -> bytes:
+    """Gera PDF para Orçamento (ou devolve-o do cache)."""
+    context = contexto_orcamento(orcamento_id, db)
+    return render_pdf_cached("orcamento", orcamento_id, "orcamento.html", context)
+
+
+async def generate_orcamento_pdf_async(orcamento_id: int, db) -> bytes:
+    context = await run_in_threadpool(contexto_orcamento, orcamento_id, db)
+    return await render_pdf_cached_async("orcamento", orcamento_id, "orcamento.html", context)
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from src.database import SessionLocal
+from src.database import get_db
 from src.utilizadores.dependencies import get_current_user
 from src.utilizadores.utils import is_master_admin
 import src.precos.service as service
@@ -8,13 +8,6 @@ import src.precos.schemas as schemas
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/", response_model=schemas.PrecoResponse, summary="Criar preço (Master Admin)")
 def criar_preco(
     dados: schemas.PrecoCreate,
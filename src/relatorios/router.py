@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from datetime import date
 from typing import List
 
-from src.database import SessionLocal  
+from src.database import get_db
 from src.utilizadores.dependencies import get_current_user  # Use this instead of direct import
 from src.utilizadores.models import Utilizador
 
@@ -18,14 +18,6 @@ from src.relatorios.schemas import (
 
 router = APIRouter(prefix="/reports", tags=["Relatórios"])
 
-# Database dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # ----------------------------------------------------------------------
 @router.get("/revenue", response_model=List[RevenueSummaryOut])
 def revenue(
@@ -1,17 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from src.database import SessionLocal
+from src.database import get_db
 from . import service, schemas
 from src.utilizadores.dependencies import get_current_user
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
         
 def check_permission(user, allowed_perfis, clinica_id=None):
     for uc in user.perfis:
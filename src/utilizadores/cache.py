@@ -0,0 +1,219 @@
+"""
+Cache de validação de sessões usada por `get_current_user`.
+
+Cada pedido autenticado fazia duas queries (Sessao + Utilizador). Aqui
+guardamos, por hash do token, o resultado de uma validação bem-sucedida
+durante `AUTH_CACHE_TTL_SECONDS`.
+
+Há duas camadas:
+
+* um ficheiro SQLite partilhado por todos os workers uvicorn da máquina,
+  que é a fonte de verdade do cache: uma entrada só é válida enquanto a
+  linha existir lá. Revogar (logout, suspensão, ...) apaga a linha e o
+  efeito é imediato em todos os workers;
+* um dicionário em memória por processo com uma cópia "só colunas" do
+  Utilizador, para não ter de o voltar a ler da base de dados. Cada linha
+  do SQLite tem uma `versao` aleatória; se a linha for recriada noutro
+  worker, a cópia local deixa de corresponder e é descartada.
+
+Para não voltar a pôr em cache uma validação que leu a base de dados antes
+de uma revogação ser confirmada, cada revogação deixa uma marca com a hora
+em `revogacoes`; `guardar` recebe a hora a que a validação começou e não
+insere nada se houver uma marca posterior para o mesmo utilizador.
+
+Se o SQLite falhar por qualquer motivo, o cache comporta-se como vazio e a
+validação volta a ser feita na base de dados.
+"""
+import hashlib
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from src.core.config import settings
+from src.utilizadores.models import Utilizador
+
+logger = logging.getLogger(__name__)
+
+# Número máximo de utilizadores guardados em memória por processo
+MAX_ENTRADAS_LOCAIS = 10000
+
+
+def hash_token(token: str) -> str:
+    """SHA-256 do token; o token em claro nunca é guardado no cache."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _copia_utilizador(utilizador: Utilizador) -> Utilizador:
+    """
+    Cópia destacada do utilizador apenas com as colunas. As relações
+    (perfis, ...) ficam por carregar e são lidas da sessão do pedido.
+    """
+    mapper = inspect(Utilizador)
+    copia = Utilizador(**{
+        attr.key: getattr(utilizador, attr.key) for attr in mapper.column_attrs
+    })
+    make_transient_to_detached(copia)
+    return copia
+
+
+class SessaoCache:
+    def __init__(self, caminho: str, ttl: int):
+        self.caminho = caminho
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._utilizadores: "OrderedDict[str, tuple[str, Utilizador]]" = OrderedDict()
+
+    # ---------- SQLite partilhado ----------
+    def _conexao(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessoes ("
+                " chave TEXT PRIMARY KEY,"
+                " utilizador_id INTEGER NOT NULL,"
+                " versao TEXT NOT NULL,"
+                " expira_em REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_sessoes_utilizador ON sessoes (utilizador_id)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS revogacoes ("
+                " utilizador_id INTEGER PRIMARY KEY,"
+                " revogado_em REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def _executar(self, sql: str, params: tuple = ()):
+        try:
+            return self._conexao().execute(sql, params)
+        except sqlite3.Error:
+            logger.warning("Cache de sessões indisponível (%s)", self.caminho, exc_info=True)
+            self._local.conn = None
+            return None
+
+    # ---------- API ----------
+    def obter(self, token: str, db: Session) -> Optional[Utilizador]:
+        """
+        Devolve o utilizador associado ao token se houver uma validação
+        recente em cache, já ligado à sessão `db`; caso contrário None.
+        """
+        if self.ttl <= 0:
+            return None
+        chave = hash_token(token)
+        cur = self._executar(
+            "SELECT utilizador_id, versao FROM sessoes WHERE chave = ? AND expira_em > ?",
+            (chave, time.time()),
+        )
+        linha = cur.fetchone() if cur is not None else None
+        if linha is None:
+            return None
+        _, versao = linha
+
+        with self._lock:
+            local = self._utilizadores.get(chave)
+            if local is not None:
+                self._utilizadores.move_to_end(chave)
+        if local is None or local[0] != versao:
+            return None
+        return db.merge(local[1], load=False)
+
+    def guardar(
+        self,
+        token: str,
+        utilizador: Utilizador,
+        data_expiracao: Optional[datetime],
+        validado_em: float,
+    ):
+        """
+        Regista uma validação bem-sucedida (sessão ativa + utilizador ativo).
+        `validado_em` é o `time.time()` de antes das queries de validação.
+        """
+        if self.ttl <= 0:
+            return
+        chave = hash_token(token)
+        agora = time.time()
+        expira_em = agora + self.ttl
+        if data_expiracao is not None:
+            # `data_expiracao` é guardada em UTC sem fuso horário
+            restante = (data_expiracao - datetime.utcnow()).total_seconds()
+            expira_em = min(expira_em, agora + restante)
+        versao = uuid.uuid4().hex
+
+        cur = self._executar(
+            "INSERT OR REPLACE INTO sessoes (chave, utilizador_id, versao, expira_em) "
+            "SELECT ?, ?, ?, ? WHERE NOT EXISTS ("
+            " SELECT 1 FROM revogacoes WHERE utilizador_id = ? AND revogado_em >= ?)",
+            (chave, utilizador.id, versao, expira_em, utilizador.id, validado_em),
+        )
+        if cur is None or cur.rowcount == 0:
+            return
+        if random.random() < 0.01:
+            self._purgar(agora)
+
+        with self._lock:
+            self._utilizadores[chave] = (versao, _copia_utilizador(utilizador))
+            self._utilizadores.move_to_end(chave)
+            while len(self._utilizadores) > MAX_ENTRADAS_LOCAIS:
+                self._utilizadores.popitem(last=False)
+
+    def _purgar(self, agora: float):
+        self._executar("DELETE FROM sessoes WHERE expira_em <= ?", (agora,))
+        # As marcas só interessam a validações em curso no momento da revogação
+        self._executar("DELETE FROM revogacoes WHERE revogado_em <= ?", (agora - 3600,))
+
+    def _revogar(self, utilizador_id: int, sql: str, params: tuple):
+        try:
+            conn = self._conexao()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(
+                    "INSERT OR REPLACE INTO revogacoes (utilizador_id, revogado_em) VALUES (?, ?)",
+                    (utilizador_id, time.time()),
+                )
+                conn.execute(sql, params)
+        except sqlite3.Error:
+            logger.warning("Cache de sessões indisponível (%s)", self.caminho, exc_info=True)
+            self._local.conn = None
+
+    def invalidar_token(self, token: str, utilizador_id: int):
+        """Revoga a entrada de um token (logout, refresh)."""
+        chave = hash_token(token)
+        self._revogar(utilizador_id, "DELETE FROM sessoes WHERE chave = ?", (chave,))
+        with self._lock:
+            self._utilizadores.pop(chave, None)
+
+    def invalidar_utilizador(self, utilizador_id: int):
+        """Revoga todas as entradas de um utilizador (todos os tokens)."""
+        self._revogar(utilizador_id, "DELETE FROM sessoes WHERE utilizador_id = ?", (utilizador_id,))
+        with self._lock:
+            for chave in [c for c, (_, u) in self._utilizadores.items() if u.id == utilizador_id]:
+                del self._utilizadores[chave]
+
+    def limpar(self):
+        self._executar("DELETE FROM sessoes")
+        self._executar("DELETE FROM revogacoes")
+        with self._lock:
+            self._utilizadores.clear()
+
+
+sessao_cache = SessaoCache(
+    settings.AUTH_CACHE_PATH or os.path.join(tempfile.gettempdir(), "clinica_auth_cache.sqlite3"),
+    settings.AUTH_CACHE_TTL_SECONDS,
+)
@@ -1,27 +1,37 @@
+import time
 from datetime import datetime
 from fastapi import Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from src.utilizadores.jwt import verify_token
 from src.utilizadores.models import Utilizador, Sessao
-from src.database import SessionLocal
+from src.utilizadores.cache import sessao_cache
+from src.database import get_db
 from fastapi.security import OAuth2PasswordBearer
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/utilizadores/login")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ):
+    return validar_token(token, db)
+
+
+def validar_token(token: str, db: Session) -> Utilizador:
+    """
+    Valida o token (JWT + sessão ativa + utilizador ativo) e devolve o
+    utilizador. Síncrona: fora de um `Depends` (ex.: WebSockets) chamar no
+    threadpool. Lança HTTPException 401/403.
+    """
     payload = verify_token(token)
     user_id = int(payload.get("sub"))
 
+    # Validação recente em cache (revogada em logout/suspensão/etc.)
+    utilizador = sessao_cache.obter(token, db)
+    if utilizador is not None and utilizador.id == user_id:
+        return utilizador
+
+    validado_em = time.time()
     # Verifique se a sessão está ativa e não expirada
     sessao = db.query(Sessao).filter_by(token=token, utilizador_id=user_id, ativo=True).first()
     if not sessao or sessao.data_expiracao < datetime.utcnow():
@@ -36,4 +46,5 @@ def get_current_user(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Utilizador não encontrado ou inativo."
         )
-    return utilizador
\ No newline at end of file
+    sessao_cache.guardar(token, utilizador, sessao.data_expiracao, validado_em)
+    return utilizador
@@ -0,0 +1,122 @@
+"""
+Hashing de palavras-passe (bcrypt) fora do event loop.
+
+Uma verificação bcrypt custa ~250 ms de CPU. Em vez de a correr nas
+threads do worker, é enviada para um pool de processos dedicado e
+limitado (`PASSWORD_HASH_WORKERS`). Se já houver demasiados pedidos em
+espera (`PASSWORD_HASH_MAX_PENDING`), responde-se 503 em vez de deixar a
+fila crescer.
+
+Este módulo é importado pelos processos do pool, por isso só depende da
+configuração e do passlib.
+
+Com `PASSWORD_HASH_WORKERS=0` o hashing corre no próprio processo
+(útil em desenvolvimento e para comparar no benchmark de login).
+"""
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from passlib.context import CryptContext
+
+from src.core.config import settings
+
+# Hashes com um custo diferente de BCRYPT_ROUNDS são refeitos no login
+# seguinte (ver `verificar_e_atualizar`), sem obrigar a repor senhas.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_desired_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_desired_rounds=settings.BCRYPT_ROUNDS,
+)
+
+
+# ---------- Funções executadas nos processos do pool ----------
+def _gerar_hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verificar(password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """Devolve (válida, novo_hash); novo_hash só vem preenchido se for preciso refazer."""
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+# ---------- Pool ----------
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_pendentes = threading.BoundedSemaphore(
+    max(1, settings.PASSWORD_HASH_WORKERS) + settings.PASSWORD_HASH_MAX_PENDING
+)
+
+
+def _obter_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: o processo principal tem threads (uvicorn, pool da BD)
+                _pool = ProcessPoolExecutor(
+                    max_workers=settings.PASSWORD_HASH_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+def encerrar_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _reservar() -> None:
+    if not _pendentes.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servidor ocupado. Tente novamente dentro de instantes.",
+            headers={"Retry-After": "1"},
+        )
+
+
+def _executar(fn, *args):
+    _reservar()
+    try:
+        if settings.PASSWORD_HASH_WORKERS <= 0:
+            return fn(*args)
+        return _obter_pool().submit(fn, *args).result()
+    finally:
+        _pendentes.release()
+
+
+async def _executar_async(fn, *args):
+    _reservar()
+    try:
+        if settings.PASSWORD_HASH_WORKERS <= 0:
+            return await run_in_threadpool(fn, *args)
+        return await asyncio.wrap_future(_obter_pool().submit(fn, *args))
+    finally:
+        _pendentes.release()
+
+
+# ---------- API síncrona (bloqueia a thread atual, não o CPU do worker) ----------
+def hash_password(password: str) -> str:
+    return _executar(_gerar_hash, password)
+
+
+def verificar_e_atualizar(password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    return _executar(_verificar, password, hashed_password)
+
+
+# ---------- API assíncrona ----------
+async def hash_password_async(password: str) -> str:
+    return await _executar_async(_gerar_hash, password)
+
+
+async def verificar_e_atualizar_async(password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    return await _executar_async(_verificar, password, hashed_password)
@@ -5,7 +5,7 @@ from sqlalchemy.orm import Session
 
 from src.core.config import settings
 from src.utilizadores.models import Utilizador, UtilizadorClinica
-from src.database import SessionLocal
+from src.database import get_db
 from fastapi.security import OAuth2PasswordBearer
 from src.clinica.models import Clinica, ClinicaConfiguracao
 from sqlalchemy.orm import joinedload
@@ -137,7 +137,7 @@ def verify_token(token: str):
 
 
 # Dependência para obter utilizador atual
-def get_current_user(token: str = Depends(lambda: get_bearer_token()), db: Session = Depends(lambda: SessionLocal())):
+def get_current_user(token: str = Depends(lambda: get_bearer_token()), db: Session = Depends(get_db)):
     payload = verify_token(token)
     user_id = int(payload.get("sub"))
     utilizador = db.query(Utilizador).filter(Utilizador.id == user_id).first()
@@ -4,25 +4,20 @@ from fastapi.security import OAuth2PasswordRequestForm
 from typing import List
 
 from src.utilizadores import schemas, service, models
-from src.database import SessionLocal
+from src.database import get_db
 from src.utilizadores.jwt import create_access_token, refresh_access_token
 from src.utilizadores.dependencies import get_current_user
+from src.utilizadores.cache import sessao_cache
 from src.utilizadores.utils import is_master_admin
 from datetime import datetime, timedelta
 from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
 from src.utilizadores.jwt import get_token_duration_for_user
 
 
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # Registro do Master Admin (primeiro utilizador)
 @router.post("/registro", response_model=schemas.UtilizadorResponse)
 def registrar(dados: schemas.UtilizadorCreate, db: Session = Depends(get_db)):
@@ -32,14 +27,16 @@ def registrar(dados: schemas.UtilizadorCreate, db: Session = Depends(get_db)):
 
 # Login (JWT)
 @router.post("/login", response_model=schemas.TokenResponse)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    # Authenticate the user
-    utilizador = service.autenticar_utilizador(
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    # Authenticate the user (bcrypt corre no pool de processos, não no event loop)
+    utilizador = await service.autenticar_utilizador_async(
         db, 
         email_or_username=form_data.username, 
         password=form_data.password
     )
-    
+    return await run_in_threadpool(_emitir_token, db, utilizador)
+
+def _emitir_token(db: Session, utilizador: models.Utilizador) -> dict:
     # Get custom token duration based on user's clinics
     token_duration_minutes = get_token_duration_for_user(utilizador.id, db)
     
@@ -92,6 +89,8 @@ def refresh_token(
         session.token = new_token
         session.data_expiracao = nova_data_expiracao
         db.commit()
+        # O token antigo deixou de corresponder a uma sessão
+        sessao_cache.invalidar_token(old_token, current_user.id)
     else:
         clinica_id = None
         user_clinica = db.query(models.UtilizadorClinica).filter(
@@ -155,12 +154,12 @@ def atualizar_me(
     return service.atualizar_utilizador(db, utilizador.id, dados)
 
 @router.post("/me/alterar-senha", response_model=dict)
-def alterar_senha(
+async def alterar_senha(
     req: schemas.AlterarSenhaRequest,
     db: Session = Depends(get_db),
     utilizador: models.Utilizador = Depends(get_current_user)
 ):
-    return service.alterar_senha(db, utilizador.id, req.senha_atual, req.nova_senha)
+    return await service.alterar_senha_async(db, utilizador.id, req.senha_atual, req.nova_senha)
 
 
 @router.get(
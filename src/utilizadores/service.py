@@ -1,8 +1,10 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from fastapi import HTTPException, status
-from src.utilizadores import models, schemas, utils
+from fastapi.concurrency import run_in_threadpool
+from src.utilizadores import hashing, models, schemas, utils
 from src.utilizadores.utils import is_master_admin
+from src.utilizadores.cache import sessao_cache
 from src.auditoria.utils import registrar_auditoria
 from datetime import datetime, timedelta
 
@@ -57,7 +59,7 @@ def criar_utilizador(
 
     return novo_utilizador
 
-def autenticar_utilizador(db: Session, email_or_username: str, password: str) -> models.Utilizador:
+def _obter_para_login(db: Session, email_or_username: str) -> models.Utilizador:
     utilizador = db.query(models.Utilizador).filter(
         (models.Utilizador.email == email_or_username) | (models.Utilizador.username == email_or_username)
     ).first()
@@ -66,8 +68,12 @@ def autenticar_utilizador(db: Session, email_or_username: str, password: str) ->
 
     if utilizador.bloqueado:
         raise HTTPException(status_code=403, detail="Conta bloqueada por excesso de tentativas. Contacte o Master Admin.")
+    return utilizador
 
-    if not utils.verify_password(password, utilizador.password_hash):
+def _registar_tentativa_login(
+    db: Session, utilizador: models.Utilizador, valida: bool, novo_hash: str | None
+) -> models.Utilizador:
+    if not valida:
         utilizador.tentativas_falhadas += 1
         if utilizador.tentativas_falhadas >= 5:
             utilizador.bloqueado = True
@@ -77,14 +83,30 @@ def autenticar_utilizador(db: Session, email_or_username: str, password: str) ->
     if not utilizador.ativo:
         raise HTTPException(status_code=403, detail="Conta desativada.")
 
+    # Hash com custo antigo: guardar o novo, calculado com a senha em claro
+    if novo_hash:
+        utilizador.password_hash = novo_hash
+
     # Reset tentativas ao fazer login com sucesso
     utilizador.tentativas_falhadas = 0
     db.commit()
-    
-    
-
     return utilizador
 
+def autenticar_utilizador(db: Session, email_or_username: str, password: str) -> models.Utilizador:
+    utilizador = _obter_para_login(db, email_or_username)
+    valida, novo_hash = hashing.verificar_e_atualizar(password, utilizador.password_hash)
+    return _registar_tentativa_login(db, utilizador, valida, novo_hash)
+
+async def autenticar_utilizador_async(db: Session, email_or_username: str, password: str) -> models.Utilizador:
+    """
+    Igual a `autenticar_utilizador`, mas sem ocupar uma thread do worker
+    durante o bcrypt: as queries correm no threadpool e a verificação no
+    pool de processos de `hashing`.
+    """
+    utilizador = await run_in_threadpool(_obter_para_login, db, email_or_username)
+    valida, novo_hash = await hashing.verificar_e_atualizar_async(password, utilizador.password_hash)
+    return await run_in_threadpool(_registar_tentativa_login, db, utilizador, valida, novo_hash)
+
 def atribuir_clinicas(db: Session, utilizador_id: int, clinica_ids: list[int]):
     # Verifica se o utilizador tem perfil global
     global_assoc = db.query(models.UtilizadorClinica).filter_by(
@@ -211,6 +233,7 @@ def atualizar_utilizador(db: Session, user_id: int, dados: schemas.UtilizadorUpd
     utilizador.telefone = dados.telefone
     db.commit()
     db.refresh(utilizador)
+    sessao_cache.invalidar_utilizador(user_id)
     registrar_auditoria(
         db,
         user_id,
@@ -231,6 +254,7 @@ def admin_atualizar_utilizador(db: Session, user_id: int, dados: schemas.Utiliza
         utilizador.ativo = dados.ativo
     db.commit()
     db.refresh(utilizador)
+    sessao_cache.invalidar_utilizador(user_id)
     registrar_auditoria(
         db,
         admin_id,
@@ -249,6 +273,7 @@ def suspender_utilizador(db: Session, user_id: int, admin_id: int) -> models.Uti
     utilizador.ativo = False
     db.commit()
     db.refresh(utilizador)
+    sessao_cache.invalidar_utilizador(user_id)
     registrar_auditoria(
         db, admin_id, "Suspensão", "Utilizador", user_id,
         f"Conta do utilizador {user_id} suspensa."
@@ -276,6 +301,7 @@ def desbloquear_utilizador(db: Session, user_id: int, admin_id: int) -> models.U
     utilizador.tentativas_falhadas = 0
     db.commit()
     db.refresh(utilizador)
+    sessao_cache.invalidar_utilizador(user_id)
     registrar_auditoria(
         db, admin_id, "Desbloqueio", "Utilizador", user_id,
         f"Conta do utilizador {user_id} desbloqueada."
@@ -348,6 +374,7 @@ def logout(db: Session, utilizador_id: int, token: str):
         raise HTTPException(status_code=404, detail="Sessão não encontrada ou já encerrada.")
     sessao.ativo = False
     db.commit()
+    sessao_cache.invalidar_token(token, utilizador_id)
     from src.auditoria.utils import registrar_auditoria
     registrar_auditoria(
         db,
@@ -359,24 +386,40 @@ def logout(db: Session, utilizador_id: int, token: str):
     )
     return {"detail": "Logout efetuado com sucesso."}
 
-def alterar_senha(db: Session, user_id: int, senha_atual: str, nova_senha: str):
+def _obter_utilizador_ou_404(db: Session, user_id: int) -> models.Utilizador:
     utilizador = db.query(models.Utilizador).filter_by(id=user_id).first()
     if not utilizador:
         raise HTTPException(status_code=404, detail="Utilizador não encontrado")
-    if not utils.verify_password(senha_atual, utilizador.password_hash):
-        raise HTTPException(status_code=400, detail="Senha atual incorreta.")
-    utilizador.password_hash = utils.hash_password(nova_senha)
+    return utilizador
+
+def _guardar_nova_senha(db: Session, utilizador: models.Utilizador, novo_hash: str):
+    utilizador.password_hash = novo_hash
     db.commit()
+    sessao_cache.invalidar_utilizador(utilizador.id)
     registrar_auditoria(
         db,
-        user_id,
+        utilizador.id,
         "Alteração de senha",
         "Utilizador",
-        user_id,
+        utilizador.id,
         "Senha alterada pelo próprio utilizador."
     )
     return {"detail": "Senha alterada com sucesso."}
 
+def alterar_senha(db: Session, user_id: int, senha_atual: str, nova_senha: str):
+    utilizador = _obter_utilizador_ou_404(db, user_id)
+    if not utils.verify_password(senha_atual, utilizador.password_hash):
+        raise HTTPException(status_code=400, detail="Senha atual incorreta.")
+    return _guardar_nova_senha(db, utilizador, utils.hash_password(nova_senha))
+
+async def alterar_senha_async(db: Session, user_id: int, senha_atual: str, nova_senha: str):
+    utilizador = await run_in_threadpool(_obter_utilizador_ou_404, db, user_id)
+    valida, _ = await hashing.verificar_e_atualizar_async(senha_atual, utilizador.password_hash)
+    if not valida:
+        raise HTTPException(status_code=400, detail="Senha atual incorreta.")
+    novo_hash = await hashing.hash_password_async(nova_senha)
+    return await run_in_threadpool(_guardar_nova_senha, db, utilizador, novo_hash)
+
 
 def obter_me(db: Session, utilizador_id: int):
     utilizador = db.query(models.Utilizador).filter_by(id=utilizador_id).first()
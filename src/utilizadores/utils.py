@@ -1,16 +1,18 @@
-from passlib.context import CryptContext
 from src.utilizadores import models
+from src.utilizadores import hashing
 
-# Contexto para hashing seguro de palavras-passe
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Contexto para hashing seguro de palavras-passe (o trabalho de CPU corre
+# no pool de processos de `hashing`)
+pwd_context = hashing.pwd_context
 
 def hash_password(password: str) -> str:
     """Gera o hash seguro da palavra-passe."""
-    return pwd_context.hash(password)
+    return hashing.hash_password(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifica se a palavra-passe corresponde ao hash armazenado."""
-    return pwd_context.verify(plain_password, hashed_password)
+    valida, _ = hashing.verificar_e_atualizar(plain_password, hashed_password)
+    return valida
 
 
 def is_master_admin(utilizador: models.Utilizador) -> bool: